@@ -12,5 +12,26 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'CodeAtlas.settings')
+os.environ.setdefault('CODEATLAS_SERVER', 'asgi')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Despues de get_asgi_application(): necesita las apps cargadas.
+from snippets import visits  # noqa: E402
+from snippets.live import LIVE_PATH, map_socket  # noqa: E402
+
+# Los procesos web vuelcan las visitas periodicamente aunque no reciban peticiones.
+visits.enable_flusher()
+
+
+async def application(scope, receive, send):
+    """
+    Los WebSocket van al canal en vivo del mapa (snippets.live); el resto, a Django.
+    """
+    if scope['type'] == 'websocket':
+        if scope['path'] == LIVE_PATH:
+            return await map_socket(scope, receive, send)
+        # Ruta desconocida: se rechaza la conexion antes de aceptarla.
+        await receive()
+        return await send({'type': 'websocket.close', 'code': 4404})
+    return await django_application(scope, receive, send)
@@ -0,0 +1,45 @@
+from django.db import connections
+
+# Estado de las conexiones a la base de datos (ver DATABASE_CONNECTIONS en settings), para monitorizacion.
+
+
+def pool_stats(connection):
+    """
+    Contadores del pool de psycopg de una conexion (None si no usa pool): conexiones abiertas y libres,
+    peticiones en espera, tiempos de espera acumulados, errores...
+    """
+    pool = getattr(connection, 'pool', None)
+    if pool is None:
+        return None
+    return pool.get_stats()
+
+
+def server_connections(connection):
+    """
+    Conexiones abiertas contra la base de datos segun el servidor, por estado (active, idle...).
+    Incluye las de todos los procesos, no solo las de este.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT coalesce(state, \'unknown\'), count(*) FROM pg_stat_activity '
+            'WHERE datname = current_database() GROUP BY 1'
+        )
+        return dict(cursor.fetchall())
+
+
+def connection_stats():
+    """
+    Configuracion y estado de las conexiones de cada base de datos.
+    """
+    result = {}
+    for alias in connections:
+        connection = connections[alias]
+        settings_dict = connection.settings_dict
+        result[alias] = {
+            'pooled': bool(settings_dict['OPTIONS'].get('pool')),
+            'conn_max_age': settings_dict['CONN_MAX_AGE'],
+            'health_checks': settings_dict['CONN_HEALTH_CHECKS'],
+            'pool': pool_stats(connection),
+            'server_connections': server_connections(connection),
+        }
+    return result
@@ -0,0 +1,161 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('codeatlas.requests')
+
+# Consultas duplicadas que se incluyen en el log, y caracteres de SQL de cada una.
+MAX_REPORTED_DUPLICATES = 5
+MAX_SQL_CHARS = 300
+
+
+class QueryRecorder:
+    """
+    execute_wrapper que cuenta las consultas, suma su tiempo y agrupa las sentencias iguales
+    (mismo SQL con distintos parametros, el patron tipico de un N+1).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    def duplicates(self, threshold):
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+    def install(self):
+        # connections[alias] crea el objeto de conexion si hace falta (sin abrirla), para poder envolverlo.
+        self._installed = [connections[alias] for alias in connections]
+        for connection in self._installed:
+            connection.execute_wrappers.append(self)
+
+    def uninstall(self):
+        for connection in self._installed:
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+class RequestTimingMiddleware:
+    """
+    Mide cada peticion: tiempo total, numero de consultas y tiempo en SQL, y avisa de consultas repetidas.
+
+    Se activa con CODEATLAS_REQUEST_TIMING y solo instrumenta la fraccion de peticiones indicada en
+    CODEATLAS_REQUEST_TIMING_SAMPLE_RATE. Las peticiones medidas llevan una cabecera Server-Timing y dejan
+    una linea JSON en el logger "codeatlas.requests" (WARNING si hay consultas repetidas).
+    En las respuestas en streaming la linea se escribe al terminar de enviarse.
+
+    Funciona tambien en modo async (ASGI), para no obligar a pasar toda la cadena por sync_to_async.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CODEATLAS_REQUEST_TIMING', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'CODEATLAS_REQUEST_TIMING_SAMPLE_RATE', 1.0)
+        self.duplicate_threshold = getattr(settings, 'CODEATLAS_REQUEST_TIMING_DUPLICATES', 3)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        recorder.install()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        except Exception:
+            recorder.uninstall()
+            raise
+        return self.finish(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        recorder = QueryRecorder()
+        # Las conexiones son por hilo: se instala en el hilo donde el ORM async ejecuta las consultas.
+        await sync_to_async(recorder.install)()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        except Exception:
+            recorder.uninstall()
+            raise
+        return self.finish(request, response, recorder, start)
+
+    def finish(self, request, response, recorder, start):
+        elapsed = time.perf_counter() - start
+        response['Server-Timing'] = (
+            f'app;dur={elapsed * 1000:.1f}, '
+            f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"'
+        )
+
+        if response.streaming:
+            content = response.streaming_content
+            if response.is_async:
+                response.streaming_content = self._alog_after_stream(request, response, content, recorder, start)
+            else:
+                response.streaming_content = self._log_after_stream(request, response, content, recorder, start)
+        else:
+            recorder.uninstall()
+            self.log(request, response, recorder, elapsed)
+        return response
+
+    def _log_after_stream(self, request, response, content, recorder, start):
+        try:
+            yield from content
+        finally:
+            recorder.uninstall()
+            self.log(request, response, recorder, time.perf_counter() - start)
+
+    async def _alog_after_stream(self, request, response, content, recorder, start):
+        try:
+            async for chunk in content:
+                yield chunk
+        finally:
+            recorder.uninstall()
+            self.log(request, response, recorder, time.perf_counter() - start)
+
+    def log(self, request, response, recorder, elapsed):
+        duplicates = recorder.duplicates(self.duplicate_threshold)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 2),
+            'db_queries': recorder.count,
+            'db_time_ms': round(recorder.duration * 1000, 2),
+            'duplicate_queries': [
+                {'count': count, 'sql': sql[:MAX_SQL_CHARS]} for sql, count in duplicates[:MAX_REPORTED_DUPLICATES]
+            ],
+        }
+        level = logging.WARNING if duplicates else logging.INFO
+        logger.log(level, json.dumps(record), extra={'request_timing': record})
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -35,6 +36,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'snippets.apps.SnippetsConfig',
     'accounts.apps.AccountsConfig',
     "django.contrib.gis",
@@ -42,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'CodeAtlas.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,18 +56,24 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'CodeAtlas.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates']
         ,
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Fuera de DEBUG cada plantilla se compila una sola vez por proceso; en desarrollo se relee del disco.
+            'loaders': TEMPLATE_LOADERS if DEBUG else [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)],
         },
     },
 ]
@@ -74,14 +83,63 @@ WSGI_APPLICATION = 'CodeAtlas.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Conexiones a PostGIS, seleccionables por entorno con CODEATLAS_DB_CONNECTIONS:
+#   - "persistent" (por defecto con WSGI): cada hilo reutiliza su conexion hasta CODEATLAS_DB_CONN_MAX_AGE segundos,
+#     comprobando antes de cada peticion que sigue viva (CONN_HEALTH_CHECKS).
+#   - "pool": pool de conexiones de psycopg 3 compartido por los hilos del proceso (necesita psycopg[pool]).
+#     Tamaño y tiempos en CODEATLAS_DB_POOL_*; las conexiones se comprueban al salir del pool.
+#   - "per-request" (por defecto con ASGI): una conexion nueva por peticion (lo que hacia Django por defecto).
+# Con ASGI no se usan conexiones persistentes, como aconseja Django: el ORM de las vistas async corre en hilos
+# que no son siempre los mismos y cada uno se quedaria con su conexion abierta. Ahi conviene "pool" si esta
+# instalado psycopg[pool]; per-request es el valor por defecto porque no necesita nada mas.
+# CodeAtlas.asgi y CodeAtlas.wsgi fijan CODEATLAS_SERVER antes de cargar los settings.
+# El estado de las conexiones se consulta en snippets:db_stats (CodeAtlas.db.connection_stats).
+
+CODEATLAS_SERVER = os.environ.get('CODEATLAS_SERVER', 'wsgi')
+
+DATABASE_CONNECTIONS = os.environ.get(
+    'CODEATLAS_DB_CONNECTIONS', 'per-request' if CODEATLAS_SERVER == 'asgi' else 'persistent'
+)
+
+DATABASE_POOL = {
+    'min_size': int(os.environ.get('CODEATLAS_DB_POOL_MIN_SIZE', '2')),
+    'max_size': int(os.environ.get('CODEATLAS_DB_POOL_MAX_SIZE', '10')),
+    # Segundos que espera una peticion a que quede una conexion libre antes de fallar.
+    'timeout': float(os.environ.get('CODEATLAS_DB_POOL_TIMEOUT', '10')),
+    # Segundos que puede estar ociosa una conexion por encima de min_size, y vida maxima de cada conexion.
+    'max_idle': float(os.environ.get('CODEATLAS_DB_POOL_MAX_IDLE', '300')),
+    'max_lifetime': float(os.environ.get('CODEATLAS_DB_POOL_MAX_LIFETIME', '1800')),
+}
+
+DATABASE_CONNECTION_MODES = {
+    'per-request': {
+        'CONN_MAX_AGE': 0,
+    },
+    'persistent': {
+        'CONN_MAX_AGE': int(os.environ.get('CODEATLAS_DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+    },
+    'pool': {
+        # El pool de Django no admite conexiones persistentes.
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {'pool': DATABASE_POOL},
+    },
+}
+
+if DATABASE_CONNECTIONS == 'pool':
+    from psycopg_pool import ConnectionPool
+
+    DATABASE_POOL['check'] = ConnectionPool.check_connection
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.contrib.gis.db.backends.postgis',
-        'NAME': 'codeatlas',
-        'USER': 'codeatlas_admin',
-        'PASSWORD': 'codeatlas',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.environ.get('CODEATLAS_DB_NAME', 'codeatlas'),
+        'USER': os.environ.get('CODEATLAS_DB_USER', 'codeatlas_admin'),
+        'PASSWORD': os.environ.get('CODEATLAS_DB_PASSWORD', 'codeatlas'),
+        'HOST': os.environ.get('CODEATLAS_DB_HOST', 'localhost'),
+        'PORT': os.environ.get('CODEATLAS_DB_PORT', '5432'),
+        **DATABASE_CONNECTION_MODES[DATABASE_CONNECTIONS],
     }
 }
 
@@ -118,3 +176,107 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+# collectstatic copia aqui los estaticos. Fuera de DEBUG, con el hash del contenido en el nombre y sus
+# variantes .gz/.br (snippets.assets.CompressedManifestStaticFilesStorage). Antes de collectstatic hay que
+# generar los bundles con build_assets. El repositorio solo trae jQuery en static/vendor/: el despliegue tiene
+# que ejecutar antes vendor_assets (con --pin la primera vez, fijando los hashes en snippets.assets.VENDOR_FILES);
+# sin ese paso las plantillas siguen pidiendo las demas librerias a su CDN.
+STATIC_ROOT = Path(os.environ.get('CODEATLAS_STATIC_ROOT', BASE_DIR / 'staticfiles'))
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': ('django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+                    else 'snippets.assets.CompressedManifestStaticFilesStorage'),
+    },
+}
+
+# Ficheros subidos (avatares). Las miniaturas de los avatares (accounts.thumbnails) se guardan aqui y las
+# sirve accounts.views.avatar_thumbnail; los originales, el servidor web (o runserver en DEBUG).
+MEDIA_URL = 'media/'
+MEDIA_ROOT = Path(os.environ.get('CODEATLAS_MEDIA_ROOT', BASE_DIR / 'media'))
+
+# Sin servidor web delante, Django sirve STATIC_ROOT (snippets.views.static_asset): variante comprimida
+# segun Accept-Encoding y cache de un año para los ficheros con hash. En DEBUG los sirve runserver.
+SNIPPETS_SERVE_STATIC = os.environ.get('SNIPPETS_SERVE_STATIC', '1') == '1' and not DEBUG
+
+# Contador de visitas (snippets.visits): las visitas se acumulan en memoria en cada proceso y se vuelcan
+# a la base de datos cada SNIPPETS_VISITS_FLUSH_INTERVAL segundos (un hilo por proceso web, aunque no haya
+# peticiones) o al llegar a SNIPPETS_VISITS_FLUSH_THRESHOLD. flush_visits pide el volcado a traves de la cache
+# SNIPPETS_VISITS_FLUSH_REQUEST_CACHE: solo llega a los procesos web si es compartida (CODEATLAS_CACHE_BACKEND=file).
+SNIPPETS_VISITS_FLUSH_INTERVAL = 10
+SNIPPETS_VISITS_FLUSH_THRESHOLD = 100
+SNIPPETS_VISITS_FLUSH_REQUEST_CACHE = 'default'
+
+# Resaltado de codigo en servidor con Pygments (snippets.highlighting). Si Pygments no esta instalado
+# o se desactiva, las plantillas vuelven a cargar Prism en el navegador.
+SNIPPETS_SERVER_HIGHLIGHTING = True
+SNIPPETS_HIGHLIGHT_CACHE_SIZE = 1024
+
+# Cache
+# Backend seleccionable por entorno con CODEATLAS_CACHE_BACKEND: "locmem" (por defecto, un proceso)
+# o "file" (compartida entre los procesos de la maquina). Ninguno necesita servicios externos.
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'codeatlas',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CODEATLAS_CACHE_DIR', str(BASE_DIR / '.cache')),
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[os.environ.get('CODEATLAS_CACHE_BACKEND', 'locmem')],
+}
+
+# Cache de respuestas de snippets.caching (index, detalle, GeoJSON y perfiles publicos).
+SNIPPETS_VIEW_CACHE = 'default'
+SNIPPETS_VIEW_CACHE_TIMEOUT = 300
+
+# Cache de fragmentos de las tarjetas de snippets ({% cache %} en snippet_cards.html y profile_snippets.html).
+# La clave lleva pk y pub_update, asi que editar un snippet no necesita invalidar nada: la tarjeta vieja
+# deja de pedirse y caduca. Sirve tambien con usuarios autenticados, a los que no llega la cache de respuestas.
+SNIPPETS_CARD_CACHE = 'default'
+SNIPPETS_CARD_CACHE_TIMEOUT = 24 * 3600
+
+# Dias que se guardan los snippets eliminados para la sincronizacion incremental del mapa (?since=).
+# Un cliente que lleve mas tiempo sin sincronizar recarga el GeoJSON entero.
+SNIPPETS_TOMBSTONE_RETENTION_DAYS = 7
+
+# Por encima de este numero de filas (estimado por PostgreSQL) el admin de snippets muestra el total
+# estimado en vez de hacer COUNT(*) (snippets.pagination.EstimatedCountPaginator).
+SNIPPETS_ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# Eventos en vivo del mapa por WebSocket (snippets.live, servido por CodeAtlas.asgi).
+# InProcessBroker vale para un solo proceso (y para los tests); con varios procesos ASGI usar
+# 'snippets.live.PostgresBroker', que los reparte con LISTEN/NOTIFY de la propia base de datos.
+SNIPPETS_LIVE_BACKEND = os.environ.get('SNIPPETS_LIVE_BACKEND', 'snippets.live.InProcessBroker')
+
+# Versiones async (snippets.async_views) de snippet_detail, map_snippet y snippets_geojson. Solo compensan
+# sirviendo con CodeAtlas.asgi (uvicorn, daphne...); con WSGI cada peticion async se ejecuta en su propio bucle.
+SNIPPETS_ASYNC_VIEWS = os.environ.get('SNIPPETS_ASYNC_VIEWS') == '1'
+
+# Instrumentacion por peticion (CodeAtlas.middleware.RequestTimingMiddleware): tiempo total, consultas SQL
+# y consultas repetidas, en la cabecera Server-Timing y en el logger "codeatlas.requests".
+# Desactivada por defecto; con CODEATLAS_REQUEST_TIMING_SAMPLE_RATE < 1 solo se mide esa fraccion de peticiones.
+CODEATLAS_REQUEST_TIMING = os.environ.get('CODEATLAS_REQUEST_TIMING') == '1'
+CODEATLAS_REQUEST_TIMING_SAMPLE_RATE = float(os.environ.get('CODEATLAS_REQUEST_TIMING_SAMPLE_RATE', '1.0'))
+# Veces que tiene que repetirse la misma sentencia en una peticion para marcarla como duplicada (N+1).
+CODEATLAS_REQUEST_TIMING_DUPLICATES = 3
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'codeatlas.requests': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
@@ -12,5 +12,12 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'CodeAtlas.settings')
+os.environ.setdefault('CODEATLAS_SERVER', 'wsgi')
 
 application = get_wsgi_application()
+
+# Despues de get_wsgi_application(): necesita las apps cargadas.
+from snippets import visits  # noqa: E402
+
+# Los procesos web vuelcan las visitas periodicamente aunque no reciban peticiones.
+visits.enable_flusher()
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import stats
+
+
+class Command(BaseCommand):
+    help = "Comprueba que los totales de autor (AuthorStats) coinciden con los snippets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile_ids', nargs='*', type=int,
+                            help="Perfiles a comprobar (por defecto, todos).")
+        parser.add_argument('--fix', action='store_true',
+                            help="Reconstruye los autores con diferencias.")
+
+    def handle(self, *args, **options):
+        mismatches = stats.check_author_stats(options['profile_ids'] or None)
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Totales de autor correctos."))
+            return
+
+        for profile_id, field, stored, expected in mismatches:
+            self.stdout.write(f"Perfil {profile_id}: {field} = {stored!r}, esperado {expected!r}")
+
+        broken = sorted({profile_id for profile_id, *rest in mismatches})
+        if options['fix']:
+            stats.rebuild_author_stats(broken)
+            self.stdout.write(self.style.SUCCESS(f"Autores reconstruidos: {len(broken)}"))
+        else:
+            raise CommandError(f"{len(broken)} autores con totales incorrectos (usa --fix para corregirlos).")
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import thumbnails
+from accounts.models import UserProfile
+from snippets import caching
+
+
+class Command(BaseCommand):
+    help = ("Calcula el hash de los avatares que no lo tienen (subidos antes de accounts.thumbnails) y genera "
+            "las miniaturas que falten.")
+
+    def handle(self, *args, **options):
+        if not thumbnails.is_enabled():
+            raise CommandError('Hace falta Pillow para generar miniaturas.')
+
+        profiles = written = 0
+        profiles_qs = UserProfile.objects.exclude(avatar='').exclude(avatar__isnull=True).select_related('user')
+        for profile in profiles_qs.iterator():
+            if not profile.avatar_hash:
+                profile.update_avatar_hash()
+                UserProfile.objects.filter(pk=profile.pk).update(avatar_hash=profile.avatar_hash)
+                # El perfil publico cacheado sigue enlazando el original.
+                caching.invalidate(f'profiles:{profile.user.username}')
+            written += len(thumbnails.generate_thumbnails(profile))
+            profiles += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Avatares revisados: {profiles}, miniaturas generadas: {written}"))
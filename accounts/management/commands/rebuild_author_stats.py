@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from accounts import stats
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde cero los totales de autor (AuthorStats) a partir de los snippets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile_ids', nargs='*', type=int,
+                            help="Perfiles a reconstruir (por defecto, todos).")
+
+    def handle(self, *args, **options):
+        rebuilt = stats.rebuild_author_stats(options['profile_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Autores reconstruidos: {rebuilt}"))
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.2 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def backfill_author_stats(apps, schema_editor):
+    UserProfile = apps.get_model('accounts', 'UserProfile')
+    AuthorStats = apps.get_model('accounts', 'AuthorStats')
+    Snippet = apps.get_model('snippets', 'Snippet')
+
+    stats = {
+        pk: AuthorStats(profile_id=pk, language_counts={})
+        for pk in UserProfile.objects.values_list('pk', flat=True)
+    }
+    totals = Snippet.objects.filter(author__isnull=False).values('author_id').annotate(
+        count=Count('id'), visits=Sum('cont_visited'), last=Max('pub_date'),
+    ).order_by()
+    for row in totals:
+        author = stats[row['author_id']]
+        author.snippet_count = row['count']
+        author.total_visits = row['visits'] or 0
+        author.last_published = row['last']
+    languages = Snippet.objects.filter(author__isnull=False).values('author_id', 'language').annotate(
+        count=Count('id'),
+    ).order_by()
+    for row in languages:
+        stats[row['author_id']].language_counts[row['language']] = row['count']
+    AuthorStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('snippets', '0010_trigram_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='accounts.userprofile')),
+                ('snippet_count', models.PositiveIntegerField(default=0)),
+                ('language_counts', models.JSONField(blank=True, default=dict)),
+                ('total_visits', models.BigIntegerField(default=0)),
+                ('last_published', models.DateTimeField(blank=True, null=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_author_stats, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,69 @@
 from django.contrib.auth.models import User
 from django.db import models
 
+from accounts import thumbnails
+
 # Create your models here.
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(null=True, blank=True)
-    avatar = models.ImageField(null=True, blank=True)
+    avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    # Hash del contenido del avatar: da nombre a sus miniaturas (accounts.thumbnails). Vacio si no hay avatar.
+    avatar_hash = models.CharField(max_length=thumbnails.HASH_LENGTH, blank=True, default='', db_index=True,
+                                   editable=False)
     github = models.URLField(null=True, blank=True)
 
     def __str__(self):
-        return f'{self.user.username}'
\ No newline at end of file
+        return f'{self.user.username}'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_avatar_name = instance.__dict__.get('avatar') or ''
+        return instance
+
+    def avatar_changed(self):
+        """
+        Si el avatar es nuevo, distinto del leido de la base de datos o todavia no tiene hash.
+        """
+        if 'avatar' in self.get_deferred_fields():
+            return False
+        if self.avatar and not self.avatar._committed:
+            return True
+        return ((self.avatar.name or '') != getattr(self, '_loaded_avatar_name', '')
+                or bool(self.avatar) != bool(self.avatar_hash))
+
+    def update_avatar_hash(self):
+        """
+        Recalcula avatar_hash a partir del fichero del avatar (vacio si no hay o no se encuentra).
+        """
+        try:
+            self.avatar_hash = thumbnails.content_hash(self.avatar) if self.avatar else ''
+        except FileNotFoundError:
+            self.avatar_hash = ''
+
+    def save(self, *args, **kwargs):
+        # Avatar nuevo o cambiado: nuevo hash, y accounts.signals genera sus miniaturas.
+        self._avatar_changed = self.avatar_changed()
+        if self._avatar_changed:
+            self.update_avatar_hash()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'avatar_hash'}
+        super().save(*args, **kwargs)
+        self._loaded_avatar_name = self.avatar.name or ''
+
+# Totales de cada autor, mantenidos de forma incremental por accounts.stats a partir de las señales de
+# Snippet y de los volcados de visitas. Se pueden reconstruir con el comando rebuild_author_stats.
+class AuthorStats(models.Model):
+    profile = models.OneToOneField(UserProfile, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    snippet_count = models.PositiveIntegerField(default=0)
+    # {lenguaje: numero de snippets}, sin entradas a cero.
+    language_counts = models.JSONField(default=dict, blank=True)
+    total_visits = models.BigIntegerField(default=0)
+    last_published = models.DateTimeField(null=True, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.profile}: {self.snippet_count} snippets'
@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts import stats, thumbnails
+from accounts.models import AuthorStats, UserProfile
+from snippets import caching
+from snippets.visits import visits_flushed
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def profile_changed(sender, instance, **kwargs):
+    """
+    Invalida el perfil publico cacheado del usuario.
+    """
+    group = f'profiles:{instance.user.username}'
+    transaction.on_commit(lambda: caching.invalidate(group))
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.get_or_create(profile=instance)
+
+
+@receiver(post_save, sender=UserProfile)
+def avatar_uploaded(sender, instance, raw=False, **kwargs):
+    """
+    Genera las miniaturas de un avatar nuevo al subirlo; si falla, se generan al pedirlas
+    (accounts.views.avatar_thumbnail).
+    """
+    if not raw and getattr(instance, '_avatar_changed', False) and instance.avatar_hash:
+        transaction.on_commit(lambda: thumbnails.generate_thumbnails(instance), robust=True)
+
+
+@receiver(visits_flushed)
+def snippet_visits_flushed(sender, deltas, **kwargs):
+    """
+    Lleva las visitas volcadas al total de cada autor.
+    """
+    stats.add_visits(deltas)
@@ -0,0 +1,214 @@
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from accounts.models import AuthorStats, UserProfile
+from snippets.models import Snippet
+from snippets.visits import FLUSH_BATCH_SIZE
+
+# Campos de AuthorStats que se comparan y se reescriben al reconstruir.
+STATS_FIELDS = ('snippet_count', 'language_counts', 'total_visits', 'last_published')
+
+# Autores que se recalculan por consulta al reconstruir o comprobar.
+REBUILD_BATCH_SIZE = 1000
+
+
+def compute_stats(profile_ids):
+    """
+    Calcula desde cero los totales de los autores dados con dos agregados sobre Snippet.
+
+    @return:
+        {profile_id: {campo: valor}} con una entrada por autor, tambien para los que no tienen snippets.
+    """
+    result = {
+        pk: {'snippet_count': 0, 'language_counts': {}, 'total_visits': 0, 'last_published': None}
+        for pk in profile_ids
+    }
+    totals = Snippet.objects.filter(author_id__in=profile_ids).values('author_id').annotate(
+        count=Count('id'), visits=Sum('cont_visited'), last=Max('pub_date'),
+    ).order_by()
+    for row in totals:
+        stats = result[row['author_id']]
+        stats['snippet_count'] = row['count']
+        stats['total_visits'] = row['visits'] or 0
+        stats['last_published'] = row['last']
+
+    languages = Snippet.objects.filter(author_id__in=profile_ids).values('author_id', 'language').annotate(
+        count=Count('id'),
+    ).order_by()
+    for row in languages:
+        result[row['author_id']]['language_counts'][row['language']] = row['count']
+    return result
+
+
+def _profile_id_batches(profile_ids=None):
+    profiles = UserProfile.objects.order_by('pk').values_list('pk', flat=True)
+    if profile_ids is not None:
+        profiles = profiles.filter(pk__in=profile_ids)
+    batch = []
+    for pk in profiles.iterator(chunk_size=REBUILD_BATCH_SIZE):
+        batch.append(pk)
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def rebuild_author_stats(profile_ids=None):
+    """
+    Reescribe los totales de los autores dados (de todos si profile_ids es None).
+
+    @return:
+        Numero de autores reconstruidos.
+    """
+    rebuilt = 0
+    for batch in _profile_id_batches(profile_ids):
+        computed = compute_stats(batch)
+        with transaction.atomic():
+            AuthorStats.objects.bulk_create(
+                [AuthorStats(profile_id=pk, **values) for pk, values in computed.items()],
+                update_conflicts=True,
+                unique_fields=['profile'],
+                update_fields=[*STATS_FIELDS, 'updated'],
+            )
+        rebuilt += len(batch)
+    return rebuilt
+
+
+def check_author_stats(profile_ids=None):
+    """
+    Compara los totales guardados con los calculados desde Snippet.
+
+    @return:
+        Lista de tuplas (profile_id, campo, guardado, esperado); vacia si todo cuadra.
+    """
+    mismatches = []
+    for batch in _profile_id_batches(profile_ids):
+        stored = {stats.profile_id: stats for stats in AuthorStats.objects.filter(profile_id__in=batch)}
+        for pk, expected in compute_stats(batch).items():
+            stats = stored.get(pk)
+            for field in STATS_FIELDS:
+                value = getattr(stats, field) if stats is not None else None
+                if stats is None or value != expected[field]:
+                    mismatches.append((pk, field, value, expected[field]))
+    return mismatches
+
+
+def get_author_stats(profile):
+    """
+    Totales de un autor. Si aun no tiene fila se calcula en el momento.
+    """
+    try:
+        return profile.stats
+    except AuthorStats.DoesNotExist:
+        rebuild_author_stats([profile.pk])
+        return AuthorStats.objects.get(profile=profile)
+
+
+def _adjust(profile_id, language, count_delta, visits_delta, pub_date=None):
+    if profile_id is None:
+        return
+    with transaction.atomic():
+        stats = AuthorStats.objects.select_for_update().filter(profile_id=profile_id).first()
+        if stats is None:
+            # Sin fila no hay base sobre la que sumar; get_author_stats() la calculara entera cuando se pida.
+            # Tampoco se crea aqui: el perfil puede estar borrandose en cascada.
+            return
+
+        stats.snippet_count = max(stats.snippet_count + count_delta, 0)
+        stats.total_visits += visits_delta
+        counts = stats.language_counts
+        if language is not None:
+            counts[language] = counts.get(language, 0) + count_delta
+            if counts[language] <= 0:
+                del counts[language]
+
+        if count_delta > 0 and pub_date and (stats.last_published is None or pub_date > stats.last_published):
+            stats.last_published = pub_date
+        elif count_delta < 0 and (pub_date is None or pub_date == stats.last_published):
+            stats.last_published = Snippet.objects.filter(author_id=profile_id).aggregate(
+                last=Max('pub_date'))['last']
+        stats.save()
+
+
+def snippet_saved(snippet, created, update_fields=None):
+    """
+    Aplica a los totales de sus autores el alta o la modificacion de un snippet.
+
+    Tiene que llamarse antes de Snippet.remember_loaded_values(), porque compara con los valores leidos.
+    """
+    current = snippet.__dict__
+    if created:
+        _adjust(snippet.author_id, snippet.language, 1, current.get('cont_visited') or 0, snippet.pub_date)
+        return
+
+    if not hasattr(snippet, '_loaded_values'):
+        # Instancia que no viene de la base de datos: no se sabe que ha cambiado.
+        rebuild_author_stats([snippet.author_id])
+        return
+
+    written = set(update_fields) if update_fields is not None else None
+    old_author = snippet.loaded_value('author_id')
+    old_language = snippet.loaded_value('language')
+    old_visits = snippet.loaded_value('cont_visited') or 0
+    visits = current.get('cont_visited')
+    if visits is None or (written is not None and 'cont_visited' not in written):
+        visits = old_visits
+
+    if old_language is None:
+        # language no se cargo (only()/defer()): no se sabe si ha cambiado, y no se consulta para saberlo.
+        if old_author != snippet.author_id:
+            rebuild_author_stats([pk for pk in (old_author, snippet.author_id) if pk is not None])
+        elif visits != old_visits:
+            _adjust(snippet.author_id, None, 0, visits - old_visits)
+        return
+
+    if (old_author, old_language) != (snippet.author_id, snippet.language):
+        _adjust(old_author, old_language, -1, -old_visits, current.get('pub_date'))
+        _adjust(snippet.author_id, snippet.language, 1, visits, current.get('pub_date'))
+    elif visits != old_visits:
+        _adjust(snippet.author_id, snippet.language, 0, visits - old_visits)
+
+
+def snippet_deleted(snippet):
+    """
+    Apunta el autor de un snippet borrado para recalcular sus totales al confirmar la transaccion.
+
+    Un delete() de un queryset o el borrado en cascada de un perfil borran muchos snippets seguidos: en vez
+    de ajustar (y bloquear) la fila del autor por cada uno, se reconstruyen una sola vez todos los autores
+    afectados, como en snippets.bulk. Los perfiles que se borran con ellos ya no existen y se saltan.
+    """
+    author_id = snippet.loaded_value('author_id') or snippet.author_id
+    if author_id is None:
+        return
+    connection = transaction.get_connection()
+    pending = connection.__dict__.setdefault('_deleted_snippet_authors', set())
+    pending.add(author_id)
+
+    def rebuild():
+        # El primer callback que se ejecuta recalcula todos los apuntados; los demas no encuentran nada.
+        # Si la transaccion se deshace, los autores apuntados se recalculan con el siguiente borrado.
+        profile_ids = set(pending)
+        pending.clear()
+        if profile_ids:
+            rebuild_author_stats(profile_ids)
+
+    transaction.on_commit(rebuild)
+
+
+def add_visits(deltas):
+    """
+    Suma a total_visits las visitas volcadas ({snippet_pk: delta}), con un UPDATE por lote.
+    """
+    items = list(deltas.items())
+    for start in range(0, len(items), FLUSH_BATCH_SIZE):
+        batch = items[start:start + FLUSH_BATCH_SIZE]
+        pks = [pk for pk, delta in batch]
+        visits = Snippet.objects.filter(pk__in=pks, author_id=OuterRef('profile_id')).annotate(
+            delta=Case(*[When(pk=pk, then=Value(delta)) for pk, delta in batch],
+                       default=Value(0), output_field=IntegerField()),
+        ).values('author_id').annotate(total=Sum('delta')).values('total')
+        AuthorStats.objects.filter(
+            profile_id__in=Snippet.objects.filter(pk__in=pks).values('author_id'),
+        ).update(total_visits=F('total_visits') + Coalesce(Subquery(visits), 0))
@@ -0,0 +1,26 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from accounts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar(profile, size=80):
+    """
+    Imagen del avatar de un perfil a size px: <picture> con las miniaturas WebP y JPEG (1x y 2x).
+    Si no hay miniaturas (avatar sin hash todavia o sin Pillow) enlaza el original.
+    """
+    sources = thumbnails.avatar_sources(profile, size)
+    if sources is None:
+        return format_html('<img src="{}" width="{}" height="{}" alt="avatar">', profile.avatar.url, size, size)
+
+    def srcset(ext):
+        return format_html_join(', ', '{} {}', sources[ext])
+
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}">'
+        '<img src="{}" srcset="{}" width="{}" height="{}" alt="avatar" decoding="async"></picture>',
+        srcset('webp'), sources['jpg'][0][0], srcset('jpg'), size, size,
+    )
@@ -1,3 +1,242 @@
-from django.test import TestCase
+import io
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from accounts import stats, thumbnails
+from accounts.models import AuthorStats, UserProfile
+from accounts.views import PROFILE_SNIPPETS_PER_PAGE
+from snippets.models import Snippet
+
 
 # Create your tests here.
+
+class ProfilePageTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('autor', password='secreta123')
+        cls.profile = UserProfile.objects.create(user=cls.user)
+        languages = ['python'] * (PROFILE_SNIPPETS_PER_PAGE + 3) + ['sql'] * 2
+        Snippet.objects.bulk_create(
+            Snippet(title=f'Snippet {i}', source_code='print("hola")', language=language, author=cls.profile)
+            for i, language in enumerate(languages)
+        )
+        # bulk_create no envia señales.
+        stats.rebuild_author_stats()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_public_profile_query_count(self):
+        # Perfil con sus totales (AuthorStats), COUNT para la paginacion y pagina de snippets.
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('accounts:public_profile', args=['autor']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_snippets'], PROFILE_SNIPPETS_PER_PAGE + 5)
+        self.assertEqual(len(response.context['page_obj']), PROFILE_SNIPPETS_PER_PAGE)
+
+    def test_own_profile_query_count(self):
+        self.client.force_login(self.user)
+        # Sesion y usuario, mas las mismas tres consultas del perfil publico.
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('accounts:profile'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_language_counts(self):
+        response = self.client.get(reverse('accounts:public_profile', args=['autor']))
+        counts = {item['language']: item['total'] for item in response.context['available_languages']}
+        self.assertEqual(counts, {'python': PROFILE_SNIPPETS_PER_PAGE + 3, 'sql': 2})
+
+    def test_language_filter_and_second_page(self):
+        url = reverse('accounts:public_profile', args=['autor'])
+        response = self.client.get(url, {'lang': 'Python', 'page': 2})
+        self.assertEqual(response.context['total_snippets'], PROFILE_SNIPPETS_PER_PAGE + 3)
+        self.assertEqual(response.context['page_obj'].number, 2)
+        self.assertEqual([s.language for s in response.context['page_obj']], ['python'] * 3)
+
+    def test_pagination_ignores_stats_drift(self):
+        AuthorStats.objects.filter(profile=self.profile).update(snippet_count=1, language_counts={'python': 1})
+        response = self.client.get(reverse('accounts:public_profile', args=['autor']), {'page': 2})
+        self.assertEqual(response.context['page_obj'].number, 2)
+        self.assertEqual(len(response.context['page_obj']), 5)
+
+        response = self.client.get(url, {'lang': 'sql'})
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertFalse(response.context['is_paginated'])
+
+
+class AuthorStatsTests(TestCase):
+
+    def setUp(self):
+        self.first = UserProfile.objects.create(user=User.objects.create_user('primero', password='secreta123'))
+        self.second = UserProfile.objects.create(user=User.objects.create_user('segundo', password='secreta123'))
+
+    def create_snippet(self, profile, language='python'):
+        return Snippet.objects.create(title='Snippet', source_code='print("hola")', language=language,
+                                      author=profile)
+
+    def test_incremental_updates_match_rebuild(self):
+        python = self.create_snippet(self.first)
+        sql = self.create_snippet(self.first, language='sql')
+        self.create_snippet(self.second)
+
+        snippet = Snippet.objects.get(pk=python.pk)
+        snippet.language = 'java'
+        snippet.save()
+        snippet = Snippet.objects.get(pk=sql.pk)
+        snippet.author = self.second
+        snippet.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Snippet.objects.get(pk=python.pk).delete()
+
+        first = AuthorStats.objects.get(profile=self.first)
+        self.assertEqual(first.snippet_count, 0)
+        self.assertEqual(first.language_counts, {})
+        self.assertIsNone(first.last_published)
+        second = AuthorStats.objects.get(profile=self.second)
+        self.assertEqual(second.snippet_count, 2)
+        self.assertEqual(second.language_counts, {'python': 1, 'sql': 1})
+        self.assertEqual(stats.check_author_stats(), [])
+
+    def test_save_with_deferred_language_keeps_language_counts(self):
+        snippet = self.create_snippet(self.first)
+        snippet = Snippet.objects.only('pk', 'title', 'author', 'cont_visited').get(pk=snippet.pk)
+        snippet.title = 'Editado'
+        snippet.save()
+
+        self.assertEqual(AuthorStats.objects.get(profile=self.first).language_counts, {'python': 1})
+        self.assertEqual(stats.check_author_stats(), [])
+
+    def test_queryset_delete_rebuilds_each_author_once(self):
+        for _ in range(5):
+            self.create_snippet(self.first)
+        self.create_snippet(self.second, language='sql')
+        with mock.patch.object(stats, 'rebuild_author_stats', wraps=stats.rebuild_author_stats) as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                Snippet.objects.filter(author=self.first).delete()
+        rebuild.assert_called_once_with({self.first.pk})
+        self.assertEqual(AuthorStats.objects.get(profile=self.first).snippet_count, 0)
+        self.assertEqual(stats.check_author_stats(), [])
+
+    def test_profile_cascade_does_not_lock_author_rows(self):
+        for _ in range(5):
+            self.create_snippet(self.first)
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            self.first.delete()
+        self.assertFalse([q for q in queries.captured_queries if 'FOR UPDATE' in q['sql']])
+        self.assertFalse(Snippet.objects.filter(author_id=self.first.pk).exists())
+        self.assertEqual(stats.check_author_stats(), [])
+
+    def test_flushed_visits_reach_total(self):
+        first = self.create_snippet(self.first)
+        second = self.create_snippet(self.first)
+        self.create_snippet(self.second)
+        stats.add_visits({first.pk: 3, second.pk: 2})
+
+        self.assertEqual(AuthorStats.objects.get(profile=self.first).total_visits, 5)
+        self.assertEqual(AuthorStats.objects.get(profile=self.second).total_visits, 0)
+
+    def test_check_detects_and_rebuild_fixes_drift(self):
+        self.create_snippet(self.first)
+        AuthorStats.objects.filter(profile=self.first).update(snippet_count=7)
+
+        self.assertEqual(stats.check_author_stats(), [(self.first.pk, 'snippet_count', 7, 1)])
+        stats.rebuild_author_stats()
+        self.assertEqual(stats.check_author_stats(), [])
+
+
+class AvatarThumbnailTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.profile = UserProfile.objects.create(user=User.objects.create_user('autor'))
+
+    def upload_avatar(self, color='red'):
+        content = io.BytesIO()
+        Image.new('RGB', (1200, 900), color).save(content, 'PNG')
+        self.profile.avatar = SimpleUploadedFile('avatar.png', content.getvalue(), content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.save()
+
+    def test_thumbnails_generated_on_upload(self):
+        self.upload_avatar()
+        digest = self.profile.avatar_hash
+        self.assertEqual(len(digest), thumbnails.HASH_LENGTH)
+        for size in thumbnails.AVATAR_SIZES:
+            with Image.open(default_storage.open(thumbnails.thumbnail_name(digest, size, 'webp'))) as image:
+                self.assertEqual(image.size, (size, size))
+
+        self.upload_avatar(color='blue')
+        self.assertNotEqual(self.profile.avatar_hash, digest)
+
+    def test_thumbnail_generated_lazily_with_long_cache(self):
+        self.upload_avatar()
+        name = thumbnails.thumbnail_name(self.profile.avatar_hash, 80, 'jpg')
+        default_storage.delete(name)
+
+        response = self.client.get(thumbnails.thumbnail_url(self.profile.avatar_hash, 80, 'jpg'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertTrue(default_storage.exists(name))
+        response.close()
+
+        self.assertEqual(self.client.get(thumbnails.thumbnail_url('0' * 20, 80, 'jpg')).status_code, 404)
+
+    def test_if_none_match_for_missing_thumbnail_is_404(self):
+        self.upload_avatar()
+        for digest, size in [('0' * 20, 80), (self.profile.avatar_hash, 81)]:
+            with self.subTest(digest=digest, size=size):
+                response = self.client.get(thumbnails.thumbnail_url(digest, size, 'jpg'),
+                                           HTTP_IF_NONE_MATCH=f'"{digest}-{size}.jpg"')
+                self.assertEqual(response.status_code, 404)
+
+        url = thumbnails.thumbnail_url(self.profile.avatar_hash, 80, 'jpg')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_concurrent_generation_does_not_duplicate_files(self):
+        self.upload_avatar()
+        digest = self.profile.avatar_hash
+        for size in thumbnails.AVATAR_SIZES:
+            for ext in thumbnails.FORMATS:
+                default_storage.delete(thumbnails.thumbnail_name(digest, size, ext))
+        name = thumbnails.thumbnail_name(digest, 80, 'jpg')
+        render = thumbnails.render_thumbnail
+
+        def render_and_race(image, size, ext):
+            # Otra peticion escribe la misma miniatura mientras esta la genera.
+            content = render(image, size, ext)
+            if (size, ext) == (80, 'jpg'):
+                default_storage.save(name, ContentFile(content))
+            return content
+
+        with mock.patch.object(thumbnails, 'render_thumbnail', side_effect=render_and_race):
+            written = thumbnails.generate_thumbnails(self.profile)
+        self.assertNotIn(name, written)
+        self.assertEqual(len(written), len(thumbnails.AVATAR_SIZES) * len(thumbnails.FORMATS) - 1)
+        _, files = default_storage.listdir(thumbnails.THUMBNAIL_DIR)
+        self.assertEqual(sorted(files), sorted(f'{digest}-{size}.{ext}' for size in thumbnails.AVATAR_SIZES
+                                               for ext in thumbnails.FORMATS))
+
+    def test_profile_page_links_thumbnails(self):
+        self.upload_avatar()
+        response = self.client.get(reverse('accounts:public_profile', args=['autor']))
+        self.assertContains(response, thumbnails.thumbnail_url(self.profile.avatar_hash, 160, 'webp') + ' 2x')
+        self.assertNotContains(response, self.profile.avatar.url)
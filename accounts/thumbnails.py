@@ -0,0 +1,132 @@
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# Miniaturas cuadradas del avatar (lado en px): 80 es el del perfil; 40 y 160 para listados y pantallas 2x.
+AVATAR_SIZES = (40, 80, 160)
+
+# WebP para los navegadores que lo aceptan y JPEG para el resto. Extension -> (formato de Pillow, Content-Type).
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpg': ('JPEG', 'image/jpeg'),
+}
+SAVE_OPTIONS = {
+    'webp': {'quality': 80, 'method': 6},
+    'jpg': {'quality': 85, 'optimize': True, 'progressive': True},
+}
+
+# El nombre de cada miniatura es el hash del avatar original mas tamaño y formato: nunca cambia de contenido,
+# asi que se puede cachear sin caducidad. La version va en el directorio; se sube si cambia como se generan.
+THUMBNAIL_DIR = 'avatars/thumbs/v1'
+
+# Longitud del hash del contenido guardado en UserProfile.avatar_hash.
+HASH_LENGTH = 20
+
+
+def is_enabled():
+    return Image is not None
+
+
+def content_hash(file):
+    """
+    Hash (sha256 truncado) del contenido de un fichero subido o guardado.
+    """
+    digest = hashlib.sha256()
+    file.open('rb')
+    try:
+        for chunk in file.chunks():
+            digest.update(chunk)
+    finally:
+        file.seek(0)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def thumbnail_name(digest, size, ext):
+    return f'{THUMBNAIL_DIR}/{digest}-{size}.{ext}'
+
+
+def thumbnail_url(digest, size, ext):
+    return reverse('accounts:avatar_thumbnail', args=[digest, size, ext])
+
+
+def render_thumbnail(image, size, ext):
+    """
+    Recorta la imagen al cuadrado central, la reduce a size x size y la codifica en ext.
+
+    @return:
+        bytes de la miniatura.
+    """
+    thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    if ext == 'jpg' and thumbnail.mode != 'RGB':
+        # JPEG no tiene transparencia: se apoya sobre fondo blanco, el del circulo del avatar.
+        background = Image.new('RGB', thumbnail.size, (255, 255, 255))
+        background.paste(thumbnail, mask=thumbnail.getchannel('A') if 'A' in thumbnail.getbands() else None)
+        thumbnail = background
+    output = io.BytesIO()
+    thumbnail.save(output, FORMATS[ext][0], **SAVE_OPTIONS[ext])
+    return output.getvalue()
+
+
+def generate_thumbnails(profile):
+    """
+    Genera las miniaturas del avatar del perfil que no existan todavia en el almacenamiento.
+
+    @return:
+        Lista de nombres de las miniaturas escritas.
+    """
+    if not is_enabled() or not profile.avatar or not profile.avatar_hash:
+        return []
+    missing = [
+        (size, ext) for size in AVATAR_SIZES for ext in FORMATS
+        if not default_storage.exists(thumbnail_name(profile.avatar_hash, size, ext))
+    ]
+    if not missing:
+        return []
+
+    profile.avatar.open('rb')
+    try:
+        with Image.open(profile.avatar) as image:
+            # En JPEG, draft() decodifica ya reducido (1/2, 1/4, 1/8): mucho menos trabajo con fotos grandes.
+            image.draft('RGB', (max(AVATAR_SIZES), max(AVATAR_SIZES)))
+            image = ImageOps.exif_transpose(image)
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+            written = []
+            for size, ext in missing:
+                name = thumbnail_name(profile.avatar_hash, size, ext)
+                # Otra peticion puede haberla generado mientras tanto (primera visita concurrente).
+                if default_storage.exists(name):
+                    continue
+                saved = default_storage.save(name, ContentFile(render_thumbnail(image, size, ext)))
+                if saved != name:
+                    # Se ha escrito entre exists() y save() y el almacenamiento ha renombrado la nuestra: sobra.
+                    default_storage.delete(saved)
+                    continue
+                written.append(saved)
+    finally:
+        profile.avatar.close()
+    return written
+
+
+def avatar_sources(profile, size):
+    """
+    URL de las miniaturas de un avatar para mostrarlo a size px, en 1x y 2x si hay tamaño para 2x.
+
+    @return:
+        Dict {extension: [(url, densidad), ...]}, o None si no hay miniaturas (sin avatar, sin hash todavia
+        o sin Pillow), y entonces se muestra el original.
+    """
+    if not is_enabled() or not profile.avatar or not profile.avatar_hash or size not in AVATAR_SIZES:
+        return None
+    densities = [(size, '1x')] + ([(size * 2, '2x')] if size * 2 in AVATAR_SIZES else [])
+    return {
+        ext: [(thumbnail_url(profile.avatar_hash, px, ext), density) for px, density in densities]
+        for ext in FORMATS
+    }
@@ -11,4 +11,5 @@ urlpatterns = [
     path("register/", views.register_user, name="register_user"),
     path("profile/", views.profile, name="profile"),
     path("profile/<str:username>/", views.profile_username, name="public_profile"),
+    path("avatar/<slug:digest>-<int:size>.<slug:ext>", views.avatar_thumbnail, name="avatar_thumbnail"),
 ]
@@ -1,11 +1,16 @@
 from django.contrib import messages
 from django.contrib.auth import forms, logout, login, authenticate
 from django.contrib.auth.decorators import login_required
+from django.core.files.storage import default_storage
 from django.db.models import Q
+from django.http import FileResponse, Http404
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.forms import UserCreationForm
+from django.views.decorators.http import condition, require_GET
 
+from accounts import stats, thumbnails
 from accounts.models import UserProfile
+from snippets import caching
 from snippets.models import Snippet
 from django.db.models import Count
 from django.core.paginator import Paginator
@@ -64,50 +69,74 @@ def register_user(request):
     return render(request, "accounts/register_user.html", {"form": form})
 
 
+PROFILE_SNIPPETS_PER_PAGE = 12
+
+
+def _profile_snippets_page(request, user_profile):
+    """
+    Pagina de snippets de un perfil, con el filtro ?lang= y los contadores por lenguaje.
+
+    Los contadores por lenguaje salen de AuthorStats (una fila por autor, ya unida al perfil con
+    select_related). La paginacion usa el COUNT real (indice por autor): si los totales se desviaran,
+    solo se veria en los contadores, no en paginas vacias o numeros de pagina incorrectos.
+    """
+    author_stats = stats.get_author_stats(user_profile)
+    labels = dict(Snippet.LENGUAJES_CHOICES)
+    language_counts = [
+        {'language': language, 'total': total, 'label': labels.get(language, language)}
+        for language, total in sorted(author_stats.language_counts.items())
+    ]
+
+    snippets = Snippet.objects.for_list().filter(author=user_profile).order_by('-pub_date', '-id')
+
+    language_filter = request.GET.get('lang')
+    if language_filter:
+        snippets = snippets.filter(language__iexact=language_filter)
+
+    paginator = Paginator(snippets, PROFILE_SNIPPETS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    total = paginator.count
+
+    return {
+        'snippets_list': page_obj,
+        'page_obj': page_obj,
+        'is_paginated': paginator.num_pages > 1,
+        'total_snippets': total,
+        'language_filter': language_filter,
+        'available_languages': language_counts,
+        'author_stats': author_stats,
+    }
+
+
 @login_required
 def profile(request):
     """
-    Muestra el perfil del usuario autenticado con sus snippets publicados.
+    Muestra el perfil del usuario autenticado con sus snippets publicados, paginados.
     """
-    user_profile = get_object_or_404(UserProfile, user=request.user)
-
-    snippets = Snippet.objects.filter(
-        author=user_profile
-    ).order_by('-pub_date')
+    user_profile = get_object_or_404(UserProfile.objects.select_related('user', 'stats'), user=request.user)
 
     context = {
         "user_profile": user_profile,
-        "snippets_list": snippets,
-        "page_title": f"Perfil de {request.user.username}"
+        "page_title": f"Perfil de {request.user.username}",
+        **_profile_snippets_page(request, user_profile),
     }
     return render(request, 'accounts/my_profile.html', context)
 
 
+@caching.cache_response(lambda request, username: [f'profiles:{username}'])
 def profile_username(request, username):
     """
-    Muestra el perfil público de un usuario por su nombre de usuario.
+    Muestra el perfil público de un usuario por su nombre de usuario, con sus snippets paginados.
     """
-    target_profile = get_object_or_404(UserProfile, user__username=username)
+    target_profile = get_object_or_404(UserProfile.objects.select_related('user', 'stats'), user__username=username)
     if request.user.is_authenticated and request.user == target_profile.user:
         return redirect('accounts:profile')
 
-    snippets = Snippet.objects.filter(author=target_profile)
-
-    snippets = snippets.order_by('-pub_date')
-
-    language_filter = request.GET.get('lang')
-    if language_filter:
-        snippets = snippets.filter(language__iexact=language_filter)
-
     context = {
         'target_profile': target_profile,
-        'snippets_list': snippets,
         'page_title': f'Perfil de {target_profile.user.username}',
         'is_own_profile': False,
-        'language_filter': language_filter,
-        'available_languages': Snippet.objects.filter(author=target_profile)
-        .values_list('language', flat=True)
-        .distinct()
+        **_profile_snippets_page(request, target_profile),
     }
 
     return render(request, 'accounts/public_profile.html', context)
@@ -123,3 +152,43 @@ def logout_user(request):
     logout(request)
     return redirect("snippets:index")
     # return render(request, 'accounts/logout_user.html')
+
+
+# Las miniaturas se llaman por el hash del avatar: su contenido no cambia nunca y se cachean un año.
+AVATAR_THUMBNAIL_MAX_AGE = 365 * 24 * 3600
+
+
+def _avatar_thumbnail_etag(request, digest, size, ext):
+    """
+    ETag de una miniatura: su nombre, que nunca cambia de contenido. None si no existe ni se puede generar,
+    para que un If-None-Match de una miniatura inexistente llegue a la vista y responda 404 en vez de 304.
+    """
+    if size not in thumbnails.AVATAR_SIZES or ext not in thumbnails.FORMATS:
+        return None
+    if not default_storage.exists(thumbnails.thumbnail_name(digest, size, ext)) and \
+            not UserProfile.objects.filter(avatar_hash=digest).exclude(avatar='').exists():
+        return None
+    return f'{digest}-{size}.{ext}'
+
+
+@require_GET
+@condition(etag_func=_avatar_thumbnail_etag)
+def avatar_thumbnail(request, digest, size, ext):
+    """
+    Sirve una miniatura de avatar (accounts.thumbnails). Si todavia no existe (avatar anterior a las
+    miniaturas, o fallo al subirlo) se genera en esta peticion.
+    """
+    if size not in thumbnails.AVATAR_SIZES or ext not in thumbnails.FORMATS:
+        raise Http404()
+    name = thumbnails.thumbnail_name(digest, size, ext)
+    if not default_storage.exists(name):
+        user_profile = UserProfile.objects.filter(avatar_hash=digest).exclude(avatar='').first()
+        if user_profile is None:
+            raise Http404()
+        thumbnails.generate_thumbnails(user_profile)
+        if not default_storage.exists(name):
+            raise Http404()
+
+    response = FileResponse(default_storage.open(name), content_type=thumbnails.FORMATS[ext][1])
+    response['Cache-Control'] = f'public, max-age={AVATAR_THUMBNAIL_MAX_AGE}, immutable'
+    return response
@@ -1,12 +1,128 @@
+from django import forms
+from django.contrib import messages
+from django.contrib.admin import helpers
 from django.contrib.gis import admin
+from django.template.response import TemplateResponse
+
+from accounts.models import UserProfile
+from snippets import bulk
 from snippets.models import Snippet
+from snippets.pagination import EstimatedCountPaginator, estimate_count
+
+
+class HasLocationFilter(admin.SimpleListFilter):
+    """
+    Con o sin posicion; "point IS NOT NULL" es el predicado de los indices GiST parciales.
+    """
+    title = 'posición'
+    parameter_name = 'located'
+
+    def lookups(self, request, model_admin):
+        return [('yes', 'Con posición'), ('no', 'Sin posición')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.filter(point__isnull=False)
+        if self.value() == 'no':
+            return queryset.filter(point__isnull=True)
+        return queryset
+
+
+class ReassignAuthorForm(forms.Form):
+    username = forms.CharField(label='Nuevo autor (usuario)', max_length=150)
 
+    def clean_username(self):
+        username = self.cleaned_data['username']
+        try:
+            self.cleaned_data['author'] = UserProfile.objects.get(user__username=username)
+        except UserProfile.DoesNotExist:
+            raise forms.ValidationError(f'No existe ningún perfil con el usuario "{username}".')
+        return username
 
-# Register your models here.
 
-# admin.site.register(Snippet)
+class ConfirmForm(forms.Form):
+    pass
 
 
 @admin.register(Snippet)
 class MarkerAdmin(admin.GISModelAdmin):
-    list_display = ("title", "point")
+    """
+    Admin de snippets pensado para tablas con millones de filas: total estimado en vez de COUNT(*),
+    filtros y orden que usan indices, el autor en el mismo SELECT y acciones masivas por lotes
+    (snippets.bulk) en vez de delete()/save() por objeto.
+    """
+    list_display = ("title", "language", "author_username", "pub_date", "cont_visited", "location")
+    list_select_related = ("author__user",)
+    list_filter = ("language", ("pub_date", admin.DateFieldListFilter), HasLocationFilter)
+    # title usa el indice trigram de UPPER(title) (icontains); el usuario, el unico de auth_user.
+    search_fields = ("title", "=author__user__username")
+    # snippet_feed_idx / snippet_lang_feed_idx; no se ofrece ordenar por columnas sin indice.
+    ordering = ("-pub_date", "-id")
+    sortable_by = ("pub_date",)
+    raw_id_fields = ("author",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    actions = ["delete_snippets", "reassign_author", "clear_location"]
+
+    @admin.display(description="autor", ordering="author__user__username")
+    def author_username(self, snippet):
+        return snippet.author.user.username if snippet.author else "-"
+
+    @admin.display(description="posición")
+    def location(self, snippet):
+        if snippet.point is None:
+            return "-"
+        return f"{snippet.point.y:.5f}, {snippet.point.x:.5f}"
+
+    def get_actions(self, request):
+        # delete_selected borra objeto a objeto y lista en la confirmacion todo lo relacionado.
+        actions = super().get_actions(request)
+        actions.pop("delete_selected", None)
+        return actions
+
+    def _confirm(self, request, queryset, action, title, form):
+        """
+        Pagina intermedia de una accion: cuantos snippets se van a cambiar y, si hace falta, un formulario.
+        """
+        select_across = request.POST.get("select_across", "0")
+        total = estimate_count(queryset) if select_across == "1" else len(request.POST.getlist(
+            helpers.ACTION_CHECKBOX_NAME))
+        context = {
+            **self.admin_site.each_context(request),
+            "title": title,
+            "opts": self.model._meta,
+            "form": form,
+            "action": action,
+            "total": total,
+            "estimated": select_across == "1",
+            "select_across": select_across,
+            "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+        }
+        return TemplateResponse(request, "admin/snippets/snippet/bulk_action.html", context)
+
+    @admin.action(description="Borrar los snippets seleccionados", permissions=["delete"])
+    def delete_snippets(self, request, queryset):
+        form = ConfirmForm(request.POST if "apply" in request.POST else None)
+        if not form.is_valid():
+            return self._confirm(request, queryset, "delete_snippets", "Borrar snippets", form)
+        deleted = bulk.delete_snippets(queryset)
+        self.message_user(request, f"{deleted} snippets borrados.", messages.SUCCESS)
+
+    @admin.action(description="Reasignar autor", permissions=["change"])
+    def reassign_author(self, request, queryset):
+        form = ReassignAuthorForm(request.POST if "apply" in request.POST else None)
+        if not form.is_valid():
+            return self._confirm(request, queryset, "reassign_author", "Reasignar autor", form)
+        updated = bulk.reassign_author(queryset, form.cleaned_data["author"])
+        self.message_user(request, f"{updated} snippets reasignados a {form.cleaned_data['username']}.",
+                          messages.SUCCESS)
+
+    @admin.action(description="Quitar la posición", permissions=["change"])
+    def clear_location(self, request, queryset):
+        form = ConfirmForm(request.POST if "apply" in request.POST else None)
+        if not form.is_valid():
+            return self._confirm(request, queryset, "clear_location", "Quitar la posición", form)
+        updated = bulk.clear_location(queryset)
+        self.message_user(request, f"Posición quitada a {updated} snippets.", messages.SUCCESS)
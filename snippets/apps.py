@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class SnippetsConfig(AppConfig):
     name = 'snippets'
+
+    def ready(self):
+        from snippets import signals  # noqa: F401
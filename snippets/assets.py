@@ -0,0 +1,292 @@
+import base64
+import functools
+import gzip
+import hashlib
+import posixpath
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+# Directorio static de la app: aqui se guardan las librerias descargadas (vendor/) y los bundles (bundles/).
+STATIC_DIR = Path(__file__).resolve().parent / 'static'
+VENDOR_PREFIX = 'vendor/'
+BUNDLES_PREFIX = 'bundles/'
+
+PRISM_CDN = 'https://cdnjs.cloudflare.com/ajax/libs/prism/1.29.0'
+LEAFLET_CDN = 'https://unpkg.com/leaflet@1.9.4/dist'
+
+# Librerias de terceros, con la version fijada: ruta dentro de static/vendor/ -> (URL de origen, hash SRI).
+# vendor_assets las descarga y rechaza las que no coinciden con el hash, y build_assets lo vuelve a comprobar
+# antes de meterlas en un bundle. Con None el hash no esta fijado todavia: vendor_assets solo las descarga con
+# --pin y escribe el hash para revisarlo y fijarlo aqui. Mientras no esten en static/vendor/, las plantillas
+# las piden a su CDN (con integrity si el hash esta fijado): sin red externa hay que ejecutar vendor_assets
+# al desplegar.
+VENDOR_FILES = {
+    'bootstrap/bootstrap.min.css': ('https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css', None),
+    'bootstrap/bootstrap.bundle.min.js': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js', None),
+    'prism/prism-tomorrow.min.css': (f'{PRISM_CDN}/themes/prism-tomorrow.min.css', None),
+    # El mismo fichero que trae django.contrib.admin (static/admin/js/vendor/jquery), ya en static/vendor/.
+    'jquery/jquery.min.js': ('https://code.jquery.com/jquery-3.7.1.min.js',
+                             'sha384-1H217gwSVyLSIfaLxHbE7dRb3v4mYCKbpQvzx0cegeju1MVsGrX5xXxAvs/HgeFs'),
+    'leaflet/leaflet.css': (f'{LEAFLET_CDN}/leaflet.css', None),
+    'leaflet/leaflet.js': (f'{LEAFLET_CDN}/leaflet.js', None),
+    'geoman/leaflet-geoman.css': ('https://unpkg.com/@geoman-io/leaflet-geoman-free@2.17.0/dist/leaflet-geoman.css',
+                                  None),
+    'geoman/leaflet-geoman.js': ('https://unpkg.com/@geoman-io/leaflet-geoman-free@2.17.0/dist/leaflet-geoman.js',
+                                 None),
+    'sweetalert2/sweetalert2.min.css': (
+        'https://cdn.jsdelivr.net/npm/sweetalert2@11.26.20/dist/sweetalert2.min.css', None),
+    'sweetalert2/sweetalert2.min.js': (
+        'https://cdn.jsdelivr.net/npm/sweetalert2@11.26.20/dist/sweetalert2.min.js', None),
+    # Imagenes que referencia leaflet.css (url(images/...)).
+    **{f'leaflet/images/{image}': (f'{LEAFLET_CDN}/images/{image}', None)
+       for image in ('layers.png', 'layers-2x.png', 'marker-icon.png', 'marker-icon-2x.png', 'marker-shadow.png')},
+}
+
+# Componentes de Prism para los lenguajes de Snippet.LENGUAJES_CHOICES, en orden de dependencias.
+# Van en el bundle en lugar del autoloader, que los descargaba del CDN al vuelo.
+PRISM_COMPONENTS = ('core', 'clike', 'markup', 'css', 'javascript', 'typescript', 'python', 'sql', 'java',
+                    'kotlin', 'markup-templating', 'php', 'django', 'markdown')
+VENDOR_FILES.update({
+    f'prism/prism-{component}.min.js': (f'{PRISM_CDN}/components/prism-{component}.min.js', None)
+    for component in PRISM_COMPONENTS
+})
+
+_BASE_CSS = ['vendor/bootstrap/bootstrap.min.css']
+_BASE_JS = ['vendor/bootstrap/bootstrap.bundle.min.js', 'snippets/autocomplete.js']
+
+# Un bundle por tipo de pagina: cada pagina carga un solo CSS y un solo JS.
+BUNDLES = {
+    # Formularios de cuentas y paginas sin codigo.
+    'base': {
+        'css': _BASE_CSS,
+        'js': _BASE_JS,
+    },
+    # Listados y detalle con codigo: estilos de Pygments y Prism (cuando el resaltado es en el navegador).
+    'code': {
+        'css': [*_BASE_CSS, 'snippets/style.css', 'snippets/pygments.css', 'vendor/prism/prism-tomorrow.min.css'],
+        'js': [*_BASE_JS, *[f'vendor/prism/prism-{component}.min.js' for component in PRISM_COMPONENTS]],
+    },
+    'map': {
+        'css': [*_BASE_CSS, 'vendor/leaflet/leaflet.css', 'vendor/geoman/leaflet-geoman.css',
+                'vendor/sweetalert2/sweetalert2.min.css'],
+        'js': ['vendor/jquery/jquery.min.js', *_BASE_JS, 'vendor/leaflet/leaflet.js',
+               'vendor/geoman/leaflet-geoman.js', 'vendor/sweetalert2/sweetalert2.min.js', 'snippets/mapa.js'],
+    },
+}
+
+# Tipos que se guardan tambien comprimidos (.gz y .br), y tamaño minimo para que compense.
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.map', '.html')
+COMPRESS_MIN_BYTES = 512
+
+class VendorIntegrityError(ValueError):
+    pass
+
+
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+_HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^/.]+(\.(gz|br))?$')
+_SOURCE_MAP = re.compile(r'^\s*(//|/\*)# sourceMappingURL=.*$', re.MULTILINE)
+
+
+def bundle_path(name, kind):
+    return f'{BUNDLES_PREFIX}{name}.{kind}'
+
+
+def check_integrity(name, content):
+    """
+    Comprueba una libreria de VENDOR_FILES (name sin el prefijo vendor/) contra su hash fijado.
+
+    Lanza VendorIntegrityError si no coincide; las que no tienen hash fijado no se comprueban.
+    """
+    expected = VENDOR_FILES[name][1]
+    actual = sri_hash(content)
+    if expected is not None and actual != expected:
+        raise VendorIntegrityError(f'{name}: el contenido tiene {actual} y el hash fijado es {expected}')
+
+
+def _rebase_css_urls(css, source):
+    """
+    Reescribe las url() relativas de un CSS de source para que sigan apuntando al mismo fichero desde bundles/.
+    """
+    def rebase(match):
+        quote, url = match.groups()
+        if url.startswith(('data:', 'http:', 'https:', '/', '#')):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(source), url))
+        return f'url({quote}{posixpath.relpath(target, BUNDLES_PREFIX.rstrip("/"))}{quote})'
+
+    return _CSS_URL.sub(rebase, css)
+
+
+def minify_css(css):
+    if rcssmin is not None:
+        return rcssmin.cssmin(css)
+    # Sin rcssmin: solo comentarios y espacios alrededor de llaves, ';' y ','. No toca ':' (".a :hover").
+    css = re.sub(r'/\*(?!!).*?\*/', '', css, flags=re.DOTALL)
+    css = re.sub(r'\s+', ' ', css)
+    return re.sub(r'\s*([{};,])\s*', r'\1', css).strip()
+
+
+def minify_js(js):
+    # Sin rjsmin no se toca: las librerias ya vienen minificadas y un minificador a medias puede romper el codigo.
+    return rjsmin.jsmin(js) if rjsmin is not None else js
+
+
+def build_bundle(name, kind):
+    """
+    Concatena y minifica los ficheros del bundle. Devuelve el texto resultante.
+
+    Lanza FileNotFoundError si falta alguno (las librerias de vendor/ se descargan con vendor_assets) y
+    VendorIntegrityError si una libreria no coincide con su hash fijado.
+    """
+    parts = []
+    for source in BUNDLES[name][kind]:
+        path = finders.find(source)
+        if path is None:
+            raise FileNotFoundError(source)
+        content = Path(path).read_bytes()
+        if source.startswith(VENDOR_PREFIX):
+            check_integrity(source[len(VENDOR_PREFIX):], content)
+        text = _SOURCE_MAP.sub('', content.decode('utf-8'))
+        if kind == 'css':
+            parts.append(minify_css(_rebase_css_urls(text, source)))
+        else:
+            # Ya minificado: no se vuelve a pasar por el minificador.
+            parts.append(text if '.min.' in source else minify_js(text))
+    # ";" entre ficheros JS por si alguno no termina en punto y coma.
+    return ('\n' if kind == 'css' else '\n;\n').join(parts)
+
+
+def build_bundles():
+    """
+    Genera todos los bundles en static/bundles/. Devuelve {ruta: bytes}.
+    """
+    sizes = {}
+    for name, kinds in BUNDLES.items():
+        for kind in kinds:
+            path = STATIC_DIR / bundle_path(name, kind)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            content = build_bundle(name, kind).encode('utf-8')
+            path.write_bytes(content)
+            sizes[bundle_path(name, kind)] = len(content)
+    return sizes
+
+
+def compress_file(path):
+    """
+    Escribe junto a path sus variantes .gz (y .br si esta instalado brotli) cuando reducen el tamaño.
+
+    @return:
+        Lista de ficheros escritos.
+    """
+    path = Path(path)
+    if not path.name.endswith(COMPRESSIBLE_EXTENSIONS):
+        return []
+    content = path.read_bytes()
+    if len(content) < COMPRESS_MIN_BYTES:
+        return []
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content)
+    written = []
+    for suffix, compressed in variants.items():
+        if len(compressed) < len(content):
+            target = path.with_name(path.name + suffix)
+            target.write_bytes(compressed)
+            written.append(target)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage (nombres con el hash del contenido) que al hacer collectstatic deja tambien
+    las variantes .gz/.br de cada fichero, para servirlas sin comprimir en cada peticion.
+    """
+
+    def stored_name(self, name):
+        # Sin collectstatic todavia (tests, checks) no hay manifest: se enlaza el nombre sin hash en vez de fallar.
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in {*paths, *self.hashed_files.values()}:
+            if self.exists(name):
+                compress_file(self.path(name))
+
+
+def is_hashed_name(name):
+    """
+    Si name lleva el hash del contenido que añade ManifestStaticFilesStorage ("style.55e7cbb9ba48.css").
+    """
+    return _HASHED_NAME.search(name) is not None
+
+
+@functools.lru_cache(maxsize=None)
+def _available_cached(path):
+    return finders.find(path) is not None
+
+
+def is_available(path):
+    # En desarrollo se mira cada vez, para ver los bundles recien generados sin reiniciar.
+    return finders.find(path) is not None if settings.DEBUG else _available_cached(path)
+
+
+def source_link(source):
+    """
+    (URL, integrity) de un fichero de un bundle: el local si existe; una libreria sin descargar, desde su CDN
+    y con su hash fijado para que el navegador rechace un fichero distinto.
+    """
+    if source.startswith(VENDOR_PREFIX) and not is_available(source):
+        return VENDOR_FILES[source[len(VENDOR_PREFIX):]]
+    return static(source), None
+
+
+def bundle_links(name, kind):
+    """
+    (URL, integrity) del bundle generado o, si no se ha generado todavia (build_assets), de cada uno de sus
+    ficheros.
+    """
+    path = bundle_path(name, kind)
+    if is_available(path):
+        return [(static(path), None)]
+    return [source_link(source) for source in BUNDLES[name][kind]]
+
+
+def bundle_tags(name, kind):
+    template = '<link rel="stylesheet" href="{}"{}>' if kind == 'css' else '<script src="{}"{}></script>'
+    return format_html_join('\n', template, (
+        (url, format_html(' integrity="{}" crossorigin="anonymous"', integrity) if integrity else '')
+        for url, integrity in bundle_links(name, kind)
+    ))
+
+
+def sri_hash(content):
+    """
+    Hash en formato Subresource Integrity (sha384-...), para comparar una descarga con el publicado.
+    """
+    return 'sha384-' + base64.b64encode(hashlib.sha384(content).digest()).decode()
@@ -0,0 +1,120 @@
+from django.db.models import Count, Max, Sum
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, render
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
+
+from snippets import caching, sync, visits
+from snippets.geojson import aiter_feature_collection
+from snippets.live import LIVE_PATH
+from snippets.models import Snippet
+from snippets.views import (
+    GEOM_FIELD,
+    _geojson_etag,
+    _geojson_last_modified,
+    _geojson_queryset,
+    _parse_bbox,
+    _snippet_detail_etag,
+    _snippet_detail_last_modified,
+)
+
+# Versiones async de las vistas de solo lectura de snippets.views, para servir con CodeAtlas.asgi
+# (se activan con SNIPPETS_ASYNC_VIEWS, ver snippets.urls). Mismas respuestas, cabeceras y cache:
+# las funciones de ETag/Last-Modified son las de views, y aqui solo se precalcula su estado con el
+# ORM asincrono para que @condition no toque la base de datos desde el bucle de eventos.
+
+
+async def _load_user(request):
+    # request.user es perezoso y sincrono; la cabecera de las paginas y la cache de respuestas lo usan.
+    request.user = await request.auser()
+
+
+@require_GET
+async def map_snippet(request):
+    """
+    Renderiza la pagina del mapa para visualizar snippets.
+    """
+    await _load_user(request)
+    return render(request, "snippets/mapa_snippets.html", {"live_path": LIVE_PATH})
+
+
+async def snippet_detail(request, pk):
+    """
+    Muestra los detalles de un snippet especifico identificado por su pk.
+    """
+    await _load_user(request)
+    request._snippet_detail_state = await Snippet.objects.filter(pk=pk).values_list(
+        "pub_update", "cont_visited").afirst()
+    if request._snippet_detail_state is None:
+        raise Http404()
+    await visits.arecord_visit(pk)
+    return await _snippet_detail_page(request, pk)
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_snippet_detail_etag, last_modified_func=_snippet_detail_last_modified)
+@caching.cache_response(lambda request, pk: [f'snippets:detail:{pk}'])
+async def _snippet_detail_page(request, pk):
+    snippet = await aget_object_or_404(Snippet.objects.select_related('author__user'), pk=pk)
+    return render(request, 'snippets/snippet_detail.html', {'snippet': snippet})
+
+
+async def _load_geojson_state(request):
+    """
+    Lo mismo que views._geojson_state(), con una sola consulta asincrona.
+    """
+    request._geojson_state = None
+    if "since" in request.GET:
+        return
+    try:
+        bbox = _parse_bbox(request.GET["bbox"]) if request.GET.get("bbox") else None
+    except ValueError:
+        return
+    state = await _geojson_queryset(bbox).aaggregate(
+        last_update=Max("pub_update"), total=Count("id"), visits=Sum("cont_visited")
+    )
+    request._geojson_state = (state["last_update"], state["total"], state["visits"] or 0)
+
+
+@require_GET
+async def snippets_geojson(request):
+    """
+    Endpoint API que retorna los snippets en formato GeoJSON para Leaflet (ver views.snippets_geojson).
+    """
+    await _load_user(request)
+    await _load_geojson_state(request)
+    return await _snippets_geojson(request)
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=_geojson_etag, last_modified_func=_geojson_last_modified)
+@caching.cache_response(lambda request: ['snippets:map'], bypass=lambda request: "since" in request.GET)
+async def _snippets_geojson(request):
+    timestamp = sync.timestamp()
+    bbox = request.GET.get("bbox")
+    if bbox:
+        try:
+            bbox = _parse_bbox(bbox)
+        except ValueError:
+            return HttpResponseBadRequest("bbox inválido. Formato: minx,miny,maxx,maxy")
+
+    members = None
+    if "since" in request.GET:
+        try:
+            since = sync.parse_since(request.GET["since"])
+        except (ValueError, OverflowError, OSError):
+            return HttpResponseBadRequest("since inválido. Debe ser un timestamp en segundos")
+        try:
+            qs, removed = await sync.achanges_since(since, bbox)
+        except sync.SyncExpired:
+            return JsonResponse({"reset": True, "timestamp": timestamp})
+        members = {"timestamp": timestamp, "removed": removed}
+    else:
+        qs = _geojson_queryset(bbox)
+
+    response = StreamingHttpResponse(
+        aiter_feature_collection(qs, GEOM_FIELD, members=members),
+        content_type="application/json",
+    )
+    response["X-Map-Timestamp"] = timestamp
+    return response
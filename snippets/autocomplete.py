@@ -0,0 +1,75 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity, TrigramWordSimilarity
+from django.core.cache import caches
+
+from snippets.models import Snippet, SnippetSearch
+
+# Con menos de 3 caracteres no hay ningun trigrama completo y PostgreSQL no puede usar los indices pg_trgm.
+AUTOCOMPLETE_MIN_CHARS = 3
+AUTOCOMPLETE_MAX_CHARS = 50
+AUTOCOMPLETE_LIMIT = 8
+
+# Se pide en cada pulsacion: una cache corta absorbe las rafagas de teclas repetidas.
+AUTOCOMPLETE_CACHE_TIMEOUT = 30
+
+
+def get_autocomplete_cache():
+    return caches[getattr(settings, 'SNIPPETS_AUTOCOMPLETE_CACHE', 'default')]
+
+
+def normalize(text):
+    return text.strip()[:AUTOCOMPLETE_MAX_CHARS]
+
+
+def _matching_titles(text, limit):
+    return list(
+        Snippet.objects.filter(title__icontains=text)
+        .annotate(similarity=TrigramSimilarity('title', text))
+        .order_by('-similarity', '-pub_date')
+        .values('id', 'title', 'language')[:limit]
+    )
+
+
+def _matching_identifiers(text, limit):
+    needle = text.lower()
+    identifiers = {}
+    # Antes de recortar se ordena por el identificador mas parecido de cada snippet (word_similarity) y, a
+    # igualdad, por el mas reciente: sin orden, PostgreSQL devolveria filas distintas en cada consulta.
+    rows = (
+        SnippetSearch.objects.filter(identifiers__icontains=text)
+        .annotate(similarity=TrigramWordSimilarity(text, 'identifiers'))
+        .order_by('-similarity', '-snippet_id')
+        .values_list('snippet_id', 'identifiers')
+    )
+    for snippet_id, names in rows[:limit * 4]:
+        for name in names.split():
+            if needle in name.lower() and name not in identifiers:
+                identifiers[name] = snippet_id
+    # Primero los que empiezan por el texto, luego los mas cortos (los mas parecidos a lo tecleado).
+    ordered = sorted(identifiers, key=lambda name: (not name.lower().startswith(needle), len(name), name))
+    return [{'identifier': name, 'snippet_id': identifiers[name]} for name in ordered[:limit]]
+
+
+def autocomplete(text, limit=AUTOCOMPLETE_LIMIT):
+    """
+    Sugerencias de titulos e identificadores que contienen el texto, via indices de trigramas (pg_trgm).
+
+    @return:
+        Dict {titles: [...], identifiers: [...]}, o listas vacias si el texto es demasiado corto.
+    """
+    text = normalize(text)
+    if len(text) < AUTOCOMPLETE_MIN_CHARS:
+        return {'titles': [], 'identifiers': []}
+
+    cache = get_autocomplete_cache()
+    key = 'snippets:autocomplete:%s:%s' % (limit, hashlib.md5(text.lower().encode()).hexdigest())
+    result = cache.get(key)
+    if result is None:
+        result = {
+            'titles': _matching_titles(text, limit),
+            'identifiers': _matching_identifiers(text, limit),
+        }
+        cache.set(key, result, AUTOCOMPLETE_CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,121 @@
+from django.db import connections, transaction
+from django.utils import timezone
+
+from accounts import stats as author_stats
+from accounts.models import UserProfile
+from snippets import caching, highlighting, live, tiles
+from snippets.models import Snippet, SnippetSearch, SnippetTombstone
+
+# Operaciones masivas sobre snippets (acciones del admin) con consultas por lotes en vez de save()/delete()
+# por objeto. Como no pasan por las señales de snippets.signals, mantienen aqui lo mismo que ellas:
+# tombstones, teselas, cache de respuestas, totales de los autores y aviso a los mapas en vivo.
+
+# Snippets por lote; cada lote va en su propia transaccion.
+BULK_BATCH_SIZE = 1000
+
+
+def _batches(queryset):
+    """
+    Recorre el queryset por lotes de (pk, author_id, point) en orden de pk, sin OFFSET.
+
+    Cada lote se lee despues de aplicar el anterior, asi que se puede borrar o modificar lo ya leido.
+    """
+    queryset = queryset.order_by('pk')
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(pk__gt=last)
+        rows = list(page.values_list('pk', 'author_id', 'point')[:BULK_BATCH_SIZE])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+
+def _invalidate(rows, author_ids, points=()):
+    """
+    Invalida (al confirmar la transaccion) las teselas de points y las paginas cacheadas de los snippets y autores.
+    """
+    usernames = UserProfile.objects.filter(pk__in=[pk for pk in author_ids if pk is not None]) \
+        .values_list('user__username', flat=True)
+    groups = ['snippets:list', 'snippets:map',
+              *[f'snippets:detail:{pk}' for pk, author_id, point in rows],
+              *[f'profiles:{username}' for username in usernames]]
+
+    def on_commit():
+        tiles.invalidate_points(points)
+        caching.invalidate(*groups)
+
+    transaction.on_commit(on_commit)
+
+
+def _finish(author_ids):
+    author_stats.rebuild_author_stats({pk for pk in author_ids if pk is not None})
+    # Los mapas conectados piden los cambios por ?since= en vez de recibir un evento por snippet.
+    live.publish({'type': 'resync'})
+
+
+def delete_snippets(queryset):
+    """
+    Borra los snippets del queryset con un DELETE por lote (mas el de su SnippetSearch).
+
+    @return:
+        Numero de snippets borrados.
+    """
+    deleted = 0
+    author_ids = set()
+    for rows in _batches(queryset):
+        pks = [pk for pk, author_id, point in rows]
+        batch_authors = {author_id for pk, author_id, point in rows}
+        points = [point for pk, author_id, point in rows]
+        with transaction.atomic(using=queryset.db):
+            SnippetSearch.objects.filter(snippet_id__in=pks).delete()
+            SnippetTombstone.objects.bulk_create(
+                [SnippetTombstone(snippet_id=pk) for pk, author_id, point in rows if point is not None])
+            with connections[queryset.db].cursor() as cursor:
+                cursor.execute(f'DELETE FROM {Snippet._meta.db_table} WHERE id = ANY(%s)', [pks])
+                deleted += cursor.rowcount
+            _invalidate(rows, batch_authors, points)
+        for pk in pks:
+            highlighting.invalidate_snippet(pk)
+        author_ids |= batch_authors
+    _finish(author_ids)
+    return deleted
+
+
+def reassign_author(queryset, profile):
+    """
+    Pasa los snippets del queryset al autor profile con un UPDATE por lote.
+
+    @return:
+        Numero de snippets reasignados.
+    """
+    updated = 0
+    author_ids = {profile.pk}
+    for rows in _batches(queryset.exclude(author=profile)):
+        batch_authors = {author_id for pk, author_id, point in rows} | {profile.pk}
+        with transaction.atomic(using=queryset.db):
+            # update() no aplica auto_now: pub_update se pone a mano para la sincronizacion del mapa.
+            updated += Snippet.objects.filter(pk__in=[pk for pk, author_id, point in rows]).update(
+                author=profile, pub_update=timezone.now())
+            _invalidate(rows, batch_authors)
+        author_ids |= batch_authors
+    _finish(author_ids)
+    return updated
+
+
+def clear_location(queryset):
+    """
+    Quita la posicion de los snippets del queryset con un UPDATE por lote.
+
+    @return:
+        Numero de snippets que tenian posicion.
+    """
+    updated = 0
+    for rows in _batches(queryset.filter(point__isnull=False)):
+        with transaction.atomic(using=queryset.db):
+            updated += Snippet.objects.filter(pk__in=[pk for pk, author_id, point in rows]).update(
+                point=None, pub_update=timezone.now())
+            _invalidate(rows, {author_id for pk, author_id, point in rows}, [point for pk, author_id, point in rows])
+    # Los totales de los autores no dependen de la posicion: solo hace falta avisar a los mapas.
+    live.publish({'type': 'resync'})
+    return updated
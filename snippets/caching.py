@@ -0,0 +1,201 @@
+import functools
+import hashlib
+import time
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+# Prefijo de todas las claves de la cache de respuestas.
+KEY_PREFIX = 'respcache'
+
+# Vistas decoradas, para listar sus contadores en el endpoint de monitorizacion.
+_namespaces = set()
+
+
+def get_view_cache():
+    return caches[getattr(settings, 'SNIPPETS_VIEW_CACHE', 'default')]
+
+
+def view_cache_timeout():
+    return getattr(settings, 'SNIPPETS_VIEW_CACHE_TIMEOUT', 300)
+
+
+def _group_key(group):
+    return f'{KEY_PREFIX}:group:{group}'
+
+
+def group_versions(cache, groups):
+    """
+    Version actual de cada grupo de invalidacion. Los grupos sin version se inicializan.
+    """
+    keys = [_group_key(group) for group in groups]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+async def agroup_versions(cache, groups):
+    """
+    Version asincrona de group_versions(), para las vistas async.
+    """
+    keys = [_group_key(group) for group in groups]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, time.time_ns(), None)
+            versions[key] = await cache.aget(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*groups):
+    """
+    Invalida todas las respuestas cacheadas de los grupos dados: cambia su version y las claves antiguas
+    dejan de usarse (caducan solas por timeout).
+    """
+    cache = get_view_cache()
+    cache.set_many({_group_key(group): time.time_ns() for group in groups}, None)
+
+
+def _count(cache, namespace, counter):
+    key = f'{KEY_PREFIX}:stats:{namespace}:{counter}'
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+async def _acount(cache, namespace, counter):
+    key = f'{KEY_PREFIX}:stats:{namespace}:{counter}'
+    if not await cache.aadd(key, 1, None):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            await cache.aset(key, 1, None)
+
+
+def stats():
+    """
+    Contadores de aciertos y fallos por vista, para monitorizacion.
+    """
+    cache = get_view_cache()
+    keys = {
+        (namespace, counter): f'{KEY_PREFIX}:stats:{namespace}:{counter}'
+        for namespace in _namespaces
+        for counter in ('hits', 'misses')
+    }
+    values = cache.get_many(list(keys.values()))
+    result = {}
+    for (namespace, counter), key in keys.items():
+        result.setdefault(namespace, {'hits': 0, 'misses': 0})[counter] = values.get(key, 0)
+    return result
+
+
+def _response_key(request, versions):
+    auth = f'user:{request.user.pk}' if request.user.is_authenticated else 'anon'
+    raw = f'{request.get_full_path()}|{auth}|{versions}'
+    return f'{KEY_PREFIX}:page:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def _is_cacheable(response):
+    return response.status_code == 200 and not response.cookies and 'private' not in response.get('Cache-Control', '')
+
+
+def _tee_streaming(response, content, cache, key, timeout):
+    chunks = []
+    for chunk in content:
+        chunks.append(chunk)
+        yield chunk
+    cache.set(key, (b''.join(chunks), response.status_code, dict(response.items())), timeout)
+
+
+async def _atee_streaming(response, content, cache, key, timeout):
+    chunks = []
+    async for chunk in content:
+        chunks.append(chunk)
+        yield chunk
+    await cache.aset(key, (b''.join(chunks), response.status_code, dict(response.items())), timeout)
+
+
+def cache_response(groups, bypass=None):
+    """
+    Cachea la respuesta de una vista GET por URL completa + estado de autenticacion.
+
+    groups(request, *args, **kwargs) devuelve los grupos de invalidacion de los que depende la pagina
+    (ver invalidate()); bypass(request) permite saltarse la cache para ciertas peticiones.
+    Las respuestas en streaming se guardan mientras se envian. Admite tambien vistas async, con la API
+    asincrona de la cache; request.user tiene que estar ya cargado (await request.auser()).
+    """
+
+    def decorator(view):
+        namespace = view.__name__.lstrip('_')
+        _namespaces.add(namespace)
+
+        if iscoroutinefunction(view):
+            return _async_cache_response(view, namespace, groups, bypass)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or (bypass and bypass(request)):
+                return view(request, *args, **kwargs)
+
+            cache = get_view_cache()
+            key = _response_key(request, group_versions(cache, groups(request, *args, **kwargs)))
+            cached = cache.get(key)
+            if cached is not None:
+                _count(cache, namespace, 'hits')
+                content, status, headers = cached
+                return HttpResponse(content, status=status, headers=headers)
+
+            _count(cache, namespace, 'misses')
+            response = view(request, *args, **kwargs)
+            if _is_cacheable(response):
+                if response.streaming:
+                    content = response.streaming_content
+                    response.streaming_content = _tee_streaming(response, content, cache, key, view_cache_timeout())
+                else:
+                    cache.set(key, (response.content, response.status_code, dict(response.items())),
+                              view_cache_timeout())
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _async_cache_response(view, namespace, groups, bypass):
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET' or (bypass and bypass(request)):
+            return await view(request, *args, **kwargs)
+
+        cache = get_view_cache()
+        key = _response_key(request, await agroup_versions(cache, groups(request, *args, **kwargs)))
+        cached = await cache.aget(key)
+        if cached is not None:
+            await _acount(cache, namespace, 'hits')
+            content, status, headers = cached
+            return HttpResponse(content, status=status, headers=headers)
+
+        await _acount(cache, namespace, 'misses')
+        response = await view(request, *args, **kwargs)
+        if _is_cacheable(response):
+            if response.streaming:
+                content = response.streaming_content
+                if response.is_async:
+                    response.streaming_content = _atee_streaming(response, content, cache, key, view_cache_timeout())
+                else:
+                    response.streaming_content = _tee_streaming(response, content, cache, key, view_cache_timeout())
+            else:
+                await cache.aset(key, (response.content, response.status_code, dict(response.items())),
+                                 view_cache_timeout())
+        return response
+
+    return wrapper
@@ -0,0 +1,77 @@
+from django.db import connection
+
+from snippets.models import Snippet
+
+# Rango de zoom en el que el mapa pide clusters en lugar de puntos sueltos.
+CLUSTER_MIN_ZOOM = 0
+CLUSTER_MAX_ZOOM = 8
+
+# Celdas por lado de una tesela de 256px: 4 celdas => una celda cada ~64px en pantalla.
+CELLS_PER_TILE = 4
+
+WORLD_BBOX = (-180.0, -90.0, 180.0, 90.0)
+
+CLUSTERS_SQL = """
+    WITH per_language AS (
+        SELECT ST_SnapToGrid(point, %(size)s) AS cell,
+               language,
+               COUNT(*) AS total,
+               SUM(ST_X(point)) AS sum_x,
+               SUM(ST_Y(point)) AS sum_y
+        FROM {table}
+        WHERE point IS NOT NULL
+          AND point && ST_MakeEnvelope(%(minx)s, %(miny)s, %(maxx)s, %(maxy)s, 4326)
+        GROUP BY cell, language
+    )
+    SELECT SUM(sum_x) / SUM(total) AS lng,
+           SUM(sum_y) / SUM(total) AS lat,
+           SUM(total)::integer AS total,
+           json_object_agg(language, total) AS languages
+    FROM per_language
+    GROUP BY cell
+    ORDER BY total DESC
+"""
+
+
+def grid_size(zoom):
+    """
+    Tamaño de celda en grados para un nivel de zoom de Leaflet.
+    """
+    return 360.0 / (2 ** zoom) / CELLS_PER_TILE
+
+
+def cluster_snippets(zoom, bbox=None):
+    """
+    Agrupa los snippets geolocalizados en celdas de una rejilla, calculado en PostGIS.
+
+    @return:
+        Lista de dicts {lat, lng, count, languages}, donde lat/lng es el centroide de los puntos
+        de la celda y languages el desglose por lenguaje en el orden de Snippet.LENGUAJES_CHOICES.
+    """
+    minx, miny, maxx, maxy = bbox or WORLD_BBOX
+    # A zoom bajo Leaflet devuelve limites fuera del mundo (longitudes > 180), se recortan.
+    params = {
+        'size': grid_size(zoom),
+        'minx': max(minx, WORLD_BBOX[0]),
+        'miny': max(miny, WORLD_BBOX[1]),
+        'maxx': min(maxx, WORLD_BBOX[2]),
+        'maxy': min(maxy, WORLD_BBOX[3]),
+    }
+
+    with connection.cursor() as cursor:
+        cursor.execute(CLUSTERS_SQL.format(table=Snippet._meta.db_table), params)
+        rows = cursor.fetchall()
+
+    clusters = []
+    for lng, lat, total, languages in rows:
+        clusters.append({
+            'lat': lat,
+            'lng': lng,
+            'count': total,
+            'languages': {
+                code: languages[code]
+                for code, label in Snippet.LENGUAJES_CHOICES
+                if code in languages
+            },
+        })
+    return clusters
@@ -0,0 +1,88 @@
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Campos que se exponen como "properties" de cada Feature (mismo orden que el serializer de Django).
+GEOJSON_FIELDS = ('title', 'language', 'description', 'pub_date', 'author', 'cont_visited')
+
+# Filas que se piden a la base de datos en cada vuelta del cursor.
+ROWS_CHUNK_SIZE = 2000
+
+# Features que se agrupan en cada trozo de la respuesta.
+FEATURES_PER_CHUNK = 500
+
+
+def feature_rows(queryset, geometry_field, fields=GEOJSON_FIELDS):
+    """
+    Devuelve un queryset de tuplas (pk, geometria_geojson, *fields).
+
+    La geometria la serializa PostGIS con ST_AsGeoJSON, asi que en Python no se construye
+    ningun objeto GEOS ni instancia del modelo.
+    """
+    return queryset.annotate(
+        geojson_geometry=AsGeoJSON(geometry_field)
+    ).values_list('pk', 'geojson_geometry', *fields)
+
+
+def encode_feature(row, fields=GEOJSON_FIELDS, encoder=None):
+    """
+    Codifica una fila de feature_rows() como una Feature GeoJSON en texto.
+    """
+    encoder = encoder or DjangoJSONEncoder()
+    pk, geometry, *values = row
+    return '{"type": "Feature", "id": %s, "properties": %s, "geometry": %s}' % (
+        encoder.encode(pk),
+        encoder.encode(dict(zip(fields, values))),
+        geometry or 'null',
+    )
+
+
+def _collection_start(members, encoder):
+    extra = ''.join(f'{encoder.encode(key)}: {encoder.encode(value)}, ' for key, value in (members or {}).items())
+    return '{"type": "FeatureCollection", ' + extra + '"features": ['
+
+
+def iter_feature_collection(queryset, geometry_field, fields=GEOJSON_FIELDS, chunk_size=ROWS_CHUNK_SIZE,
+                            members=None):
+    """
+    Genera una FeatureCollection en trozos de texto, en una sola pasada sobre el queryset.
+
+    Pensado para StreamingHttpResponse: la memoria usada depende de FEATURES_PER_CHUNK y no del
+    numero total de snippets. members son miembros adicionales del objeto raiz (p. ej. "removed").
+    """
+    encoder = DjangoJSONEncoder()
+    rows = feature_rows(queryset, geometry_field, fields).iterator(chunk_size=chunk_size)
+
+    yield _collection_start(members, encoder)
+    separator = ''
+    buffer = []
+    for row in rows:
+        buffer.append(encode_feature(row, fields, encoder))
+        if len(buffer) >= FEATURES_PER_CHUNK:
+            yield separator + ', '.join(buffer)
+            separator = ', '
+            buffer = []
+    if buffer:
+        yield separator + ', '.join(buffer)
+    yield ']}'
+
+
+async def aiter_feature_collection(queryset, geometry_field, fields=GEOJSON_FIELDS, chunk_size=ROWS_CHUNK_SIZE,
+                                   members=None):
+    """
+    Version asincrona de iter_feature_collection(), para las vistas async (recorre el cursor con aiterator()).
+    """
+    encoder = DjangoJSONEncoder()
+    rows = feature_rows(queryset, geometry_field, fields).aiterator(chunk_size=chunk_size)
+
+    yield _collection_start(members, encoder)
+    separator = ''
+    buffer = []
+    async for row in rows:
+        buffer.append(encode_feature(row, fields, encoder))
+        if len(buffer) >= FEATURES_PER_CHUNK:
+            yield separator + ', '.join(buffer)
+            separator = ', '
+            buffer = []
+    if buffer:
+        yield separator + ', '.join(buffer)
+    yield ']}'
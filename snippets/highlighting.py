@@ -0,0 +1,143 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+try:
+    import pygments
+    from pygments import highlight
+    from pygments.formatters import HtmlFormatter
+    from pygments.lexers import get_lexer_by_name
+except ImportError:
+    pygments = None
+
+# Lexer de Pygments (y opciones) para cada valor de Snippet.language.
+LEXERS = {
+    'python': ('python', {}),
+    'javascript': ('javascript', {}),
+    'typescript': ('typescript', {}),
+    'html': ('html', {}),
+    'css': ('css', {}),
+    'django': ('html+django', {}),
+    'sql': ('sql', {}),
+    'java': ('java', {}),
+    'php': ('php', {'startinline': True}),
+    'kotlin': ('kotlin', {}),
+    'markdown': ('markdown', {}),
+}
+
+PYGMENTS_STYLE = 'monokai'
+CSS_CLASS = 'highlight'
+
+
+class LRUCache:
+    """
+    Cache LRU en memoria y segura entre hilos. Cada entrada recuerda el snippet al que pertenece
+    para poder invalidar todas sus versiones cuando se edita o se elimina.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._keys_by_owner = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, owner=None):
+        with self._lock:
+            # Snippets con el mismo codigo comparten clave: la entrada pasa al ultimo y el anterior la suelta.
+            previous = self._entries.get(key)
+            if previous is not None and previous[1] != owner:
+                self._discard_owner_key(previous[1], key)
+            self._entries[key] = (value, owner)
+            self._entries.move_to_end(key)
+            if owner is not None:
+                self._keys_by_owner.setdefault(owner, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                old_key, (old_value, old_owner) = self._entries.popitem(last=False)
+                self._discard_owner_key(old_owner, old_key)
+
+    def discard_owner(self, owner):
+        with self._lock:
+            for key in self._keys_by_owner.pop(owner, ()):
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_owner.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _discard_owner_key(self, owner, key):
+        keys = self._keys_by_owner.get(owner)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_owner[owner]
+
+
+_cache = LRUCache(getattr(settings, 'SNIPPETS_HIGHLIGHT_CACHE_SIZE', 1024))
+
+
+def is_enabled():
+    return pygments is not None and getattr(settings, 'SNIPPETS_SERVER_HIGHLIGHTING', True)
+
+
+def highlighter_version():
+    return f'pygments-{pygments.__version__}-{PYGMENTS_STYLE}'
+
+
+def cache_key(source, language):
+    """
+    Hash del contenido: cualquier cambio de codigo, lenguaje o version del resaltador genera otra clave.
+    """
+    digest = hashlib.sha256()
+    for part in (highlighter_version(), language, source):
+        digest.update(part.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def render(source, language):
+    name, options = LEXERS.get(language, ('text', {}))
+    lexer = get_lexer_by_name(name, stripnl=False, **options)
+    formatter = HtmlFormatter(cssclass=CSS_CLASS, wrapcode=True)
+    return highlight(source, lexer, formatter)
+
+
+def highlight_code(source, language, owner=None):
+    """
+    Devuelve el HTML resaltado del codigo, o None si el resaltado en servidor esta desactivado
+    (en ese caso la plantilla deja el resaltado a Prism en el navegador).
+    """
+    if not is_enabled():
+        return None
+    source = source or ''
+    key = cache_key(source, language)
+    html = _cache.get(key)
+    if html is None:
+        html = render(source, language)
+        _cache.set(key, html, owner)
+    return mark_safe(html)
+
+
+def invalidate_snippet(pk):
+    """
+    Elimina del cache todas las versiones resaltadas de un snippet.
+    """
+    _cache.discard_owner(pk)
+
+
+def style_defs():
+    return HtmlFormatter(style=PYGMENTS_STYLE, cssclass=CSS_CLASS).get_style_defs(f'.{CSS_CLASS}')
@@ -0,0 +1,264 @@
+import asyncio
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from snippets.models import DESCRIPTION_EXCERPT_CHARS
+
+logger = logging.getLogger(__name__)
+
+# Ruta del WebSocket del mapa (la enruta CodeAtlas.asgi).
+LIVE_PATH = '/ws/map/'
+
+# Eventos pendientes por cliente. Si un cliente lento se llena, se le pide que resincronice por ?since=.
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Canal de LISTEN/NOTIFY de PostgresBroker. NOTIFY admite como mucho ~8000 bytes por mensaje.
+NOTIFY_CHANNEL = 'snippets_live'
+NOTIFY_MAX_BYTES = 7900
+
+
+def _coordinates(point):
+    return [point.x, point.y] if point is not None else None
+
+
+def snippet_event(snippet, event_type, previous_point=None):
+    """
+    Evento para los mapas conectados: "created", "moved" o "deleted", con el id, la posicion anterior
+    y la Feature GeoJSON actual (sin ella en "deleted"). Solo usa campos ya cargados en la instancia.
+    """
+    values = snippet.__dict__
+    event = {
+        'type': event_type,
+        'id': snippet.pk,
+        'previous': _coordinates(previous_point),
+    }
+    if event_type != 'deleted':
+        properties = {
+            field: values[field]
+            for field in ('title', 'language', 'pub_date', 'cont_visited')
+            if field in values
+        }
+        properties['author'] = values.get('author_id')
+        if values.get('description'):
+            properties['description'] = values['description'][:DESCRIPTION_EXCERPT_CHARS]
+        event['feature'] = {
+            'type': 'Feature',
+            'id': snippet.pk,
+            'properties': properties,
+            'geometry': {'type': 'Point', 'coordinates': _coordinates(values.get('point'))},
+        }
+    return json.loads(json.dumps(event, cls=DjangoJSONEncoder))
+
+
+def event_in_bbox(event, bbox):
+    """
+    Si el evento afecta a un viewport: la posicion nueva o la anterior caen dentro del bbox.
+    """
+    if bbox is None:
+        return True
+    minx, miny, maxx, maxy = bbox
+    positions = [event.get('previous')]
+    if event.get('feature'):
+        positions.append(event['feature']['geometry']['coordinates'])
+    return any(p is not None and minx <= p[0] <= maxx and miny <= p[1] <= maxy for p in positions)
+
+
+class Subscription:
+    """
+    Cola de eventos de un cliente, ligada a su bucle de asyncio. Se puede alimentar desde cualquier hilo.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self.queue.full():
+            # Se descarta lo pendiente: el cliente recupera el estado con una sincronizacion completa.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = {'type': 'resync'}
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class InProcessBroker:
+    """
+    Reparte los eventos entre los clientes conectados a este proceso. No necesita servicios externos;
+    con varios procesos cada uno solo ve sus propios eventos (ver PostgresBroker).
+    """
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, loop):
+        subscription = Subscription(loop)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event):
+        self.dispatch(event)
+
+    def dispatch(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.deliver(event)
+            except RuntimeError:
+                # Bucle ya cerrado: el cliente se ha ido sin desuscribirse.
+                self.unsubscribe(subscription)
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Broker para varios procesos usando LISTEN/NOTIFY de la propia base de datos: publish() hace un
+    pg_notify y cada proceso escucha el canal en un hilo con su propia conexion y reparte localmente.
+    """
+
+    def __init__(self, alias='default'):
+        super().__init__()
+        self.alias = alias
+        self._listener = None
+
+    def subscribe(self, loop):
+        self._ensure_listener()
+        return super().subscribe(loop)
+
+    def publish(self, event):
+        payload = json.dumps(event)
+        if len(payload.encode()) > NOTIFY_MAX_BYTES:
+            event = {key: value for key, value in event.items() if key != 'feature'}
+            payload = json.dumps(event)
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [NOTIFY_CHANNEL, payload])
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='snippets-live-listener', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        db = connections.create_connection(self.alias)
+        try:
+            db.ensure_connection()
+            db.set_autocommit(True)
+            with db.cursor() as cursor:
+                cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+            raw = db.connection
+            if hasattr(raw, 'notifies') and callable(raw.notifies):
+                # psycopg 3
+                for notify in raw.notifies():
+                    self.dispatch(json.loads(notify.payload))
+            else:
+                # psycopg2
+                import select
+                while True:
+                    if select.select([raw], [], [], 60) == ([], [], []):
+                        continue
+                    raw.poll()
+                    while raw.notifies:
+                        self.dispatch(json.loads(raw.notifies.pop(0).payload))
+        except Exception as e:
+            logger.error(f'Snippets live listener stopped: {e}')
+        finally:
+            # Con el pool de conexiones (DATABASE_CONNECTIONS = "pool") la conexion vuelve al pool: sin el LISTEN.
+            try:
+                with db.cursor() as cursor:
+                    cursor.execute('UNLISTEN *')
+            except Exception:
+                pass
+            db.close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """
+    Broker configurado en SNIPPETS_LIVE_BACKEND (ruta de la clase), creado una vez por proceso.
+    """
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(getattr(settings, 'SNIPPETS_LIVE_BACKEND', 'snippets.live.InProcessBroker'))()
+    return _broker
+
+
+def publish(event):
+    try:
+        get_broker().publish(event)
+    except Exception as e:
+        # Los mapas se recuperan con la sincronizacion por ?since=; no se rompe la peticion que publica.
+        logger.error(f'Error publishing snippet live event: {e}')
+
+
+def _parse_viewport(message):
+    try:
+        bbox = json.loads(message).get('bbox')
+        if bbox is None:
+            return None
+        minx, miny, maxx, maxy = (float(v) for v in bbox)
+        return minx, miny, maxx, maxy
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError('viewport inválido')
+
+
+async def map_socket(scope, receive, send):
+    """
+    Aplicacion ASGI del WebSocket del mapa.
+
+    El cliente manda {"bbox": [minx, miny, maxx, maxy]} (o null para todo el mundo) cada vez que cambia
+    el viewport, y recibe los eventos de snippets_event() que caen dentro; {"type": "resync"} si se ha
+    quedado atras y tiene que pedir los cambios por HTTP.
+    """
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    await send({'type': 'websocket.accept'})
+
+    broker = get_broker()
+    subscription = broker.subscribe(asyncio.get_running_loop())
+    bbox = None
+    receiving = asyncio.ensure_future(receive())
+    waiting = asyncio.ensure_future(subscription.get())
+    try:
+        while True:
+            done, pending = await asyncio.wait({receiving, waiting}, return_when=asyncio.FIRST_COMPLETED)
+            if receiving in done:
+                message = receiving.result()
+                if message['type'] == 'websocket.disconnect':
+                    return
+                try:
+                    bbox = _parse_viewport(message.get('text') or '{}')
+                except ValueError:
+                    await send({'type': 'websocket.send', 'text': json.dumps({'type': 'error'})})
+                receiving = asyncio.ensure_future(receive())
+            if waiting in done:
+                event = waiting.result()
+                if event.get('type') == 'resync' or event_in_bbox(event, bbox):
+                    await send({'type': 'websocket.send', 'text': json.dumps(event)})
+                waiting = asyncio.ensure_future(subscription.get())
+    finally:
+        receiving.cancel()
+        waiting.cancel()
+        broker.unsubscribe(subscription)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from snippets.models import Snippet
+
+
+class Command(BaseCommand):
+    help = "Recalcula la vista previa guardada (Snippet.preview) de todos los snippets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        batch = []
+        total = 0
+        for snippet in Snippet.objects.only('pk', 'source_code', 'preview').iterator(chunk_size=batch_size):
+            previous = snippet.preview
+            snippet.update_derived_fields()
+            if snippet.preview != previous:
+                batch.append(snippet)
+            if len(batch) >= batch_size:
+                total += Snippet.objects.bulk_update(batch, ['preview'])
+                batch = []
+        if batch:
+            total += Snippet.objects.bulk_update(batch, ['preview'])
+
+        self.stdout.write(self.style.SUCCESS(f"Vistas previas actualizadas: {total}"))
@@ -0,0 +1,279 @@
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils import timezone
+
+from snippets import visits
+from snippets.management.commands.benchmark_endpoints import DEFAULT_BBOX, PERCENTILES, percentile
+from snippets.models import Snippet
+
+MODES = ('wsgi', 'asgi')
+
+
+def wsgi_environ(path, query):
+    return {
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+def wsgi_request(application, path, query):
+    """
+    Una peticion completa contra la aplicacion WSGI, como la haria un servidor con hilos. Devuelve el status.
+    """
+    status = []
+    result = application(wsgi_environ(path, query), lambda code, headers, exc_info=None: status.append(code))
+    try:
+        for _ in result:
+            pass
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return int(status[0].split()[0])
+
+
+async def asgi_request(application, path, query):
+    """
+    Una peticion completa contra la aplicacion ASGI, con los mismos mensajes que envia uvicorn. Devuelve el status.
+    """
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'localhost')],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+    requested = False
+    status = None
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # El cliente no se desconecta: Django cancela esta espera al terminar la respuesta.
+        await asyncio.Future()
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application(scope, receive, send)
+    return status
+
+
+class Command(BaseCommand):
+    help = ("Compara el rendimiento con muchos clientes concurrentes de la aplicacion WSGI (CodeAtlas.wsgi, "
+            "con un numero fijo de hilos como gunicorn) y de la ASGI (CodeAtlas.asgi, en un bucle de eventos "
+            "como uvicorn) en snippet_detail, map_snippet y snippets_geojson. Cada servidor se mide en su propio "
+            "proceso con sus vistas: las sync con WSGI y las async (SNIPPETS_ASYNC_VIEWS=1) con ASGI.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=MODES, action='append', dest='modes',
+                            help="Servidor a medir (repetible). Por defecto los dos.")
+        parser.add_argument('--concurrency', type=int, default=100, help="Clientes simultaneos.")
+        parser.add_argument('--requests', type=int, default=2000, help="Peticiones medidas por endpoint y modo.")
+        parser.add_argument('--wsgi-threads', type=int, default=32,
+                            help="Hilos del servidor WSGI; el resto de clientes espera turno.")
+        parser.add_argument('--bbox', default=DEFAULT_BBOX, help="bbox de snippets_geojson (minx,miny,maxx,maxy).")
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help="Endpoint a medir (repetible). Por defecto todos.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Fichero JSON donde guardar los resultados.")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1 or options['wsgi_threads'] < 1:
+            raise CommandError('--concurrency, --requests y --wsgi-threads tienen que ser positivos')
+        modes = options['modes'] or list(MODES)
+        if modes != [self.current_mode()]:
+            results = {mode: self.run_mode(mode, options) for mode in modes}
+            for mode in modes:
+                for name, result in results[mode].items():
+                    self.report(mode, name, result)
+            self.save(results, options)
+            return
+
+        rng = random.Random(options['seed'])
+        snippet_ids = list(Snippet.objects.order_by('?').values_list('pk', flat=True)[:200])
+        if not snippet_ids:
+            raise CommandError('No hay datos: genera algunos con generate_load_data.')
+
+        endpoints = {
+            'snippet_detail': lambda: (reverse('snippets:snippet_detail', args=[rng.choice(snippet_ids)]), ''),
+            'map_snippet': lambda: (reverse('snippets:map_snippet'), ''),
+            'snippets_geojson': lambda: (reverse('snippets:snippets_geojson'), f"bbox={options['bbox']}"),
+        }
+        selected = options['endpoints'] or list(endpoints)
+        unknown = set(selected) - set(endpoints)
+        if unknown:
+            raise CommandError(f"Endpoints desconocidos: {', '.join(sorted(unknown))}")
+
+        results = {}
+        for mode in modes:
+            results[mode] = {}
+            for name in selected:
+                if mode == 'wsgi':
+                    result = self.measure_wsgi(endpoints[name], options)
+                else:
+                    result = asyncio.run(self.measure_asgi(endpoints[name], options))
+                results[mode][name] = result
+                self.report(mode, name, result)
+        visits.flush()
+        self.save(results, options)
+
+    def current_mode(self):
+        """
+        Servidor que se puede medir en este proceso: snippets.urls elige las vistas sync o async una sola vez al
+        cargarse, asi que solo vale el que corresponde a SNIPPETS_ASYNC_VIEWS y CODEATLAS_SERVER.
+        """
+        mode = 'asgi' if getattr(settings, 'SNIPPETS_ASYNC_VIEWS', False) else 'wsgi'
+        return mode if getattr(settings, 'CODEATLAS_SERVER', 'wsgi') == mode else None
+
+    def run_mode(self, mode, options):
+        """
+        El mismo comando en un proceso nuevo con las vistas de ese servidor (ver benchmark_db_connections).
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'result.json')
+            command = [
+                sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_asgi',
+                '--mode', mode,
+                '--concurrency', str(options['concurrency']),
+                '--requests', str(options['requests']),
+                '--wsgi-threads', str(options['wsgi_threads']),
+                '--bbox', options['bbox'],
+                '--seed', str(options['seed']),
+                '--output', output,
+            ]
+            for endpoint in options['endpoints'] or []:
+                command += ['--endpoint', endpoint]
+            env = {**os.environ, 'CODEATLAS_SERVER': mode, 'SNIPPETS_ASYNC_VIEWS': '1' if mode == 'asgi' else '0'}
+            finished = subprocess.run(command, env=env, capture_output=True, text=True)
+            if finished.returncode != 0:
+                raise CommandError(f"benchmark_asgi con {mode} ha fallado:\n{finished.stderr}")
+            with open(output, encoding='utf-8') as fp:
+                return json.load(fp)['results'][mode]
+
+    def save(self, results, options):
+        if not options['output']:
+            return
+        report = {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'concurrency': options['concurrency'],
+                'requests': options['requests'],
+                'wsgi_threads': options['wsgi_threads'],
+                # Cada servidor con sus vistas: sync con WSGI y async con ASGI.
+                'async_views': {mode: mode == 'asgi' for mode in results},
+                'debug': settings.DEBUG,
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as fp:
+            json.dump(report, fp, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['output']}"))
+
+    def measure_wsgi(self, url, options):
+        from CodeAtlas.wsgi import application
+
+        # Solo --wsgi-threads peticiones dentro de la aplicacion a la vez, como los hilos de un servidor.
+        workers = threading.BoundedSemaphore(options['wsgi_threads'])
+        lock = threading.Lock()
+        remaining = [options['requests']]
+        timings, statuses = [], {}
+
+        def client():
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                    path, query = url()
+                start = time.perf_counter()
+                with workers:
+                    status = wsgi_request(application, path, query)
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    timings.append(elapsed)
+                    statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        start = time.perf_counter()
+        clients = [threading.Thread(target=client) for _ in range(options['concurrency'])]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        return self.summary(timings, statuses, time.perf_counter() - start)
+
+    async def measure_asgi(self, url, options):
+        from CodeAtlas.asgi import application
+
+        remaining = options['requests']
+        timings, statuses = [], {}
+
+        async def client():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                path, query = url()
+                start = time.perf_counter()
+                status = await asgi_request(application, path, query)
+                timings.append((time.perf_counter() - start) * 1000)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[client() for _ in range(options['concurrency'])])
+        return self.summary(timings, statuses, time.perf_counter() - start)
+
+    def summary(self, timings, statuses, elapsed):
+        timings.sort()
+        return {
+            'requests': len(timings),
+            'requests_per_second': round(len(timings) / elapsed, 1),
+            'latency_ms': {
+                **{f'p{p}': round(percentile(timings, p), 2) for p in PERCENTILES},
+                'mean': round(sum(timings) / len(timings), 2),
+                'max': round(timings[-1], 2),
+            },
+            'status_codes': statuses,
+        }
+
+    def report(self, mode, name, result):
+        latency = result['latency_ms']
+        self.stdout.write(
+            f"{mode:>4} {name:>16}: {result['requests_per_second']:.0f} req/s, p50 {latency['p50']:.1f} ms, "
+            f"p95 {latency['p95']:.1f} ms, p99 {latency['p99']:.1f} ms, status {result['status_codes']}"
+        )
@@ -0,0 +1,79 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from django.test import override_settings
+
+from snippets.management.commands.benchmark_endpoints import DUMMY_CACHE, PERCENTILES, percentile
+from snippets.models import Snippet
+from snippets.views import SNIPPETS_PER_PAGE
+
+# Caches que sustituyen a SNIPPETS_CARD_CACHE durante la medida, para no vaciar la de verdad.
+BENCHMARK_CACHES = {
+    'benchmark-cards-off': DUMMY_CACHE,
+    'benchmark-cards': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark-cards'},
+}
+
+# Modo -> (alias de cache, si se vacia antes de cada render).
+MODES = {
+    'uncached': ('benchmark-cards-off', False),
+    'cold': ('benchmark-cards', True),
+    'warm': ('benchmark-cards', False),
+}
+
+
+class Command(BaseCommand):
+    help = ("Mide lo que cuesta renderizar una pagina de tarjetas de snippets (snippet_cards.html) sin cache de "
+            "fragmentos, con la cache vacia y con todas las tarjetas en cache.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200, help="Renders medidos por modo.")
+        parser.add_argument('--warmup', type=int, default=5, help="Renders previos sin medir.")
+        parser.add_argument('--page-size', type=int, default=SNIPPETS_PER_PAGE)
+        parser.add_argument('--output', help="Fichero JSON donde guardar los resultados.")
+
+    def handle(self, *args, **options):
+        # La pagina se carga una vez: solo se mide el render, no la consulta.
+        page = list(Snippet.objects.for_list().order_by('-pub_date', '-id')[:options['page_size']])
+        if not page:
+            raise CommandError('No hay datos: genera algunos con generate_load_data.')
+
+        results = {}
+        for mode, (alias, clear) in MODES.items():
+            with override_settings(CACHES={**settings.CACHES, **BENCHMARK_CACHES}, SNIPPETS_CARD_CACHE=alias):
+                results[mode] = self.measure(page, caches[alias], clear, options['repeat'], options['warmup'])
+            latency = results[mode]['latency_ms']
+            self.stdout.write(f"{mode:>9}: p50 {latency['p50']:.2f} ms, p95 {latency['p95']:.2f} ms")
+
+        speedup = results['uncached']['latency_ms']['p50'] / max(results['warm']['latency_ms']['p50'], 0.001)
+        self.stdout.write(f"Tarjetas en cache: {speedup:.1f}x mas rapido que sin cache (p50, {len(page)} tarjetas)")
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fp:
+                json.dump({'cards': len(page), 'results': results}, fp, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['output']}"))
+
+    def measure(self, page, cache, clear, repeat, warmup):
+        """
+        Renderiza la pagina repeat veces. Con clear, cada render encuentra la cache vacia (todo fallos).
+        El resaltado de Pygments tiene su propia cache (snippets.highlighting), caliente tras el warmup.
+        """
+        for _ in range(warmup):
+            render_to_string('snippets/snippet_cards.html', {'snippets_list': page})
+
+        timings = []
+        for _ in range(repeat):
+            if clear:
+                cache.clear()
+            start = time.perf_counter()
+            render_to_string('snippets/snippet_cards.html', {'snippets_list': page})
+            timings.append((time.perf_counter() - start) * 1000)
+
+        timings.sort()
+        return {
+            'renders': repeat,
+            'latency_ms': {f'p{p}': round(percentile(timings, p), 3) for p in PERCENTILES},
+        }
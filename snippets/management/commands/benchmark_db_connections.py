@@ -0,0 +1,108 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from snippets.management.commands.benchmark_endpoints import percentile
+
+CONNECTION_MODES = ('per-request', 'persistent', 'pool')
+
+
+class Command(BaseCommand):
+    help = ("Mide peticiones/s con cada modo de conexion a PostGIS (CODEATLAS_DB_CONNECTIONS: per-request, "
+            "persistent, pool) ejecutando benchmark_asgi en un proceso por modo, el coste de abrir una "
+            "conexion nueva y, con pool, el de sacar una conexion del pool.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', choices=CONNECTION_MODES, action='append', dest='connection_modes',
+                            help="Modo a medir (repetible). Por defecto todos.")
+        parser.add_argument('--server', choices=('wsgi', 'asgi'), default='wsgi',
+                            help="Aplicacion contra la que se mide (ver benchmark_asgi).")
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--wsgi-threads', type=int, default=32)
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help="Endpoint de benchmark_asgi (repetible). Por defecto snippet_detail.")
+        parser.add_argument('--connect-samples', type=int, default=20,
+                            help="Conexiones que se abren (y que se sacan del pool) para medir lo que cuestan.")
+        parser.add_argument('--output', help="Fichero JSON donde guardar los resultados.")
+
+    def handle(self, *args, **options):
+        # Dos medidas distintas, que no se comparan entre si: conectar de verdad a PostgreSQL y sacar del pool
+        # una conexion ya abierta (solo si los settings cargados usan pool).
+        connect = self.measure_connect(options['connect_samples'])
+        checkout = self.measure_connect(options['connect_samples'], pool=True) if self.uses_pool() else None
+        for label, timing in (('Conexion nueva', connect), ('Conexion del pool', checkout)):
+            if timing:
+                self.stdout.write(f"{label}: p50 {timing['p50']:.1f} ms, p95 {timing['p95']:.1f} ms")
+
+        results = {}
+        for mode in options['connection_modes'] or CONNECTION_MODES:
+            results[mode] = self.run_mode(mode, options)
+            for name, result in results[mode].items():
+                latency = result['latency_ms']
+                self.stdout.write(
+                    f"{mode:>11} {name:>16}: {result['requests_per_second']:.0f} req/s, "
+                    f"p50 {latency['p50']:.1f} ms, p95 {latency['p95']:.1f} ms, status {result['status_codes']}"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fp:
+                json.dump({'connect_ms': connect, 'pool_checkout_ms': checkout, 'results': results}, fp, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['output']}"))
+
+    def uses_pool(self):
+        return bool(connections['default'].settings_dict['OPTIONS'].get('pool'))
+
+    def measure_connect(self, samples, pool=False):
+        """
+        Tiempo de connect() de una conexion de 'default'. Sin pool, se quita la opcion pool de los settings para
+        que siempre se abra una conexion nueva contra el servidor, sea cual sea CODEATLAS_DB_CONNECTIONS; con
+        pool=True, connect() saca una conexion del pool (el primer connect() lo abre y no se cuenta).
+        """
+        if pool:
+            warmup = connections.create_connection('default')
+            warmup.connect()
+            warmup.close()
+        timings = []
+        for _ in range(samples):
+            connection = connections.create_connection('default')
+            if not pool:
+                options = {k: v for k, v in connection.settings_dict['OPTIONS'].items() if k != 'pool'}
+                connection.settings_dict = {**connection.settings_dict, 'OPTIONS': options}
+            start = time.perf_counter()
+            connection.connect()
+            timings.append((time.perf_counter() - start) * 1000)
+            connection.close()
+        timings.sort()
+        return {f'p{p}': round(percentile(timings, p), 2) for p in (50, 95)} if timings else None
+
+    def run_mode(self, mode, options):
+        """
+        benchmark_asgi en un proceso nuevo: el modo de conexion se decide al cargar los settings.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'result.json')
+            command = [
+                sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_asgi',
+                '--mode', options['server'],
+                '--concurrency', str(options['concurrency']),
+                '--requests', str(options['requests']),
+                '--wsgi-threads', str(options['wsgi_threads']),
+                '--output', output,
+            ]
+            for endpoint in options['endpoints'] or ['snippet_detail']:
+                command += ['--endpoint', endpoint]
+            env = {**os.environ, 'CODEATLAS_DB_CONNECTIONS': mode, 'CODEATLAS_SERVER': options['server'],
+                   'SNIPPETS_ASYNC_VIEWS': '1' if options['server'] == 'asgi' else '0'}
+            finished = subprocess.run(command, env=env, capture_output=True, text=True)
+            if finished.returncode != 0:
+                raise CommandError(f"benchmark_asgi con {mode} ha fallado:\n{finished.stderr}")
+            with open(output, encoding='utf-8') as fp:
+                return json.load(fp)['results'][options['server']]
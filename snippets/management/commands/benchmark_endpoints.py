@@ -0,0 +1,173 @@
+import json
+import platform
+import random
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import UserProfile
+from snippets import visits
+from snippets.models import Snippet
+
+# bbox por defecto para snippets_geojson con bbox: la peninsula iberica.
+DEFAULT_BBOX = '-9.5,36.0,3.4,43.8'
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Cache que sustituye a la de respuestas con --no-cache.
+DUMMY_CACHE = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+
+def consume(response):
+    """
+    Lee la respuesta entera (tambien en streaming), para medir el coste completo de generarla.
+    """
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+class Command(BaseCommand):
+    help = ("Mide index, snippet_detail, snippets_geojson (con y sin bbox) y profile_username con el cliente de "
+            "pruebas: percentiles de latencia, consultas SQL y pico de memoria, guardados en JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50, help="Peticiones medidas por endpoint.")
+        parser.add_argument('--warmup', type=int, default=3, help="Peticiones previas sin medir.")
+        parser.add_argument('--bbox', default=DEFAULT_BBOX, help="bbox de snippets_geojson (minx,miny,maxx,maxy).")
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help="Endpoint a medir (repetible). Por defecto todos.")
+        parser.add_argument('--no-cache', action='store_true', help="Desactiva la cache de respuestas.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Fichero JSON donde guardar los resultados.")
+        parser.add_argument('--compare', help="JSON de una ejecucion anterior con el que comparar.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        snippet_ids = list(Snippet.objects.order_by('?').values_list('pk', flat=True)[:200])
+        usernames = list(UserProfile.objects.filter(snippets__isnull=False).distinct()
+                         .values_list('user__username', flat=True)[:200])
+        if not snippet_ids or not usernames:
+            raise CommandError('No hay datos: genera algunos con generate_load_data.')
+
+        endpoints = {
+            'index': lambda: reverse('snippets:index'),
+            'snippet_detail': lambda: reverse('snippets:snippet_detail', args=[rng.choice(snippet_ids)]),
+            'snippets_geojson': lambda: reverse('snippets:snippets_geojson'),
+            'snippets_geojson_bbox': lambda: f"{reverse('snippets:snippets_geojson')}?bbox={options['bbox']}",
+            'profile_username': lambda: reverse('accounts:public_profile', args=[rng.choice(usernames)]),
+        }
+        selected = options['endpoints'] or list(endpoints)
+        unknown = set(selected) - set(endpoints)
+        if unknown:
+            raise CommandError(f"Endpoints desconocidos: {', '.join(sorted(unknown))}")
+
+        overrides = {}
+        if options['no_cache']:
+            overrides = {'CACHES': {**settings.CACHES, 'benchmark-dummy': DUMMY_CACHE},
+                         'SNIPPETS_VIEW_CACHE': 'benchmark-dummy'}
+
+        results = {}
+        with override_settings(**overrides):
+            # Con ALLOWED_HOSTS vacio y DEBUG solo se aceptan localhost y similares.
+            client = Client(HTTP_HOST='localhost')
+            for name in selected:
+                results[name] = self.measure(client, endpoints[name], options['repeat'], options['warmup'])
+                self.report(name, results[name])
+        visits.flush()
+
+        report = {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'snippets': Snippet.objects.count(),
+                'geolocated_snippets': Snippet.objects.filter(point__isnull=False).count(),
+                'repeat': options['repeat'],
+                'no_cache': options['no_cache'],
+                'debug': settings.DEBUG,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fp:
+                json.dump(report, fp, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['output']}"))
+        if options['compare']:
+            self.compare(results, options['compare'])
+
+    def measure(self, client, url, repeat, warmup):
+        for _ in range(warmup):
+            consume(client.get(url()))
+
+        timings = []
+        queries = []
+        sizes = []
+        statuses = {}
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.get(url())
+                sizes.append(consume(response))
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured.captured_queries))
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+        # La memoria se mide aparte: tracemalloc ralentiza cada peticion y falsearia las latencias.
+        tracemalloc.start()
+        consume(client.get(url()))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'requests': repeat,
+            'latency_ms': {
+                **{f'p{p}': round(percentile(timings, p), 2) for p in PERCENTILES},
+                'mean': round(sum(timings) / len(timings), 2),
+                'max': round(timings[-1], 2),
+            },
+            'queries': {'min': min(queries), 'mean': round(sum(queries) / len(queries), 2), 'max': max(queries)},
+            'peak_memory_kib': round(peak / 1024, 1),
+            'response_kib': round(sum(sizes) / len(sizes) / 1024, 1),
+            'status_codes': statuses,
+        }
+
+    def report(self, name, result):
+        latency = result['latency_ms']
+        self.stdout.write(
+            f"{name:>22}: p50 {latency['p50']:.1f} ms, p95 {latency['p95']:.1f} ms, p99 {latency['p99']:.1f} ms, "
+            f"consultas {result['queries']['mean']:g}, pico memoria {result['peak_memory_kib']:.0f} KiB, "
+            f"respuesta {result['response_kib']:.1f} KiB"
+        )
+
+    def compare(self, results, path):
+        with open(path, encoding='utf-8') as fp:
+            previous = json.load(fp)['results']
+        self.stdout.write(f"Comparacion con {path}:")
+        for name, result in results.items():
+            if name not in previous:
+                continue
+            before = previous[name]
+            p95 = result['latency_ms']['p95'] - before['latency_ms']['p95']
+            change = p95 / before['latency_ms']['p95'] * 100 if before['latency_ms']['p95'] else 0
+            style = self.style.ERROR if change > 10 else self.style.SUCCESS
+            self.stdout.write(style(
+                f"{name:>22}: p95 {p95:+.1f} ms ({change:+.0f}%), "
+                f"consultas {result['queries']['mean'] - before['queries']['mean']:+g}, "
+                f"memoria {result['peak_memory_kib'] - before['peak_memory_kib']:+.0f} KiB"
+            ))
@@ -0,0 +1,64 @@
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers import serialize
+from django.http import JsonResponse
+
+from snippets.geojson import GEOJSON_FIELDS, iter_feature_collection
+from snippets.models import Snippet
+from snippets.views import GEOM_FIELD
+
+
+def legacy_geojson(qs):
+    """
+    Camino anterior de snippets_geojson: serialize -> json.loads -> JsonResponse.
+    """
+    geojson_str = serialize("geojson", qs, geometry_field=GEOM_FIELD, fields=list(GEOJSON_FIELDS))
+    return JsonResponse(json.loads(geojson_str), safe=False).content
+
+
+def streaming_geojson(qs):
+    """
+    Camino actual: encoder en streaming, consumido entero para medir el coste total.
+    """
+    return ''.join(iter_feature_collection(qs, GEOM_FIELD)).encode()
+
+
+class Command(BaseCommand):
+    help = "Compara tiempo y memoria del GeoJSON antiguo (serialize) frente al encoder en streaming."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Repeticiones por implementacion.')
+        parser.add_argument('--bbox', help='Filtra por bbox (minx,miny,maxx,maxy) como el endpoint.')
+
+    def handle(self, *args, **options):
+        qs = Snippet.objects.filter(point__isnull=False)
+        if options['bbox']:
+            try:
+                bbox = tuple(float(x) for x in options['bbox'].split(','))
+            except ValueError:
+                raise CommandError('bbox inválido. Formato: minx,miny,maxx,maxy')
+            qs = qs.filter(**{f"{GEOM_FIELD}__bboverlaps": bbox})
+
+        self.stdout.write(f"Snippets geolocalizados: {qs.count()}")
+
+        for name, func in (('legacy', legacy_geojson), ('streaming', streaming_geojson)):
+            timings = []
+            peak = 0
+            size = 0
+            for _ in range(options['repeat']):
+                tracemalloc.start()
+                start = time.perf_counter()
+                size = len(func(qs))
+                timings.append(time.perf_counter() - start)
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+
+            timings.sort()
+            self.stdout.write(
+                f"{name:>10}: mediana {timings[len(timings) // 2] * 1000:.1f} ms, "
+                f"min {timings[0] * 1000:.1f} ms, pico memoria {peak / 1024 / 1024:.1f} MiB, "
+                f"respuesta {size / 1024:.1f} KiB"
+            )
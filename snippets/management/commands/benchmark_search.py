@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from snippets.models import Snippet
+from snippets.search import search_snippets
+
+DEFAULT_QUERIES = ['django', 'get_or_create', 'select from where', 'fetch json', '"for loop"', 'async -python']
+
+# Objetivo de latencia por busqueda.
+TARGET_MS = 50
+
+
+class Command(BaseCommand):
+    help = "Mide la latencia de la busqueda de texto completo (p50/p95) y muestra el plan de ejecucion."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', action='append', dest='queries', help='Consulta a medir (repetible).')
+        parser.add_argument('--lang', help='Filtra por lenguaje.')
+        parser.add_argument('--repeat', type=int, default=20, help='Repeticiones por consulta.')
+        parser.add_argument('--explain', action='store_true', help='Muestra EXPLAIN ANALYZE de cada consulta.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Snippets: {Snippet.objects.count()}")
+        failed = False
+
+        for query in options['queries'] or DEFAULT_QUERIES:
+            timings = []
+            results = 0
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                results = len(list(search_snippets(query, options['lang'])))
+                timings.append((time.perf_counter() - start) * 1000)
+
+            timings.sort()
+            p50 = timings[len(timings) // 2]
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            style = self.style.SUCCESS if p95 <= TARGET_MS else self.style.ERROR
+            failed = failed or p95 > TARGET_MS
+            self.stdout.write(style(
+                f"{query!r:>24}: p50 {p50:.1f} ms, p95 {p95:.1f} ms, max {timings[-1]:.1f} ms ({results} resultados)"
+            ))
+
+            if options['explain']:
+                self.stdout.write(search_snippets(query, options['lang']).explain(analyze=True))
+
+        if failed:
+            self.stdout.write(self.style.WARNING(f"Alguna consulta supera el objetivo de {TARGET_MS} ms en p95"))
@@ -0,0 +1,28 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from snippets import assets
+
+
+class Command(BaseCommand):
+    help = ("Genera los bundles CSS/JS de cada tipo de pagina (assets.BUNDLES) en snippets/static/bundles/ y, "
+            "con --collectstatic, los copia a STATIC_ROOT con hash en el nombre y comprimidos.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collectstatic', action='store_true',
+                            help="Ejecuta collectstatic despues de generar los bundles.")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = assets.build_bundles()
+        except FileNotFoundError as exc:
+            raise CommandError(f"Falta {exc}; descarga las librerias con vendor_assets.")
+        except assets.VendorIntegrityError as exc:
+            raise CommandError(f"Hash distinto del fijado: {exc}")
+        for path, size in sizes.items():
+            self.stdout.write(f"{path}: {size} bytes")
+
+        if options['collectstatic']:
+            call_command('collectstatic', interactive=False, verbosity=options['verbosity'])
+
+        self.stdout.write(self.style.SUCCESS(f"Bundles generados: {len(sizes)}"))
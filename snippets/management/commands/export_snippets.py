@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from snippets import transfer
+from snippets.models import Snippet
+
+
+class Command(BaseCommand):
+    help = "Exporta los snippets (con posicion, lenguaje y autor) a JSONL o GeoJSON, en streaming."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-', help="Fichero de salida ('-' para stdout).")
+        parser.add_argument('--format', choices=transfer.FORMATS, default='jsonl')
+        parser.add_argument('--author', help="Exporta solo los snippets de este usuario.")
+        parser.add_argument('--chunk-size', type=int, default=transfer.ROWS_CHUNK_SIZE,
+                            help="Filas que se leen de la base de datos en cada vuelta del cursor.")
+
+    def handle(self, *args, **options):
+        queryset = Snippet.objects.all()
+        if options['author']:
+            queryset = queryset.filter(author__user__username=options['author'])
+
+        writer = transfer.iter_geojson if options['format'] == 'geojson' else transfer.iter_jsonl
+        chunks = writer(queryset, options['chunk_size'])
+
+        if options['output'] == '-':
+            sys.stdout.writelines(chunks)
+            return
+        with open(options['output'], 'w', encoding='utf-8') as fp:
+            fp.writelines(chunks)
+        self.stdout.write(self.style.SUCCESS(f"Snippets exportados a {options['output']}"))
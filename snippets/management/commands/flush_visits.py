@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from snippets import visits
+
+
+class Command(BaseCommand):
+    help = ("Pide a los procesos web que vuelquen ya las visitas de snippets que tienen en memoria y vuelca las de "
+            "este proceso. Los procesos web solo reciben la peticion si comparten la cache "
+            "(CODEATLAS_CACHE_BACKEND=file); en cualquier caso vuelcan solos cada SNIPPETS_VISITS_FLUSH_INTERVAL "
+            "segundos.")
+
+    def handle(self, *args, **options):
+        visits.request_flush()
+        flushed = visits.flush()
+        self.stdout.write(self.style.SUCCESS(
+            f"Volcado pedido a los procesos web (lo atienden en {visits.FLUSHER_POLL_SECONDS} s). "
+            f"Visitas volcadas desde este proceso: {flushed}"
+        ))
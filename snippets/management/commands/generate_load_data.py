@@ -0,0 +1,153 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import AuthorStats, UserProfile
+from snippets import transfer
+from snippets.models import Snippet
+
+# Zonas donde se concentran los snippets: (lon, lat, peso, dispersion en grados).
+HOTSPOTS = [
+    (-3.70, 40.42, 10, 0.25),   # Madrid
+    (2.17, 41.39, 8, 0.20),     # Barcelona
+    (-0.38, 39.47, 4, 0.15),    # Valencia
+    (-5.98, 37.39, 3, 0.15),    # Sevilla
+    (-2.93, 43.26, 2, 0.10),    # Bilbao
+    (-9.14, 38.72, 3, 0.20),    # Lisboa
+    (2.35, 48.86, 6, 0.30),     # Paris
+    (13.40, 52.52, 5, 0.30),    # Berlin
+    (-0.13, 51.51, 7, 0.35),    # Londres
+    (-74.01, 40.71, 7, 0.40),   # Nueva York
+    (-122.42, 37.77, 6, 0.40),  # San Francisco
+    (-99.13, 19.43, 4, 0.40),   # Ciudad de Mexico
+    (-58.38, -34.60, 3, 0.35),  # Buenos Aires
+    (-46.63, -23.55, 3, 0.40),  # Sao Paulo
+    (77.59, 12.97, 5, 0.40),    # Bangalore
+    (139.69, 35.69, 4, 0.40),   # Tokio
+    (151.21, -33.87, 2, 0.30),  # Sidney
+]
+
+# Reparto del resto de snippets: repartidos por todo el mapa o sin posicion.
+UNIFORM_FRACTION = 0.10
+NO_POINT_FRACTION = 0.15
+
+# Peso relativo de cada lenguaje.
+LANGUAGE_WEIGHTS = {
+    'python': 30, 'javascript': 25, 'typescript': 12, 'html': 8, 'css': 6, 'django': 6,
+    'sql': 6, 'java': 8, 'php': 5, 'kotlin': 3, 'markdown': 3,
+}
+
+# Lineas de codigo: log-normal con mediana ~20 lineas y cola larga, acotada.
+CODE_LINES_MU = 3.0
+CODE_LINES_SIGMA = 1.0
+CODE_MAX_LINES = 3000
+
+CODE_LINES = {
+    'python': ['def {name}(items):', '    result = [x for x in items if x]', '    return {name}_cache.get(result)'],
+    'javascript': ['function {name}(items) {{', '  const result = items.filter(Boolean);', '  return result;', '}}'],
+    'typescript': ['export function {name}(items: string[]): string[] {{', '  return items.filter(Boolean);', '}}'],
+    'html': ['<div class="{name}">', '  <p>{name}</p>', '</div>'],
+    'css': ['.{name} {{', '  display: flex;', '  margin: 0 auto;', '}}'],
+    'django': ['{{% for item in {name} %}}', '  {{{{ item.title }}}}', '{{% endfor %}}'],
+    'sql': ['SELECT id, title FROM {name}', 'WHERE pub_date > now() - interval \'7 days\'', 'ORDER BY id DESC;'],
+    'java': ['public List<String> {name}(List<String> items) {{', '    return items.stream().toList();', '}}'],
+    'php': ['function {name}($items) {{', '    return array_filter($items);', '}}'],
+    'kotlin': ['fun {name}(items: List<String>) =', '    items.filter {{ it.isNotEmpty() }}'],
+    'markdown': ['# {name}', '', '- elemento', '- otro elemento'],
+}
+
+WORDS = ['cache', 'parse', 'render', 'fetch', 'index', 'query', 'filter', 'sort', 'merge', 'split', 'load',
+         'save', 'token', 'stream', 'batch', 'retry', 'map', 'reduce', 'tile', 'point', 'search', 'user']
+
+
+def random_point(rng):
+    """
+    Coordenadas (lon, lat) concentradas alrededor de HOTSPOTS, con una parte uniforme; None sin posicion.
+    """
+    draw = rng.random()
+    if draw < NO_POINT_FRACTION:
+        return None
+    if draw < NO_POINT_FRACTION + UNIFORM_FRACTION:
+        return [round(rng.uniform(-180, 180), 6), round(rng.uniform(-60, 70), 6)]
+    lon, lat, weight, spread = rng.choices(HOTSPOTS, weights=[h[2] for h in HOTSPOTS])[0]
+    return [round(max(-180, min(180, rng.gauss(lon, spread))), 6),
+            round(max(-90, min(90, rng.gauss(lat, spread))), 6)]
+
+
+def random_code(rng, language):
+    lines = min(CODE_MAX_LINES, max(1, int(rng.lognormvariate(CODE_LINES_MU, CODE_LINES_SIGMA))))
+    template = CODE_LINES[language]
+    out = []
+    while len(out) < lines:
+        name = '_'.join(rng.sample(WORDS, 2))
+        out.extend(line.format(name=name) for line in template)
+    return '\n'.join(out[:lines])
+
+
+class Command(BaseCommand):
+    help = ("Genera usuarios y snippets sinteticos para pruebas de carga: posiciones concentradas en ciudades, "
+            "tamaños de codigo log-normales y autores con actividad muy desigual.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--snippets', type=int, default=10000)
+        parser.add_argument('--prefix', default='carga', help="Prefijo de los nombres de usuario generados.")
+        parser.add_argument('--seed', type=int, default=0, help="Semilla, para generar siempre el mismo conjunto.")
+        parser.add_argument('--days', type=int, default=730, help="Antiguedad maxima de pub_date.")
+        parser.add_argument('--batch-size', type=int, default=transfer.IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['snippets'] < 0:
+            raise CommandError('--users tiene que ser positivo y --snippets no negativo')
+        rng = random.Random(options['seed'])
+
+        usernames = self.create_users(options['prefix'], options['users'])
+        # Actividad tipo Pareto: unos pocos autores publican la mayoria de snippets.
+        author_weights = [rng.paretovariate(1.2) for _ in usernames]
+
+        now = timezone.now()
+        languages = list(LANGUAGE_WEIGHTS)
+        language_weights = list(LANGUAGE_WEIGHTS.values())
+
+        def records():
+            for number in range(1, options['snippets'] + 1):
+                language = rng.choices(languages, weights=language_weights)[0]
+                yield number, {
+                    'title': ' '.join(rng.sample(WORDS, 3)).capitalize()[:50],
+                    'language': language,
+                    'description': ' '.join(rng.choices(WORDS, k=rng.randint(0, 40))) or None,
+                    'source_code': random_code(rng, language),
+                    'pub_date': (now - timedelta(seconds=rng.randint(0, options['days'] * 86400))).isoformat(),
+                    'author': rng.choices(usernames, weights=author_weights)[0],
+                    'cont_visited': int(rng.paretovariate(1.5)) - 1,
+                    'point': random_point(rng),
+                }
+
+        imported = transfer.import_snippets(records(), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Usuarios: {len(usernames)}, snippets generados: {imported} (total en la base de datos: "
+            f"{Snippet.objects.count()})"
+        ))
+
+    def create_users(self, prefix, count):
+        """
+        Crea (si no existen) los usuarios prefix_0..prefix_{count-1} con su perfil. Devuelve los nombres.
+        """
+        usernames = [f'{prefix}_{i}' for i in range(count)]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        # El hash es caro: todos los usuarios generados comparten la misma contraseña.
+        password = make_password(prefix)
+        with transaction.atomic():
+            User.objects.bulk_create(
+                [User(username=username, password=password) for username in usernames if username not in existing],
+                batch_size=1000,
+            )
+            users = User.objects.filter(username__in=usernames, userprofile__isnull=True)
+            profiles = UserProfile.objects.bulk_create([UserProfile(user=user) for user in users], batch_size=1000)
+            AuthorStats.objects.bulk_create([AuthorStats(profile=profile) for profile in profiles], batch_size=1000)
+        return usernames
@@ -0,0 +1,44 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from snippets import transfer
+
+
+class Command(BaseCommand):
+    help = ("Importa snippets desde JSONL o GeoJSON (el formato de export_snippets) con bulk_create por lotes, "
+            "una transaccion por lote y memoria constante.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="Fichero de entrada ('-' para stdin).")
+        parser.add_argument('--format', choices=transfer.FORMATS,
+                            help="Por defecto se deduce de la extension (.geojson/.json -> geojson).")
+        parser.add_argument('--batch-size', type=int, default=transfer.IMPORT_BATCH_SIZE)
+        parser.add_argument('--skip-invalid', action='store_true',
+                            help="Salta los registros invalidos en vez de abortar.")
+
+    def handle(self, *args, **options):
+        path = options['input']
+        file_format = options['format'] or ('geojson' if path.endswith(('.geojson', '.json')) else 'jsonl')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size tiene que ser positivo')
+
+        fp = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        errors = []
+        start = time.perf_counter()
+        try:
+            records = transfer.read_geojson(fp) if file_format == 'geojson' else transfer.read_jsonl(fp)
+            imported = transfer.import_snippets(records, options['batch_size'], options['skip_invalid'], errors)
+        except transfer.InvalidRecord as e:
+            raise CommandError(f'{e} (los lotes anteriores ya estan guardados)')
+        finally:
+            if fp is not sys.stdin:
+                fp.close()
+
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Snippets importados: {imported} en {time.perf_counter() - start:.1f} s"
+            + (f", {len(errors)} registros saltados" if errors else '')
+        ))
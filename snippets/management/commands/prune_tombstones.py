@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from snippets import sync
+
+
+class Command(BaseCommand):
+    help = "Borra los registros de snippets eliminados mas antiguos que SNIPPETS_TOMBSTONE_RETENTION_DAYS."
+
+    def handle(self, *args, **options):
+        deleted = sync.prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Tombstones borrados: {deleted}"))
@@ -0,0 +1,52 @@
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+from snippets import assets
+
+
+class Command(BaseCommand):
+    help = ("Descarga en snippets/static/vendor/ las librerias de terceros (assets.VENDOR_FILES), para servirlas "
+            "desde el propio dominio y meterlas en los bundles en lugar de pedirlas a los CDN. Rechaza las que no "
+            "coinciden con su hash fijado.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Descarga tambien las que ya estan.")
+        parser.add_argument('--pin', action='store_true',
+                            help="Descarga tambien las que no tienen hash fijado y escribe el hash para fijarlo "
+                                 "en assets.VENDOR_FILES despues de revisarlas.")
+        parser.add_argument('--timeout', type=int, default=30)
+
+    def handle(self, *args, **options):
+        downloaded = 0
+        unpinned = []
+        for name, (url, integrity) in assets.VENDOR_FILES.items():
+            path = assets.STATIC_DIR / (assets.VENDOR_PREFIX + name)
+            if path.exists() and not options['force']:
+                self.check(name, path.read_bytes())
+                continue
+            if integrity is None and not options['pin']:
+                unpinned.append(name)
+                continue
+            try:
+                with urllib.request.urlopen(url, timeout=options['timeout']) as response:
+                    content = response.read()
+            except OSError as exc:
+                raise CommandError(f"No se ha podido descargar {url}: {exc}")
+            # Se comprueba antes de escribir: un fichero que no coincide no llega a static/vendor/.
+            self.check(name, content)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(content)
+            downloaded += 1
+            pin = '' if integrity else ' (sin fijar: revisalo y fijalo en assets.VENDOR_FILES)'
+            self.stdout.write(f"{name}: {len(content)} bytes, {assets.sri_hash(content)}{pin}")
+
+        if unpinned:
+            self.stderr.write(f"Sin hash fijado, no descargadas (usa --pin): {', '.join(unpinned)}")
+        self.stdout.write(self.style.SUCCESS(f"Librerias descargadas: {downloaded}"))
+
+    def check(self, name, content):
+        try:
+            assets.check_integrity(name, content)
+        except assets.VendorIntegrityError as exc:
+            raise CommandError(f"Hash distinto del fijado, no se usa: {exc}")
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0006_remove_snippet_latitude_remove_snippet_longitude_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='snippet',
+            index=models.Index(fields=['-pub_date', '-id'], name='snippet_feed_idx'),
+        ),
+    ]
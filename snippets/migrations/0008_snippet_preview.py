@@ -0,0 +1,37 @@
+# Generated by Django 6.0.2 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+PREVIEW_LINES = 8
+PREVIEW_MAX_CHARS = 600
+BATCH_SIZE = 1000
+
+
+def backfill_previews(apps, schema_editor):
+    Snippet = apps.get_model('snippets', 'Snippet')
+    batch = []
+    for snippet in Snippet.objects.only('pk', 'source_code').iterator(chunk_size=BATCH_SIZE):
+        lines = (snippet.source_code or '').split('\n', PREVIEW_LINES)[:PREVIEW_LINES]
+        snippet.preview = '\n'.join(lines)[:PREVIEW_MAX_CHARS]
+        batch.append(snippet)
+        if len(batch) >= BATCH_SIZE:
+            Snippet.objects.bulk_update(batch, ['preview'])
+            batch = []
+    if batch:
+        Snippet.objects.bulk_update(batch, ['preview'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0007_snippet_feed_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snippet',
+            name='preview',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_previews, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Configuracion para codigo: sin stemming ni stopwords. El parser de PostgreSQL ya separa snake_case
+# (get_or_create -> get, or, create), y el documento añade el codigo con el camelCase separado.
+CREATE_SEARCH_SQL = r"""
+CREATE TEXT SEARCH CONFIGURATION codeatlas_code (COPY = pg_catalog.simple);
+
+CREATE FUNCTION snippets_search_document(title text, description text, source_code text)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('pg_catalog.english', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('codeatlas_code', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('pg_catalog.english', coalesce(description, '')), 'B')
+        || setweight(to_tsvector('codeatlas_code', coalesce(source_code, '')), 'C')
+        || setweight(to_tsvector('codeatlas_code',
+                                 regexp_replace(coalesce(source_code, ''), '([a-z0-9])([A-Z])', '\1 \2', 'g')), 'D');
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE FUNCTION snippets_search_update() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO snippets_snippetsearch (snippet_id, search_vector)
+    VALUES (NEW.id, snippets_search_document(NEW.title, NEW.description, NEW.source_code))
+    ON CONFLICT (snippet_id) DO UPDATE SET search_vector = EXCLUDED.search_vector;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER snippets_search_insert
+    AFTER INSERT ON snippets_snippet
+    FOR EACH ROW EXECUTE FUNCTION snippets_search_update();
+
+CREATE TRIGGER snippets_search_update
+    AFTER UPDATE OF title, description, source_code ON snippets_snippet
+    FOR EACH ROW EXECUTE FUNCTION snippets_search_update();
+
+INSERT INTO snippets_snippetsearch (snippet_id, search_vector)
+SELECT id, snippets_search_document(title, description, source_code) FROM snippets_snippet;
+"""
+
+DROP_SEARCH_SQL = """
+DROP TRIGGER IF EXISTS snippets_search_update ON snippets_snippet;
+DROP TRIGGER IF EXISTS snippets_search_insert ON snippets_snippet;
+DROP FUNCTION IF EXISTS snippets_search_update();
+DROP FUNCTION IF EXISTS snippets_search_document(text, text, text);
+DROP TEXT SEARCH CONFIGURATION IF EXISTS codeatlas_code;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0008_snippet_preview'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnippetSearch',
+            fields=[
+                ('snippet', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search', serialize=False, to='snippets.snippet')),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='snippet_search_vector_idx')],
+            },
+        ),
+        migrations.RunSQL(CREATE_SEARCH_SQL, DROP_SEARCH_SQL),
+    ]
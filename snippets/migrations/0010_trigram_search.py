@@ -0,0 +1,70 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:30
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+# Mismo trigger que en 0009, ahora tambien extrae los identificadores del codigo.
+UPDATE_TRIGGER_SQL = r"""
+CREATE FUNCTION snippets_identifiers(source_code text) RETURNS text AS $$
+    SELECT coalesce(string_agg(DISTINCT m[1], ' '), '')
+    FROM regexp_matches(coalesce(source_code, ''), '([A-Za-z_][A-Za-z0-9_]{2,})', 'g') AS m;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION snippets_search_update() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO snippets_snippetsearch (snippet_id, search_vector, identifiers)
+    VALUES (NEW.id,
+            snippets_search_document(NEW.title, NEW.description, NEW.source_code),
+            snippets_identifiers(NEW.source_code))
+    ON CONFLICT (snippet_id) DO UPDATE
+        SET search_vector = EXCLUDED.search_vector,
+            identifiers = EXCLUDED.identifiers;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+UPDATE snippets_snippetsearch ss
+SET identifiers = snippets_identifiers(s.source_code)
+FROM snippets_snippet s
+WHERE s.id = ss.snippet_id;
+"""
+
+REVERT_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION snippets_search_update() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO snippets_snippetsearch (snippet_id, search_vector)
+    VALUES (NEW.id, snippets_search_document(NEW.title, NEW.description, NEW.source_code))
+    ON CONFLICT (snippet_id) DO UPDATE SET search_vector = EXCLUDED.search_vector;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP FUNCTION IF EXISTS snippets_identifiers(text);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0009_snippetsearch'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='snippetsearch',
+            name='identifiers',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.RunSQL(UPDATE_TRIGGER_SQL, REVERT_TRIGGER_SQL),
+        migrations.AddIndex(
+            model_name='snippet',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('title'), name='gin_trgm_ops'), name='snippet_title_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='snippetsearch',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('identifiers'), name='gin_trgm_ops'), name='snippet_identifiers_trgm_idx'),
+        ),
+    ]
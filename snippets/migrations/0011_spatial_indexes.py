@@ -0,0 +1,36 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:00
+
+import django.contrib.gis.db.models.fields
+import django.contrib.postgres.indexes
+import django.db.models.functions.comparison
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0010_trigram_search'),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.AddIndex(
+            model_name='snippet',
+            index=django.contrib.postgres.indexes.GistIndex(condition=models.Q(('point__isnull', False)), fields=['point'], name='snippet_point_gist_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='snippet',
+            index=django.contrib.postgres.indexes.GistIndex(condition=models.Q(('point__isnull', False)), fields=['language', 'point'], name='snippet_lang_point_gist_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='snippet',
+            index=django.contrib.postgres.indexes.GistIndex(django.db.models.functions.comparison.Cast('point', output_field=django.contrib.gis.db.models.fields.PointField(geography=True, srid=4326)), condition=models.Q(('point__isnull', False)), name='snippet_point_geog_idx'),
+        ),
+        # El indice espacial completo que creaba PointField queda cubierto por snippet_point_gist_idx.
+        migrations.AlterField(
+            model_name='snippet',
+            name='point',
+            field=django.contrib.gis.db.models.fields.PointField(blank=True, null=True, spatial_index=False, srid=4326),
+        ),
+    ]
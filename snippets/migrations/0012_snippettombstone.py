@@ -0,0 +1,25 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0011_spatial_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnippetTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snippet_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='snippet',
+            index=models.Index(fields=['pub_update'], name='snippet_pub_update_idx'),
+        ),
+    ]
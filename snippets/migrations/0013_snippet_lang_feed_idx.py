@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0012_snippettombstone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='snippet',
+            index=models.Index(fields=['language', '-pub_date', '-id'], name='snippet_lang_feed_idx'),
+        ),
+    ]
@@ -1,8 +1,39 @@
 from django.contrib.gis.db import models
 from django.contrib.gis.geos import Point
+from django.contrib.postgres.indexes import GinIndex, GistIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models import Q
+from django.db.models.functions import Cast, Left, Upper
 
 from accounts.models import UserProfile
 
+# Vista previa guardada del codigo que se muestra en las tarjetas de los listados.
+PREVIEW_LINES = 8
+PREVIEW_MAX_CHARS = 600
+
+# Caracteres de la descripcion que se cargan en los listados (las tarjetas la truncan a unas pocas palabras).
+DESCRIPTION_EXCERPT_CHARS = 300
+
+
+def build_preview(source_code):
+    """
+    Primeras PREVIEW_LINES lineas del codigo, como mucho PREVIEW_MAX_CHARS caracteres.
+    """
+    lines = (source_code or '').split('\n', PREVIEW_LINES)[:PREVIEW_LINES]
+    return '\n'.join(lines)[:PREVIEW_MAX_CHARS]
+
+
+class SnippetQuerySet(models.QuerySet):
+
+    def for_list(self):
+        """
+        Queryset para tarjetas de listados: no carga source_code ni description enteros,
+        solo la vista previa y un extracto de la descripcion (description_excerpt).
+        """
+        return self.defer('source_code', 'description').annotate(
+            description_excerpt=Left('description', DESCRIPTION_EXCERPT_CHARS)
+        )
+
 
 # Create your models here.
 
@@ -34,13 +65,75 @@ class Snippet(models.Model):
         max_length=20
     )
 
+    # Lo incrementa snippets.visits con "cont_visited + n". Un save() completo lo escribe tal cual (el admin puede
+    # corregirlo); el codigo que guarda un snippet leido antes de un volcado debe pasar update_fields sin el.
     cont_visited = models.IntegerField(default=0)
 
-    point = models.PointField(null=True, blank=True)
+    # Sin el indice espacial automatico: los indices GiST parciales de Meta.indexes lo sustituyen.
+    point = models.PointField(null=True, blank=True, spatial_index=False)
+
+    preview = models.TextField(blank=True, default='', editable=False)
+
+    objects = SnippetQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Paginacion por cursor del indice (snippets.pagination): ORDER BY pub_date DESC, id DESC.
+            models.Index(fields=['-pub_date', '-id'], name='snippet_feed_idx'),
+            # Filtro por lenguaje del admin con el mismo orden.
+            models.Index(fields=['language', '-pub_date', '-id'], name='snippet_lang_feed_idx'),
+            # Autocompletado (snippets.autocomplete): icontains se traduce a UPPER(title) LIKE ...
+            GinIndex(OpClass(Upper('title'), name='gin_trgm_ops'), name='snippet_title_trgm_idx'),
+            # Mapa y proximidad (snippets.nearby): solo se indexan los snippets con posicion.
+            # bbox (point && ...) y vecinos mas cercanos (ORDER BY point <-> ...).
+            GistIndex(fields=['point'], name='snippet_point_gist_idx', condition=Q(point__isnull=False)),
+            # Vecinos mas cercanos de un lenguaje (btree_gist permite combinar language = ... con <->).
+            GistIndex(fields=['language', 'point'], name='snippet_lang_point_gist_idx',
+                      condition=Q(point__isnull=False)),
+            # Sincronizacion incremental del mapa (snippets.sync): pub_update > since.
+            models.Index(fields=['pub_update'], name='snippet_pub_update_idx'),
+            # Radio en metros: ST_DWithin(point::geography, ...).
+            GistIndex(Cast('point', output_field=models.PointField(geography=True, srid=4326)),
+                      name='snippet_point_geog_idx', condition=Q(point__isnull=False)),
+        ]
 
     def __str__(self):
         return f'{self.title} [{self.language}]'
 
+    # Campos cuyo valor en la base de datos se recuerda al cargar, para que las señales sepan que cambio
+    # (teselas de la posicion anterior, perfil y totales del autor anterior...).
+    TRACKED_FIELDS = ('point', 'author_id', 'language', 'cont_visited')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {name: instance.__dict__.get(name) for name in cls.TRACKED_FIELDS}
+        return instance
+
+    def loaded_value(self, name):
+        """
+        Valor de un campo de TRACKED_FIELDS tal y como se leyo de la base de datos (None si es nuevo).
+        """
+        return getattr(self, '_loaded_values', {}).get(name)
+
+    def remember_loaded_values(self):
+        self._loaded_values = {name: self.__dict__.get(name) for name in self.TRACKED_FIELDS}
+
+    def update_derived_fields(self):
+        """
+        Recalcula los campos que se derivan del codigo. bulk_create no llama a save(), hay que invocarlo a mano.
+        """
+        self.preview = build_preview(self.source_code)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        source_loaded = 'source_code' not in self.get_deferred_fields()
+        if source_loaded and (update_fields is None or 'source_code' in update_fields):
+            self.update_derived_fields()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'preview'}
+        super().save(*args, **kwargs)
+
     def get_language_badge_color(self):
         return {
             'python': 'bg-primary',
@@ -55,3 +148,28 @@ class Snippet(models.Model):
             'kotlin': 'bg-purple',
             'markdown': 'bg-light text-dark',
         }.get(self.language, 'bg-primary')
+
+
+# Documento de busqueda de un snippet. Va en su propia tabla para no cargar el tsvector con cada Snippet;
+# lo mantiene un trigger de PostgreSQL (migracion 0009), asi que tambien cubre bulk_create y update().
+class SnippetSearch(models.Model):
+    snippet = models.OneToOneField(Snippet, on_delete=models.CASCADE, primary_key=True, related_name='search')
+    search_vector = SearchVectorField(null=True)
+    # Identificadores del codigo separados por espacios, para el autocompletado por trigramas.
+    identifiers = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='snippet_search_vector_idx'),
+            GinIndex(OpClass(Upper('identifiers'), name='gin_trgm_ops'), name='snippet_identifiers_trgm_idx'),
+        ]
+
+
+# Registro de un snippet eliminado, para que los clientes del mapa que sincronizan por cambios
+# (snippets.sync) sepan que marcador quitar. Se purgan con el comando prune_tombstones.
+class SnippetTombstone(models.Model):
+    snippet_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f'Snippet {self.snippet_id} eliminado el {self.deleted_at}'
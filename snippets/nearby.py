@@ -0,0 +1,86 @@
+from django.contrib.gis.db.models import PointField
+from django.contrib.gis.db.models.functions import Distance, GeometryDistance
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+from django.db.models.functions import Cast
+
+from snippets.models import Snippet
+
+# Limites de las consultas de proximidad.
+NEAREST_DEFAULT_LIMIT = 10
+NEAREST_MAX_LIMIT = 100
+RADIUS_MAX_METERS = 100_000
+RADIUS_MAX_RESULTS = 500
+
+# Misma expresion que el indice snippet_point_geog_idx: si cambia, el planificador deja de usarlo.
+GEOGRAPHY_POINT = Cast('point', output_field=PointField(geography=True, srid=4326))
+
+
+def _located(language=None):
+    # El "point IS NOT NULL" explicito es el predicado de los indices parciales.
+    qs = Snippet.objects.filter(point__isnull=False).only(
+        'pk', 'title', 'language', 'author', 'cont_visited', 'point')
+    if language:
+        qs = qs.filter(language=language)
+    return qs
+
+
+def nearest_snippets(point, limit=NEAREST_DEFAULT_LIMIT, language=None):
+    """
+    Los limit snippets mas cercanos a point, del mas cercano al mas lejano.
+
+    Ordena por point <-> origen (busqueda KNN sobre el indice GiST, sin calcular la distancia de todas
+    las filas) y solo calcula la distancia real en metros (annotate "distance") de las filas devueltas.
+    """
+    return _located(language).annotate(
+        knn=GeometryDistance('point', point),
+        distance=Distance('point', point),
+    ).order_by('knn')[:limit]
+
+
+def snippets_within(point, radius, language=None, limit=RADIUS_MAX_RESULTS):
+    """
+    Snippets a menos de radius metros de point, del mas cercano al mas lejano.
+
+    ST_DWithin sobre geography (metros reales en cualquier latitud), resuelto con el indice de expresion
+    snippet_point_geog_idx.
+    """
+    return _located(language).annotate(geography=GEOGRAPHY_POINT).filter(
+        geography__dwithin=(point, D(m=radius)),
+    ).annotate(
+        distance=Distance('point', point),
+    ).order_by('distance')[:limit]
+
+
+def parse_origin(lon, lat):
+    """
+    Point WGS84 a partir de los parametros lon/lat. Lanza ValueError si no son coordenadas validas.
+    """
+    lon, lat = float(lon), float(lat)
+    if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+        raise ValueError(f'coordenadas fuera de rango: {lon}, {lat}')
+    return Point(lon, lat, srid=4326)
+
+
+def as_feature_collection(snippets):
+    """
+    FeatureCollection (como dict) de los resultados, con la distancia en metros en las propiedades.
+    """
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {
+                'type': 'Feature',
+                'id': snippet.pk,
+                'properties': {
+                    'title': snippet.title,
+                    'language': snippet.language,
+                    'author': snippet.author_id,
+                    'cont_visited': snippet.cont_visited,
+                    'distance': round(snippet.distance.m, 1),
+                },
+                'geometry': {'type': 'Point', 'coordinates': [snippet.point.x, snippet.point.y]},
+            }
+            for snippet in snippets
+        ],
+    }
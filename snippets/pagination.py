@@ -0,0 +1,112 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(snippet):
+    """
+    Cursor opaco con la posicion (pub_date, id) del ultimo snippet de la pagina.
+    """
+    raw = f'{snippet.pub_date.isoformat()}|{snippet.pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Devuelve la tupla (pub_date, id) de un cursor. Lanza InvalidCursor si el token no es valido.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        pub_date, pk = raw.split('|')
+        return datetime.fromisoformat(pub_date), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(f'cursor inválido: {token}') from e
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def keyset_page(queryset, cursor=None, per_page=9):
+    """
+    Pagina un queryset por (pub_date, id) descendente sin COUNT(*) ni OFFSET.
+
+    Cada pagina es un rango sobre el indice compuesto, asi que la pagina 5.000 cuesta lo mismo que la primera.
+    """
+    qs = queryset.order_by('-pub_date', '-id')
+    if cursor:
+        pub_date, pk = decode_cursor(cursor)
+        # Un id fuera del rango de la columna haria fallar la consulta en PostgreSQL (error 500, no 400).
+        low, high = connections[qs.db].ops.integer_field_range(qs.model._meta.pk.get_internal_type())
+        if not low <= pk <= high:
+            raise InvalidCursor(f'cursor inválido: {cursor}')
+        # Equivale a (pub_date, id) < (cursor); el pub_date <= acota el rango del indice.
+        qs = qs.filter(Q(pub_date__lte=pub_date) & (Q(pub_date__lt=pub_date) | Q(id__lt=pk)))
+
+    items = list(qs[:per_page + 1])
+    next_cursor = encode_cursor(items[per_page - 1]) if len(items) > per_page else None
+    return KeysetPage(items[:per_page], next_cursor)
+
+
+def exact_count_limit():
+    return getattr(settings, 'SNIPPETS_ADMIN_EXACT_COUNT_LIMIT', 10000)
+
+
+def estimate_count(queryset):
+    """
+    Numero aproximado de filas del queryset segun PostgreSQL, sin recorrerlas.
+
+    Sin filtros usa pg_class.reltuples (lo que guardo el ultimo ANALYZE/autovacuum); con filtros, las filas
+    que estima el planificador (EXPLAIN). Devuelve None si la tabla no se ha analizado nunca.
+    """
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                           [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+            # reltuples es -1 mientras la tabla no tenga estadisticas.
+            return row[0] if row and row[0] >= 0 else None
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator que evita el COUNT(*) exacto en tablas grandes: si la estimacion de PostgreSQL supera
+    SNIPPETS_ADMIN_EXACT_COUNT_LIMIT se usa la estimacion como total; por debajo se cuenta de verdad.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate > exact_count_limit():
+            return estimate
+        return super().count
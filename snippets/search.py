@@ -0,0 +1,33 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+
+from snippets.models import Snippet
+
+# La consulta se evalua con las dos configuraciones del documento (ver migracion 0009):
+# english para el texto y codeatlas_code para identificadores.
+SEARCH_CONFIGS = ('pg_catalog.english', 'codeatlas_code')
+
+SEARCH_RESULTS_LIMIT = 30
+
+
+def build_query(text):
+    query = None
+    for config in SEARCH_CONFIGS:
+        config_query = SearchQuery(text, config=config, search_type='websearch')
+        query = config_query if query is None else query | config_query
+    return query
+
+
+def search_snippets(text, language=None, limit=SEARCH_RESULTS_LIMIT):
+    """
+    Busca snippets por titulo, descripcion y codigo, ordenados por relevancia.
+
+    Usa el indice GIN de SnippetSearch.search_vector; language filtra por un valor de LENGUAJES_CHOICES.
+    """
+    query = build_query(text)
+    qs = Snippet.objects.for_list().filter(search__search_vector=query)
+    if language:
+        qs = qs.filter(language=language)
+    return qs.annotate(
+        rank=SearchRank(F('search__search_vector'), query)
+    ).order_by('-rank', '-pub_date')[:limit]
@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts import stats as author_stats
+from accounts.models import UserProfile
+from snippets import caching, highlighting, live, tiles
+from snippets.visits import visits_flushed
+from snippets.models import Snippet, SnippetTombstone
+
+
+def snippet_cache_groups(snippet, author_ids):
+    """
+    Grupos de la cache de respuestas que dependen de un snippet: listado, detalle, mapa y
+    perfil publico de sus autores (el actual y el anterior si ha cambiado).
+    """
+    usernames = UserProfile.objects.filter(pk__in=[pk for pk in author_ids if pk is not None]) \
+        .values_list('user__username', flat=True)
+    return ['snippets:list', f'snippets:detail:{snippet.pk}', 'snippets:map',
+            *[f'profiles:{username}' for username in usernames]]
+
+
+def live_event(instance, created=False, deleted=False):
+    """
+    Evento para los mapas conectados por WebSocket (snippets.live), o None si la posicion no ha cambiado.
+    """
+    previous = None if created else instance.loaded_value('point')
+    current = None if deleted else instance.__dict__.get('point')
+    if deleted and previous is None:
+        previous = instance.__dict__.get('point')
+    if previous == current:
+        return None
+    if current is None:
+        return live.snippet_event(instance, 'deleted', previous)
+    return live.snippet_event(instance, 'created' if previous is None else 'moved', previous)
+
+
+def _snippet_changed(instance, created=False, deleted=False):
+    points = [instance.loaded_value('point'), instance.__dict__.get('point')]
+    groups = snippet_cache_groups(instance, {instance.loaded_value('author_id'), instance.author_id})
+    event = live_event(instance, created, deleted)
+
+    def on_commit():
+        tiles.invalidate_points(points)
+        caching.invalidate(*groups)
+        if event is not None:
+            live.publish(event)
+
+    transaction.on_commit(on_commit)
+    highlighting.invalidate_snippet(instance.pk)
+
+
+@receiver(post_save, sender=Snippet)
+def snippet_saved(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """
+    Invalida, cuando se confirma la transaccion, las teselas de la posicion anterior y de la nueva
+    y las paginas cacheadas que muestran el snippet; y el codigo resaltado que hubiera en cache.
+    Actualiza tambien los totales de los autores afectados.
+    """
+    _snippet_changed(instance, created=created)
+    if not raw:
+        author_stats.snippet_saved(instance, created, update_fields)
+    instance.remember_loaded_values()
+
+
+@receiver(post_delete, sender=Snippet)
+def snippet_deleted(sender, instance, **kwargs):
+    _snippet_changed(instance, deleted=True)
+    author_stats.snippet_deleted(instance)
+    if instance.loaded_value('point') is not None or instance.__dict__.get('point') is not None:
+        # Para que los mapas que sincronizan por cambios (snippets.sync) quiten el marcador.
+        SnippetTombstone.objects.create(snippet_id=instance.pk)
+
+
+@receiver(visits_flushed)
+def snippet_visits_flushed(sender, deltas, **kwargs):
+    """
+    Invalida, cuando se confirma el volcado de visitas, lo cacheado que muestra los contadores: el detalle de
+    cada snippet, el GeoJSON del mapa, el perfil publico de sus autores (total_visits) y las teselas donde
+    aparecen (cont_visited).
+    """
+    usernames = UserProfile.objects.filter(snippets__pk__in=list(deltas)) \
+        .values_list('user__username', flat=True).distinct()
+    groups = ['snippets:map', *[f'snippets:detail:{pk}' for pk in deltas],
+              *[f'profiles:{username}' for username in usernames]]
+    points = list(Snippet.objects.filter(pk__in=list(deltas), point__isnull=False).values_list('point', flat=True))
+
+    def on_commit():
+        tiles.invalidate_points(points)
+        caching.invalidate(*groups)
+
+    transaction.on_commit(on_commit)
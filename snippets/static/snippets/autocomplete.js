@@ -0,0 +1,50 @@
+(function () {
+    "use strict";
+
+    // Espera tras la última pulsación antes de pedir sugerencias.
+    const DEBOUNCE_MS = 200;
+    const MIN_CHARS = 3;
+
+    const input = document.getElementById('searchInput');
+    const datalist = document.getElementById('searchSuggestions');
+    if (!input || !datalist) return;
+
+    let timer = null;
+    let controller = null;
+
+    function fillSuggestions(data) {
+        const values = [
+            ...data.titles.map(item => item.title),
+            ...data.identifiers.map(item => item.identifier),
+        ];
+        datalist.replaceChildren(...[...new Set(values)].map(value => {
+            const option = document.createElement('option');
+            option.value = value;
+            return option;
+        }));
+    }
+
+    async function fetchSuggestions(text) {
+        // Cancela la petición anterior si el usuario sigue escribiendo.
+        if (controller) controller.abort();
+        controller = new AbortController();
+
+        try {
+            const url = `${input.dataset.autocompleteUrl}?q=${encodeURIComponent(text)}`;
+            const response = await fetch(url, {signal: controller.signal});
+            if (response.ok) fillSuggestions(await response.json());
+        } catch (err) {
+            if (err.name !== 'AbortError') console.error('Autocompletado:', err);
+        }
+    }
+
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        const text = input.value.trim();
+        if (text.length < MIN_CHARS) {
+            datalist.replaceChildren();
+            return;
+        }
+        timer = setTimeout(() => fetchSuggestions(text), DEBOUNCE_MS);
+    });
+})();
@@ -7,6 +7,13 @@
     const USE_BBOX = false;
     const FIT_BOUNDS_ON_LOAD = true;
     const URL_NEW_SNIPPET = "/snippets/new/";
+    // Hasta este zoom (incluido) se piden clusters al servidor en lugar de puntos sueltos.
+    const CLUSTER_MAX_ZOOM = 8;
+    // Cada cuanto se piden los cambios (?since=) en modo puntos.
+    const SYNC_INTERVAL_MS = 30000;
+    // Reintento de la conexión en vivo (WebSocket): espera inicial y máxima.
+    const LIVE_RETRY_MS = 2000;
+    const LIVE_RETRY_MAX_MS = 60000;
 
     const LANG_COLORS = {
         'python': '#3776ab', 'javascript': '#f7df1e', 'typescript': '#3178c6',
@@ -17,6 +24,15 @@
     const DEFAULT_COLOR = '#6c757d';
 
     let map, layerGroup, geoLayer;
+    let currentMode = null;
+    let initialLoad = true;
+    let loadSeq = 0;
+    // Marcadores por id de snippet y momento de los datos cargados (cabecera X-Map-Timestamp).
+    let featureLayers = new Map();
+    let lastSync = null;
+    let syncing = false;
+    let liveSocket = null;
+    let liveRetry = LIVE_RETRY_MS;
 
     /**
      * Helper para mostrar notificaciones con Swal.
@@ -198,21 +214,22 @@
                     marker.setStyle(originalStyle);
 
                     if (data.success) {
+                        setFeatureCoordinates(marker.feature, nuevaLat, nuevaLng);
                         showAlert('Ubicación actualizada', 'Las coordenadas se guardaron correctamente.', 'success');
                         log(`ID:${marker.feature.id}. Ubicación actualizada.`);
                     } else {
                         showAlert('Error al guardar', data.error || 'Error desconocido', 'error', 5000);
                         log("Error: " + (data.error || "Desconocido"));
-                        loadGeoJSON();
+                        revertMarker(marker);
                     }
                 } catch (err) {
                     marker.setStyle(originalStyle);
                     showAlert('Error de conexión', 'No se pudo contactar con el servidor.', 'error', 5000);
                     log(`Error: ${err}`);
-                    loadGeoJSON();
+                    revertMarker(marker);
                 }
             } else {
-                loadGeoJSON();
+                revertMarker(marker);
             }
         });
 
@@ -327,6 +344,7 @@
             layer.closeTooltip();
 
             if (data.success) {
+                setFeatureCoordinates(layer.feature, lat, lng);
                 layer.bindTooltip('Actualizado', {direction: 'top'}).openTooltip();
                 showAlert('Guardado', 'Ubicación actualizada correctamente.', 'success');
                 setTimeout(() => {
@@ -336,34 +354,208 @@
                 }, 1000);
             } else {
                 showAlert('Error', data.error || 'Error desconocido', 'error', 5000);
+                revertMarker(layer);
             }
         } catch (err) {
             layer.closeTooltip();
             console.error('Error:', err);
             showAlert('Error de conexión', 'No se pudo contactar con el servidor.', 'error', 5000);
+            revertMarker(layer);
+        }
+    }
+
+    function setFeatureCoordinates(feature, lat, lng) {
+        feature.geometry = {type: 'Point', coordinates: [parseFloat(lng), parseFloat(lat)]};
+    }
+
+    /**
+     * Devuelve un marcador a la posición guardada en su feature (tras un error o una cancelación).
+     */
+    function revertMarker(marker) {
+        const [lng, lat] = marker.feature.geometry.coordinates;
+        marker.setLatLng([lat, lng]);
+    }
+
+    /**
+     * Crea el marcador de una feature nueva y lo añade a la capa, sin tocar el resto.
+     */
+    function addFeature(feature) {
+        const [lng, lat] = feature.geometry.coordinates;
+        const layer = pointToLayer(feature, L.latLng(lat, lng));
+        onEachFeature(feature, layer);
+        geoLayer.addLayer(layer);
+        featureLayers.set(feature.id, layer);
+    }
+
+    /**
+     * Actualiza en el sitio un marcador existente con los datos de su feature.
+     */
+    function updateFeature(layer, feature) {
+        const [lng, lat] = feature.geometry.coordinates;
+        layer.feature = feature;
+        layer.setLatLng([lat, lng]);
+        layer.setStyle({fillColor: getColorForLanguage(feature.properties?.language)});
+        onEachFeature(feature, layer);
+    }
+
+    function removeFeature(id) {
+        const layer = featureLayers.get(id);
+        if (layer) {
+            geoLayer.removeLayer(layer);
+            featureLayers.delete(id);
         }
     }
 
+    function refreshCounters() {
+        const features = Array.from(featureLayers.values(), layer => layer.feature);
+        document.getElementById('totalCount').textContent = features.length;
+        generateLegend(countLanguages(features));
+    }
+
+    /**
+     * Aplica una respuesta de cambios (?since=): quita los ids de "removed" y añade o actualiza
+     * los marcadores de "features". Los marcadores que se están arrastrando no se tocan.
+     */
+    function applyChanges(data) {
+        data.removed.forEach(removeFeature);
+        data.features.forEach(feature => {
+            const layer = featureLayers.get(feature.id);
+            if (!layer) {
+                addFeature(feature);
+            } else if (!layer.pm?.dragging?.()) {
+                updateFeature(layer, feature);
+            }
+        });
+        refreshCounters();
+        if (data.features.length || data.removed.length) {
+            log(`Sincronizados ${data.features.length} cambios y ${data.removed.length} eliminados`);
+        }
+    }
+
+    /**
+     * Pide al servidor solo lo que ha cambiado desde la última carga y lo aplica a la capa.
+     */
+    function syncChanges() {
+        if (currentMode !== 'points' || !lastSync || !geoLayer || syncing) return;
+        const seq = loadSeq;
+        syncing = true;
+
+        $.ajax({
+            url: URL_GEOJSON,
+            method: "GET",
+            dataType: "json",
+            data: {...buildParams(), since: lastSync},
+            timeout: 15000,
+        }).done(function (data) {
+            if (seq !== loadSeq) return;
+            if (data && data.reset) {
+                loadGeoJSON();
+                return;
+            }
+            if (!data || !Array.isArray(data.features) || !Array.isArray(data.removed)) {
+                console.warn("Respuesta de cambios inválida:", data);
+                return;
+            }
+            applyChanges(data);
+            lastSync = data.timestamp;
+        }).fail(function (er) {
+            console.warn("Sync failed:", er);
+        }).always(function () {
+            syncing = false;
+        });
+    }
+
+    /**
+     * Envía al servidor el viewport actual para recibir solo los eventos que caen dentro.
+     * Sin USE_BBOX el mapa tiene todos los puntos, así que se suscribe a todo el mundo (bbox null):
+     * si no, al desplazarse no llegarían los eventos de la zona nueva ocurridos mientras estaba fuera.
+     */
+    function sendViewport() {
+        if (!liveSocket || liveSocket.readyState !== WebSocket.OPEN) return;
+        const bbox = USE_BBOX ? currentBBox().split(',').map(Number) : null;
+        liveSocket.send(JSON.stringify({bbox: bbox}));
+    }
+
+    /**
+     * Aplica un evento en vivo (created/moved/deleted) a la capa de puntos.
+     */
+    function applyLiveEvent(event) {
+        if (event.type === 'resync') {
+            syncChanges();
+            return;
+        }
+        if (currentMode !== 'points' || !geoLayer) return;
+        if (event.type === 'deleted') {
+            applyChanges({features: [], removed: [event.id]});
+            return;
+        }
+        const layer = featureLayers.get(event.id);
+        const feature = event.feature;
+        if (layer) {
+            // Los eventos solo traen los campos que cambian con la posición: se conservan los demás.
+            feature.properties = {...layer.feature.properties, ...feature.properties};
+        }
+        applyChanges({features: [feature], removed: []});
+    }
+
+    /**
+     * Conexión en vivo con el servidor. Si el despliegue no tiene WebSocket, el mapa sigue con
+     * la sincronización periódica por HTTP.
+     */
+    function connectLive() {
+        if (!window.WebSocket || typeof URL_LIVE === 'undefined' || !URL_LIVE) return;
+        const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        liveSocket = new WebSocket(`${scheme}://${window.location.host}${URL_LIVE}`);
+
+        liveSocket.onopen = function () {
+            liveRetry = LIVE_RETRY_MS;
+            sendViewport();
+            // Lo que haya cambiado mientras no había conexión.
+            syncChanges();
+        };
+        liveSocket.onmessage = function (message) {
+            try {
+                applyLiveEvent(JSON.parse(message.data));
+            } catch (e) {
+                console.warn('Evento en vivo inválido:', e);
+            }
+        };
+        liveSocket.onclose = function () {
+            liveSocket = null;
+            setTimeout(connectLive, liveRetry);
+            liveRetry = Math.min(liveRetry * 2, LIVE_RETRY_MAX_MS);
+        };
+    }
+
+    function isLive() {
+        return liveSocket !== null && liveSocket.readyState === WebSocket.OPEN;
+    }
+
+    function currentBBox() {
+        const b = map.getBounds();
+        return [
+            b.getWest().toFixed(6),
+            b.getSouth().toFixed(6),
+            b.getEast().toFixed(6),
+            b.getNorth().toFixed(6),
+        ].join(",");
+    }
+
     function buildParams() {
         if (!USE_BBOX) return {};
-        const b = map.getBounds();
-        return {
-            bbox: [
-                b.getWest().toFixed(6),
-                b.getSouth().toFixed(6),
-                b.getEast().toFixed(6),
-                b.getNorth().toFixed(6),
-            ].join(","),
-        };
+        return {bbox: currentBBox()};
     }
 
-    function generateLegend(features) {
+    function countLanguages(features) {
         const counts = {};
         features.forEach(f => {
             const lang = f.properties?.language;
             if (lang) counts[lang] = (counts[lang] || 0) + 1;
         });
+        return counts;
+    }
 
+    function generateLegend(counts) {
         const container = document.getElementById('legendContainer');
         if (!container) return;
 
@@ -397,7 +589,124 @@
         window.location.href = redirectUrl;
     }
 
+    /**
+     * Radio del círculo de un cluster, creciendo de forma logarítmica con el número de snippets.
+     */
+    function clusterRadius(count) {
+        return Math.min(40, 10 + Math.log2(count) * 4);
+    }
+
+    /**
+     * Crea el marcador de un cluster. No es editable con Geoman; el popup muestra el desglose por lenguaje.
+     */
+    function clusterToLayer(cluster) {
+        const languages = Object.entries(cluster.languages);
+        const dominant = languages.reduce((a, b) => (b[1] > a[1] ? b : a), [null, 0])[0];
+
+        const marker = L.circleMarker([cluster.lat, cluster.lng], {
+            radius: clusterRadius(cluster.count),
+            fillColor: getColorForLanguage(dominant),
+            color: '#fff',
+            weight: 2,
+            opacity: 1,
+            fillOpacity: 0.75,
+            pmIgnore: true,
+        });
+
+        marker.bindTooltip(String(cluster.count), {permanent: true, direction: 'center', className: 'cluster-label'});
+
+        const rows = languages.map(([lang, count]) => `
+          <div class="legend-item">
+            <span class="legend-dot" style="background-color: ${getColorForLanguage(lang)}"></span>
+            <span><strong>${lang}</strong> <small class="text-muted">(${count})</small></span>
+          </div>
+        `).join('');
+        marker.bindPopup(`
+      <div class="snippet-popup">
+        <div class="title">${cluster.count} snippets</div>
+        ${rows}
+        <div class="mt-2">
+          <button class="btn btn-sm btn-outline-primary zoom-cluster-btn">Acercar</button>
+        </div>
+      </div>
+    `);
+
+        marker.on('popupopen', function () {
+            document.querySelectorAll('.zoom-cluster-btn').forEach(btn => {
+                btn.onclick = function (e) {
+                    e.stopPropagation();
+                    marker.closePopup();
+                    map.setView([cluster.lat, cluster.lng], Math.min(map.getZoom() + 2, CLUSTER_MAX_ZOOM + 1));
+                };
+            });
+        });
+
+        return marker;
+    }
+
+    function loadClusters() {
+        const seq = ++loadSeq;
+        log("Cargando clusters...");
+
+        $.ajax({
+            url: URL_CLUSTERS,
+            method: "GET",
+            dataType: "json",
+            data: {zoom: map.getZoom(), bbox: currentBBox()},
+            timeout: 15000,
+        }).done(function (data) {
+            if (seq !== loadSeq) return;
+            layerGroup.clearLayers();
+            featureLayers.clear();
+            lastSync = null;
+
+            if (!data || !Array.isArray(data.clusters)) {
+                log("Respuesta inválida");
+                showAlert('Datos inválidos', 'La respuesta del servidor no tiene el formato esperado.', 'error', 5000);
+                return;
+            }
+
+            const counts = {};
+            let total = 0;
+            data.clusters.forEach(cluster => {
+                clusterToLayer(cluster).addTo(layerGroup);
+                total += cluster.count;
+                Object.entries(cluster.languages).forEach(([lang, count]) => {
+                    counts[lang] = (counts[lang] || 0) + count;
+                });
+            });
+
+            document.getElementById('totalCount').textContent = total;
+            generateLegend(counts);
+            log(`Cargados ${data.clusters.length} clusters (${total} snippets)`);
+        }).fail(function (er) {
+            if (seq !== loadSeq) return;
+            log(`Error ${er.status}: ${er.responseText || er.statusText}`);
+            console.error("Clusters load failed:", er);
+            showAlert('Error de carga', 'No se pudieron cargar los clusters del mapa.', 'error', 5000);
+        });
+    }
+
+    /**
+     * Decide según el zoom si se cargan clusters o puntos sueltos.
+     * Con puntos solo se recarga al cambiar de modo, salvo que USE_BBOX esté activo.
+     */
+    function loadData() {
+        const mode = map.getZoom() <= CLUSTER_MAX_ZOOM ? 'clusters' : 'points';
+        const modeChanged = mode !== currentMode;
+        currentMode = mode;
+
+        if (mode === 'clusters') {
+            loadClusters();
+        } else if (modeChanged || USE_BBOX) {
+            loadGeoJSON();
+        }
+        initialLoad = false;
+    }
+
     function loadGeoJSON() {
+        const seq = ++loadSeq;
+        const fitBounds = FIT_BOUNDS_ON_LOAD && initialLoad;
         log("Cargando GeoJSON...");
 
         $.ajax({
@@ -406,8 +715,11 @@
             dataType: "json",
             data: buildParams(),
             timeout: 15000,
-        }).done(function (data) {
+        }).done(function (data, textStatus, xhr) {
+            if (seq !== loadSeq) return;
             layerGroup.clearLayers();
+            featureLayers.clear();
+            lastSync = xhr.getResponseHeader('X-Map-Timestamp');
 
             if (!data || !Array.isArray(data.features)) {
                 log("Respuesta inválida");
@@ -420,14 +732,15 @@
                 pointToLayer: pointToLayer,
                 onEachFeature: onEachFeature,
             }).addTo(layerGroup);
+            geoLayer.eachLayer(layer => featureLayers.set(layer.feature.id, layer));
 
             const count = data.features.length;
             document.getElementById('totalCount').textContent = count;
 
-            generateLegend(data.features);
+            generateLegend(countLanguages(data.features));
             log(`Cargados ${count} snippets`);
 
-            if (FIT_BOUNDS_ON_LOAD && count > 0) {
+            if (fitBounds && count > 0) {
                 try {
                     map.fitBounds(geoLayer.getBounds(), {padding: [30, 30]});
                 } catch (e) {
@@ -435,6 +748,7 @@
                 }
             }
         }).fail(function (er) {
+            if (seq !== loadSeq) return;
             const msg = `Error ${er.status}: ${er.responseText || er.statusText}`;
             log("" + msg);
             console.error("GeoJSON load failed:", er);
@@ -481,7 +795,7 @@
             );
 
             if (!confirmado) {
-                layer.addTo(layerGroup);
+                geoLayer.addLayer(layer);
                 return;
             }
 
@@ -498,28 +812,35 @@
                 const data = await response.json();
 
                 if (data.success) {
-                    const countEl = document.getElementById('totalCount');
-                    countEl.textContent = Math.max(0, parseInt(countEl.textContent) - 1);
+                    featureLayers.delete(snippetId);
+                    refreshCounters();
                     showAlert('Eliminado', 'Snippet eliminado correctamente.', 'success');
                     log('Snippet eliminado');
                 } else {
                     showAlert('Error', data.error || 'Error desconocido', 'error', 5000);
                     log('Error: ' + (data.error || 'Desconocido'));
-                    loadGeoJSON();
+                    geoLayer.addLayer(layer);
                 }
             } catch (err) {
                 console.error('Error en AJAX:', err);
                 showAlert('Error de conexión', 'No se pudo eliminar el snippet.', 'error', 5000);
                 log('Error de conexión');
-                loadGeoJSON();
+                geoLayer.addLayer(layer);
             }
         });
 
-        loadGeoJSON();
-
-        if (USE_BBOX) {
-            map.on("moveend", loadGeoJSON);
-        }
+        loadData();
+
+        map.on("moveend", loadData);
+        if (USE_BBOX) map.on("moveend", sendViewport);
+        connectLive();
+        // Con la conexión en vivo abierta no hace falta sondear; sigue como respaldo si se cae.
+        setInterval(() => {
+            if (!isLive()) syncChanges();
+        }, SYNC_INTERVAL_MS);
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'visible') syncChanges();
+        });
     });
 
 })();
\ No newline at end of file
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from snippets.models import Snippet, SnippetTombstone
+
+# Margen que se resta a "since": cubre transacciones que guardaron pub_update antes de la ultima
+# sincronizacion del cliente pero confirmaron despues. Reenviar un cambio es inocuo.
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+def tombstone_retention():
+    return timedelta(days=getattr(settings, 'SNIPPETS_TOMBSTONE_RETENTION_DAYS', 7))
+
+
+class SyncExpired(Exception):
+    """
+    El cliente sincronizo por ultima vez antes de la retencion de tombstones: tiene que recargar entero.
+    """
+
+
+def timestamp():
+    """
+    Marca de tiempo que el cliente devolvera como "since" en la siguiente sincronizacion.
+    """
+    return f'{timezone.now().timestamp():.6f}'
+
+
+def parse_since(value):
+    """
+    Convierte el parametro since (segundos desde epoch) en datetime. Lanza ValueError si no es valido.
+    """
+    return datetime.fromtimestamp(float(value), tz=dt_timezone.utc)
+
+
+def _changes(since, bbox):
+    if since < timezone.now() - tombstone_retention():
+        raise SyncExpired()
+    since = since - SYNC_OVERLAP
+
+    changed = Snippet.objects.filter(pub_update__gt=since)
+    visible = Q(point__isnull=False)
+    if bbox:
+        visible &= Q(point__bboverlaps=bbox)
+
+    deleted = SnippetTombstone.objects.filter(deleted_at__gt=since).values_list('snippet_id', flat=True)
+    hidden = changed.exclude(visible).values_list('pk', flat=True)
+    return changed.filter(visible), deleted, hidden
+
+
+def changes_since(since, bbox=None):
+    """
+    Cambios en el mapa desde since.
+
+    @return:
+        Tupla (queryset de snippets a añadir o actualizar, lista de ids a quitar). Se quitan los snippets
+        eliminados (tombstones), los que han perdido la posicion y, si hay bbox, los que han salido de el.
+    """
+    visible, deleted, hidden = _changes(since, bbox)
+    return visible, sorted({*deleted, *hidden})
+
+
+async def achanges_since(since, bbox=None):
+    """
+    Version asincrona de changes_since().
+    """
+    visible, deleted, hidden = _changes(since, bbox)
+    return visible, sorted({*[pk async for pk in deleted], *[pk async for pk in hidden]})
+
+
+def prune_tombstones():
+    """
+    Borra los tombstones mas antiguos que la retencion. Devuelve cuantos se han borrado.
+    """
+    deleted, _ = SnippetTombstone.objects.filter(deleted_at__lt=timezone.now() - tombstone_retention()).delete()
+    return deleted
@@ -0,0 +1,53 @@
+from django import template
+from django.conf import settings
+from django.utils.html import format_html
+
+from snippets import assets, highlighting
+
+register = template.Library()
+
+
+@register.simple_tag
+def server_highlighting():
+    """
+    Indica si el codigo llega resaltado desde el servidor (y no hace falta cargar Prism).
+    """
+    return highlighting.is_enabled()
+
+
+@register.simple_tag
+def card_cache():
+    """
+    Parametros del {% cache %} de las tarjetas de snippets.
+
+    @return:
+        alias y timeout de la cache, y si el codigo va resaltado en el servidor (cambia el HTML de la
+        tarjeta, asi que va en la clave junto a pk y pub_update).
+    """
+    return {
+        'alias': getattr(settings, 'SNIPPETS_CARD_CACHE', 'default'),
+        'timeout': getattr(settings, 'SNIPPETS_CARD_CACHE_TIMEOUT', 24 * 3600),
+        'highlighting': highlighting.is_enabled(),
+    }
+
+
+@register.simple_tag
+def highlighted_code(snippet, field='source_code'):
+    """
+    Renderiza el campo de codigo de un snippet resaltado con Pygments.
+    Si el resaltado en servidor esta desactivado deja el bloque preparado para Prism.
+    """
+    source = getattr(snippet, field)
+    html = highlighting.highlight_code(source, snippet.language, owner=snippet.pk)
+    if html is None:
+        return format_html('<pre class="m-0"><code class="language-{}">{}</code></pre>', snippet.language, source)
+    return html
+
+
+@register.simple_tag
+def asset_bundle(name, kind):
+    """
+    Etiqueta <link> o <script> del bundle de un tipo de pagina (snippets.assets.BUNDLES), con hash en el
+    nombre tras collectstatic. Si no se ha generado con build_assets, enlaza cada fichero por separado.
+    """
+    return assets.bundle_tags(name, kind)
@@ -1,3 +1,1219 @@
-from django.test import TestCase
+import asyncio
+import base64
+import importlib
+import io
+import json
+import re
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction
+from django.apps import apps as django_apps
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.serializers import serialize
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import AsyncRequestFactory, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.template.loader import render_to_string
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+
+from CodeAtlas.middleware import RequestTimingMiddleware
+from accounts.models import AuthorStats, UserProfile
+from snippets import (assets, async_views, autocomplete, caching, clustering, geojson, highlighting, live, nearby,
+                      pagination, search, tiles, transfer, visits)
+from snippets.models import (DESCRIPTION_EXCERPT_CHARS, PREVIEW_LINES, PREVIEW_MAX_CHARS, Snippet, SnippetTombstone,
+                             build_preview)
+from snippets.templatetags import snippets_extras
+from snippets.views import _geojson_queryset, static_asset
+
+
+def create_snippet(profile, **kwargs):
+    data = {
+        'title': 'Snippet',
+        'source_code': 'print("hola")',
+        'language': 'python',
+        'author': profile,
+    }
+    data.update(kwargs)
+    return Snippet.objects.create(**data)
+
 
 # Create your tests here.
+
+class VisitCounterTests(TestCase):
+
+    def setUp(self):
+        visits.flush()
+        user = User.objects.create_user('autor', password='secreta123')
+        self.profile = UserProfile.objects.create(user=user)
+
+    def test_flush_is_a_single_update_per_table(self):
+        first = create_snippet(self.profile)
+        second = create_snippet(self.profile)
+        with override_settings(SNIPPETS_VISITS_FLUSH_THRESHOLD=1000, SNIPPETS_VISITS_FLUSH_INTERVAL=3600):
+            for _ in range(3):
+                visits.record_visit(first.pk)
+            visits.record_visit(second.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(visits.flush(), 4)
+        # Un UPDATE para los contadores de los snippets y otro para los totales de autor (AuthorStats).
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.cont_visited, 3)
+        self.assertEqual(second.cont_visited, 1)
+
+    def test_missing_snippet_is_not_counted(self):
+        with override_settings(SNIPPETS_VISITS_FLUSH_THRESHOLD=1000, SNIPPETS_VISITS_FLUSH_INTERVAL=3600):
+            response = self.client.get(reverse('snippets:snippet_detail', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(visits.flush(), 0)
+
+    def test_location_update_does_not_overwrite_flushed_visits(self):
+        snippet = create_snippet(self.profile)
+        self.client.force_login(self.profile.user)
+        def load_then_flush(*args, **kwargs):
+            # El volcado llega entre la lectura del snippet en la vista y su save().
+            loaded = get_object_or_404(*args, **kwargs)
+            visits.record_visit(snippet.pk)
+            visits.flush()
+            return loaded
+
+        with mock.patch('snippets.views.get_object_or_404', side_effect=load_then_flush):
+            response = self.client.post(reverse('snippets:snippet_update_location', args=[snippet.pk]),
+                                        json.dumps({'lat': 1, 'lng': 2}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        snippet.refresh_from_db()
+        self.assertEqual(snippet.point.coords, (2, 1))
+        self.assertEqual(snippet.cont_visited, 1)
+
+    def test_full_save_writes_the_counter(self):
+        # El admin guarda el formulario completo: una correccion del contador se conserva.
+        snippet = create_snippet(self.profile)
+        snippet.cont_visited = 42
+        snippet.save()
+        self.assertEqual(Snippet.objects.get(pk=snippet.pk).cont_visited, 42)
+
+        # Y un save() completo de una fila borrada la vuelve a insertar, como en cualquier modelo.
+        Snippet.objects.filter(pk=snippet.pk).delete()
+        snippet.save()
+        self.assertTrue(Snippet.objects.filter(pk=snippet.pk).exists())
+
+    def run_flusher_loop(self, *sleep_actions):
+        """
+        Ejecuta el bucle del hilo de volcado: en cada espera hace la siguiente accion; sin mas, termina.
+        """
+        actions = iter(sleep_actions)
+
+        def sleep(seconds):
+            action = next(actions, None)
+            if action is None:
+                raise KeyboardInterrupt()
+            action()
+
+        with mock.patch('snippets.visits.time.sleep', side_effect=sleep), \
+                mock.patch('snippets.visits.close_old_connections'), self.assertRaises(KeyboardInterrupt):
+            visits._flusher_loop()
+
+    @override_settings(SNIPPETS_VISITS_FLUSH_THRESHOLD=1000, SNIPPETS_VISITS_FLUSH_INTERVAL=3600)
+    def test_flusher_thread_flushes_when_the_command_asks(self):
+        snippet = create_snippet(self.profile)
+        cache.delete(visits.FLUSH_REQUEST_KEY)
+        visits.record_visit(snippet.pk)
+
+        # Sin peticion ni intervalo cumplido no vuelca.
+        self.run_flusher_loop(lambda: None)
+        self.assertEqual(Snippet.objects.get(pk=snippet.pk).cont_visited, 0)
+
+        # flush_visits, desde otro proceso, solo puede dejar la peticion en la cache compartida.
+        self.run_flusher_loop(visits.request_flush)
+        self.assertEqual(Snippet.objects.get(pk=snippet.pk).cont_visited, 1)
+
+    @override_settings(SNIPPETS_VISITS_FLUSH_THRESHOLD=1000, SNIPPETS_VISITS_FLUSH_INTERVAL=3600)
+    def test_flusher_thread_flushes_idle_process(self):
+        snippet = create_snippet(self.profile)
+        visits.record_visit(snippet.pk)
+        with override_settings(SNIPPETS_VISITS_FLUSH_INTERVAL=0):
+            self.run_flusher_loop(lambda: None)
+        self.assertEqual(Snippet.objects.get(pk=snippet.pk).cont_visited, 1)
+
+    def test_flush_command_requests_flush(self):
+        cache.delete(visits.FLUSH_REQUEST_KEY)
+        out = io.StringIO()
+        call_command('flush_visits', stdout=out)
+        self.assertIsNotNone(cache.get(visits.FLUSH_REQUEST_KEY))
+        self.assertIn('Visitas volcadas desde este proceso: 0', out.getvalue())
+
+
+@override_settings(SNIPPETS_VISITS_FLUSH_THRESHOLD=7, SNIPPETS_VISITS_FLUSH_INTERVAL=3600)
+class ConcurrentVisitCounterTests(TransactionTestCase):
+    THREADS = 8
+    REQUESTS_PER_THREAD = 25
+
+    def setUp(self):
+        visits.flush()
+        user = User.objects.create_user('autor', password='secreta123')
+        self.snippet = create_snippet(UserProfile.objects.create(user=user))
+
+    def test_no_visits_lost_under_concurrent_requests(self):
+        url = reverse('snippets:snippet_detail', args=[self.snippet.pk])
+        errors = []
+
+        def browse():
+            client = Client()
+            try:
+                for _ in range(self.REQUESTS_PER_THREAD):
+                    if client.get(url).status_code != 200:
+                        errors.append('status')
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=browse) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        visits.flush()
+
+        self.assertEqual(errors, [])
+        self.snippet.refresh_from_db()
+        self.assertEqual(self.snippet.cont_visited, self.THREADS * self.REQUESTS_PER_THREAD)
+
+
+class ImportExportTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user('autor', password='secreta123')
+        self.profile = UserProfile.objects.create(user=user)
+        create_snippet(self.profile, title='Con punto', point=Point(-3.7, 40.4, srid=4326))
+        create_snippet(self.profile, title='Sin punto', language='sql')
+
+    def roundtrip(self, writer, reader):
+        exported = ''.join(writer(Snippet.objects.all()))
+        Snippet.objects.all().delete()
+        imported = transfer.import_snippets(reader(io.StringIO(exported)), batch_size=1)
+
+        self.assertEqual(imported, 2)
+        snippets = {s.title: s for s in Snippet.objects.all()}
+        self.assertEqual(snippets['Con punto'].point.coords, (-3.7, 40.4))
+        self.assertIsNone(snippets['Sin punto'].point)
+        self.assertEqual(snippets['Sin punto'].author, self.profile)
+        self.assertEqual(AuthorStats.objects.get(profile=self.profile).snippet_count, 2)
+
+    def test_jsonl_roundtrip(self):
+        self.roundtrip(transfer.iter_jsonl, transfer.read_jsonl)
+
+    def test_geojson_roundtrip(self):
+        self.roundtrip(transfer.iter_geojson, lambda fp: transfer.read_geojson(fp, chunk_size=16))
+
+    def test_naive_pub_date_is_made_aware(self):
+        records = [(1, {'title': 'Sin zona', 'source_code': '', 'language': 'python',
+                        'pub_date': '2024-01-02T03:04:05'}),
+                   (2, {'title': 'Con zona', 'source_code': '', 'language': 'python',
+                        'pub_date': '2024-01-02T03:04:05+02:00'})]
+        self.assertEqual(transfer.import_snippets(records), 2)
+        naive = datetime(2024, 1, 2, 3, 4, 5)
+        self.assertEqual(Snippet.objects.get(title='Sin zona').pub_date, timezone.make_aware(naive))
+        self.assertEqual(Snippet.objects.get(title='Con zona').pub_date,
+                         datetime(2024, 1, 2, 1, 4, 5, tzinfo=dt_timezone.utc))
+
+    def test_unknown_author_is_rejected(self):
+        records = [(1, {'title': 'x', 'source_code': '', 'language': 'python', 'author': 'nadie'})]
+        with self.assertRaises(transfer.InvalidRecord):
+            transfer.import_snippets(records)
+        errors = []
+        self.assertEqual(transfer.import_snippets(records, skip_invalid=True, errors=errors), 0)
+        self.assertEqual(len(errors), 1)
+
+
+class GeoJSONEncoderTests(TestCase):
+    """
+    La FeatureCollection en streaming debe ser el mismo JSON que daba serialize('geojson') antes.
+    """
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('autor', password='secreta123')
+        self.profile = UserProfile.objects.create(user=user)
+
+    def assertMatchesSerializer(self, queryset):
+        streamed = ''.join(geojson.iter_feature_collection(queryset, 'point'))
+        expected = serialize('geojson', queryset, geometry_field='point', fields=list(geojson.GEOJSON_FIELDS))
+        self.assertEqual(json.loads(streamed), json.loads(expected))
+        return json.loads(streamed)
+
+    def test_empty_collection(self):
+        data = self.assertMatchesSerializer(Snippet.objects.none())
+        self.assertEqual(data, {'type': 'FeatureCollection', 'features': []})
+
+    def test_single_feature(self):
+        create_snippet(self.profile, description='Descripcion', cont_visited=3, point=Point(1.5, 2.25, srid=4326))
+        data = self.assertMatchesSerializer(Snippet.objects.order_by('pk'))
+        self.assertEqual(len(data['features']), 1)
+        self.assertEqual(set(data['features'][0]['properties']), set(geojson.GEOJSON_FIELDS))
+
+    def test_several_features_and_null_values(self):
+        create_snippet(self.profile, point=Point(-3.5, 40.25, srid=4326))
+        create_snippet(self.profile, title='Sin punto', language='sql')
+        create_snippet(self.profile, description='"comillas" y \\ barras', point=Point(0, 0, srid=4326))
+        self.assertMatchesSerializer(Snippet.objects.order_by('pk'))
+
+    def test_chunks_are_joined_with_separators(self):
+        for i in range(5):
+            create_snippet(self.profile, point=Point(i, i, srid=4326))
+        with mock.patch.object(geojson, 'FEATURES_PER_CHUNK', 2):
+            data = self.assertMatchesSerializer(Snippet.objects.order_by('pk'))
+        self.assertEqual(len(data['features']), 5)
+
+    def test_view_output_matches_serializer(self):
+        create_snippet(self.profile, point=Point(1, 1, srid=4326))
+        response = self.client.get(reverse('snippets:snippets_geojson'))
+        expected = serialize('geojson', Snippet.objects.filter(point__isnull=False), geometry_field='point',
+                             fields=list(geojson.GEOJSON_FIELDS))
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), json.loads(expected))
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('autor', password='secreta123')
+        profile = UserProfile.objects.create(user=user)
+        for i in range(7):
+            create_snippet(profile, title=f'Snippet {i}')
+        # Todos con el mismo pub_date: el orden lo decide el id.
+        Snippet.objects.update(pub_date=timezone.now() - timedelta(days=1))
+
+    def test_ties_on_pub_date_are_paged_by_id(self):
+        seen = []
+        cursor = None
+        while True:
+            page = pagination.keyset_page(Snippet.objects.all(), cursor, per_page=3)
+            seen += [snippet.pk for snippet in page]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, list(Snippet.objects.order_by('-id').values_list('pk', flat=True)))
+
+    def test_cursor_roundtrip(self):
+        snippet = Snippet.objects.first()
+        self.assertEqual(pagination.decode_cursor(pagination.encode_cursor(snippet)),
+                         (snippet.pub_date, snippet.pk))
+
+    def test_invalid_cursor_returns_400(self):
+        snippet = Snippet.objects.first()
+        out_of_range = base64.urlsafe_b64encode(f'{snippet.pub_date.isoformat()}|{2 ** 80}'.encode()).decode()
+        for cursor in ('no-es-un-cursor', '!!!', base64.urlsafe_b64encode(b'2024-01-01|x').decode(), out_of_range):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(reverse('snippets:index'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+
+    @mock.patch('snippets.views.SNIPPETS_PER_PAGE', 4)
+    def test_json_page_returns_next_cursor(self):
+        data = self.client.get(reverse('snippets:index'), {'format': 'json'}).json()
+        self.assertIsNotNone(data['next_cursor'])
+        response = self.client.get(reverse('snippets:index'), {'format': 'json', 'cursor': data['next_cursor']})
+        self.assertIsNone(response.json()['next_cursor'])
+
+
+class TileTests(TestCase):
+
+    def setUp(self):
+        tiles.get_tile_cache().clear()
+        user = User.objects.create_user('autor', password='secreta123')
+        self.profile = UserProfile.objects.create(user=user)
+
+    def test_tiles_for_point(self):
+        # En el centro de la tesela (1, 1, 0): en z=1 solo aparece en ella.
+        found = tiles.tiles_for_point(Point(90, 10, srid=4326))
+        self.assertIn((0, 0, 0), found)
+        self.assertEqual([tile for tile in found if tile[0] == 1], [(1, 1, 0)])
+        self.assertEqual({tile[0] for tile in found}, set(range(tiles.TILE_MAX_ZOOM + 1)))
+
+    def test_point_in_buffer_includes_neighbour_tile(self):
+        # A medio buffer del borde x=1 de z=1 (longitud 0): tambien aparece en la tesela de la izquierda.
+        lon = (1 + tiles.TILE_BUFFER / tiles.TILE_EXTENT / 2) * 180 - 180
+        found = tiles.tiles_for_point(Point(lon, 10, srid=4326))
+        self.assertEqual(sorted(tile for tile in found if tile[0] == 1), [(1, 0, 0), (1, 1, 0)])
+
+    def test_invalidate_points_deletes_neighbour_tiles(self):
+        cache = tiles.get_tile_cache()
+        for tile in [(1, 0, 0), (1, 1, 0), (1, 0, 1)]:
+            cache.set(tiles.tile_cache_key(*tile), b'tesela')
+        lon = (1 + tiles.TILE_BUFFER / tiles.TILE_EXTENT / 2) * 180 - 180
+        tiles.invalidate_points([None, Point(lon, 10, srid=4326)])
+        self.assertIsNone(cache.get(tiles.tile_cache_key(1, 0, 0)))
+        self.assertIsNone(cache.get(tiles.tile_cache_key(1, 1, 0)))
+        self.assertEqual(cache.get(tiles.tile_cache_key(1, 0, 1)), b'tesela')
+
+    def test_saving_snippet_invalidates_its_tiles(self):
+        key = tiles.tile_cache_key(0, 0, 0)
+        tiles.get_tile_cache().set(key, b'tesela')
+        with self.captureOnCommitCallbacks(execute=True):
+            create_snippet(self.profile, point=Point(1, 1, srid=4326))
+        self.assertIsNone(tiles.get_tile_cache().get(key))
+
+    @override_settings(SNIPPETS_VISITS_FLUSH_THRESHOLD=1000, SNIPPETS_VISITS_FLUSH_INTERVAL=3600)
+    def test_visit_flush_invalidates_its_tiles(self):
+        visits.flush()
+        visited = create_snippet(self.profile, point=Point(90, 10, srid=4326))
+        cache = tiles.get_tile_cache()
+        for tile in [(1, 1, 0), (1, 0, 0)]:
+            cache.set(tiles.tile_cache_key(*tile), b'tesela')
+        visits.record_visit(visited.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            visits.flush()
+        self.assertIsNone(cache.get(tiles.tile_cache_key(1, 1, 0)))
+        self.assertEqual(cache.get(tiles.tile_cache_key(1, 0, 0)), b'tesela')
+
+    def test_tile_endpoint(self):
+        create_snippet(self.profile, point=Point(1, 1, srid=4326))
+        response = self.client.get(reverse('snippets:snippet_tile', args=[0, 0, 0]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        self.assertTrue(response.content)
+        self.assertEqual(tiles.get_tile_cache().get(tiles.tile_cache_key(0, 0, 0)), response.content)
+
+    def test_invalid_tile_returns_404(self):
+        for z, x, y in [(1, 2, 0), (1, 0, 2), (tiles.TILE_MAX_ZOOM + 1, 0, 0)]:
+            with self.subTest(tile=(z, x, y)):
+                response = self.client.get(reverse('snippets:snippet_tile', args=[z, x, y]))
+                self.assertEqual(response.status_code, 404)
+
+
+class ClusterTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('autor', password='secreta123')
+        profile = UserProfile.objects.create(user=user)
+        # Dos en la misma celda a zoom 0 (90 grados de lado) y uno lejos.
+        create_snippet(profile, language='python', point=Point(1, 1, srid=4326))
+        create_snippet(profile, language='sql', point=Point(3, 1, srid=4326))
+        create_snippet(profile, language='python', point=Point(-100, -40, srid=4326))
+        create_snippet(profile, title='Sin punto')
+
+    def test_clusters_by_cell(self):
+        clusters = clustering.cluster_snippets(0)
+        self.assertEqual([cluster['count'] for cluster in clusters], [2, 1])
+        self.assertEqual(clusters[0]['languages'], {'python': 1, 'sql': 1})
+        self.assertAlmostEqual(clusters[0]['lng'], 2)
+        self.assertAlmostEqual(clusters[0]['lat'], 1)
+
+    def test_bbox_filters_and_is_clamped_to_world(self):
+        clusters = clustering.cluster_snippets(2, (-500, -100, 0, 0))
+        self.assertEqual([(cluster['count'], cluster['languages']) for cluster in clusters], [(1, {'python': 1})])
+
+    def test_endpoint(self):
+        response = self.client.get(reverse('snippets:snippets_clusters'), {'zoom': 0, 'bbox': '0,0,10,10'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['zoom'], 0)
+        self.assertEqual([cluster['count'] for cluster in response.json()['clusters']], [2])
+
+    def test_invalid_parameters_return_400(self):
+        url = reverse('snippets:snippets_clusters')
+        invalid = [
+            {},
+            {'zoom': 'x'},
+            {'zoom': clustering.CLUSTER_MAX_ZOOM + 1},
+            {'zoom': 0, 'bbox': '1,2,3'},
+            {'zoom': 0, 'bbox': 'nan,0,10,10'},
+            {'zoom': 0, 'bbox': '0,0,inf,10'},
+            {'zoom': 0, 'bbox': '-Infinity,0,10,10'},
+        ]
+        for params in invalid:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+    def test_geojson_rejects_non_finite_bbox(self):
+        response = self.client.get(reverse('snippets:snippets_geojson'), {'bbox': '0,nan,10,10'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SnippetPreviewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('autor', password='secreta123')
+        self.profile = UserProfile.objects.create(user=user)
+        self.code = '\n'.join(f'linea {i}' for i in range(20))
+
+    def test_build_preview(self):
+        self.assertEqual(build_preview(self.code), '\n'.join(f'linea {i}' for i in range(PREVIEW_LINES)))
+        self.assertEqual(len(build_preview('x' * 5000)), PREVIEW_MAX_CHARS)
+        self.assertEqual(build_preview(None), '')
+
+    def test_preview_is_recomputed_on_save(self):
+        snippet = create_snippet(self.profile, source_code=self.code)
+        self.assertEqual(Snippet.objects.get(pk=snippet.pk).preview, build_preview(self.code))
+
+        snippet.source_code = 'nuevo'
+        snippet.save()
+        self.assertEqual(Snippet.objects.get(pk=snippet.pk).preview, 'nuevo')
+
+        snippet.source_code = 'solo update_fields'
+        snippet.save(update_fields=['source_code'])
+        self.assertEqual(Snippet.objects.get(pk=snippet.pk).preview, 'solo update_fields')
+
+    def test_save_without_source_code_keeps_preview(self):
+        snippet = create_snippet(self.profile, source_code=self.code)
+        listed = Snippet.objects.for_list().get(pk=snippet.pk)
+        listed.title = 'Otro titulo'
+        listed.save()
+        self.assertEqual(Snippet.objects.get(pk=snippet.pk).preview, build_preview(self.code))
+
+    def test_for_list_defers_full_text(self):
+        create_snippet(self.profile, source_code=self.code, description='d' * 1000)
+        snippet = Snippet.objects.for_list().get()
+        self.assertEqual(snippet.get_deferred_fields(), {'source_code', 'description'})
+        self.assertEqual(len(snippet.description_excerpt), DESCRIPTION_EXCERPT_CHARS)
+        with self.assertNumQueries(0):
+            self.assertEqual(snippet.preview, build_preview(self.code))
+
+    def assertListingSkipsFullText(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for query in queries.captured_queries:
+            # La descripcion solo puede aparecer dentro del LEFT() de description_excerpt.
+            sql = re.sub(r'LEFT\([^)]*\)', '', query['sql'])
+            self.assertNotIn('"source_code"', sql)
+            self.assertNotIn('"snippets_snippet"."description"', sql)
+        return len(queries)
+
+    def test_list_pages_do_not_load_source_code(self):
+        urls = [reverse('snippets:index'), reverse('accounts:public_profile', args=['autor'])]
+        create_snippet(self.profile, source_code=self.code, description='descripcion')
+        counts = [self.assertListingSkipsFullText(url) for url in urls]
+
+        # Mas tarjetas, mismas consultas: ninguna tarjeta carga los campos diferidos.
+        for _ in range(4):
+            create_snippet(self.profile, source_code=self.code, description='descripcion')
+        cache.clear()
+        self.assertEqual([self.assertListingSkipsFullText(url) for url in urls], counts)
+
+    def test_migration_backfills_previews(self):
+        migration = importlib.import_module('snippets.migrations.0008_snippet_preview')
+        snippet = create_snippet(self.profile, source_code=self.code)
+        Snippet.objects.update(preview='')
+        migration.backfill_previews(django_apps, None)
+        self.assertEqual(Snippet.objects.get(pk=snippet.pk).preview, build_preview(self.code))
+
+
+@unittest.skipIf(highlighting.pygments is None, 'Pygments no esta instalado')
+class HighlightingTests(TestCase):
+
+    def setUp(self):
+        highlighting._cache.clear()
+        user = User.objects.create_user('autor', password='secreta123')
+        self.profile = UserProfile.objects.create(user=user)
+
+    def test_cache_key_depends_on_code_language_and_version(self):
+        key = highlighting.cache_key('print(1)', 'python')
+        self.assertEqual(key, highlighting.cache_key('print(1)', 'python'))
+        self.assertNotEqual(key, highlighting.cache_key('print(2)', 'python'))
+        self.assertNotEqual(key, highlighting.cache_key('print(1)', 'sql'))
+        with mock.patch.object(highlighting, 'highlighter_version', return_value='pygments-otra'):
+            self.assertNotEqual(key, highlighting.cache_key('print(1)', 'python'))
+        # Sin separador, ("ab", "c") y ("a", "bc") darian la misma clave.
+        self.assertNotEqual(highlighting.cache_key('c', 'ab'), highlighting.cache_key('bc', 'a'))
+
+    def test_rendered_html_is_cached(self):
+        with mock.patch.object(highlighting, 'render', wraps=highlighting.render) as render:
+            first = highlighting.highlight_code('print(1)', 'python', owner=1)
+            second = highlighting.highlight_code('print(1)', 'python', owner=1)
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertIn('class="highlight"', first)
+
+    def test_edit_invalidates_cached_versions(self):
+        snippet = create_snippet(self.profile, source_code='print(1)')
+        highlighting.highlight_code(snippet.source_code, snippet.language, owner=snippet.pk)
+        self.assertIn(snippet.pk, highlighting._cache._keys_by_owner)
+
+        snippet.source_code = 'print(2)'
+        snippet.save()
+        self.assertNotIn(snippet.pk, highlighting._cache._keys_by_owner)
+        self.assertEqual(len(highlighting._cache), 0)
+
+        with mock.patch.object(highlighting, 'render', wraps=highlighting.render) as render:
+            html = highlighting.highlight_code(snippet.source_code, snippet.language, owner=snippet.pk)
+        render.assert_called_once_with('print(2)', 'python')
+        self.assertIn('<span class="mi">2</span>', html)
+
+    def test_delete_invalidates_cached_versions(self):
+        snippet = create_snippet(self.profile)
+        highlighting.highlight_code(snippet.source_code, snippet.language, owner=snippet.pk)
+        pk = snippet.pk
+        snippet.delete()
+        self.assertNotIn(pk, highlighting._cache._keys_by_owner)
+
+    def test_lru_eviction_forgets_owner_keys(self):
+        lru = highlighting.LRUCache(2)
+        lru.set('a', 'A', owner=1)
+        lru.set('b', 'B', owner=2)
+        lru.get('a')
+        lru.set('c', 'C', owner=3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 'A')
+        self.assertNotIn(2, lru._keys_by_owner)
+        lru.discard_owner(1)
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(len(lru), 1)
+
+    def test_shared_key_keeps_only_its_last_owner(self):
+        lru = highlighting.LRUCache(2)
+        for owner in range(1, 4):
+            lru.set('a', 'A', owner=owner)
+        self.assertEqual(lru._keys_by_owner, {3: {'a'}})
+        lru.set('b', 'B', owner=4)
+        lru.set('c', 'C', owner=5)
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(lru._keys_by_owner, {4: {'b'}, 5: {'c'}})
+
+    @override_settings(SNIPPETS_SERVER_HIGHLIGHTING=False)
+    def test_disabled_highlighting_leaves_code_to_prism(self):
+        snippet = create_snippet(self.profile, source_code='<b>1</b>')
+        html = snippets_extras.highlighted_code(snippet)
+        self.assertIn('class="language-python"', html)
+        self.assertIn('&lt;b&gt;1&lt;/b&gt;', html)
+        self.assertEqual(len(highlighting._cache), 0)
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('autor', password='secreta123')
+        profile = UserProfile.objects.create(user=user)
+        self.in_title = create_snippet(profile, title='Parse dates', source_code='x = 1')
+        self.in_description = create_snippet(profile, title='Utilidades', description='Helpers to parse dates',
+                                              source_code='y = 2')
+        self.in_code = create_snippet(profile, title='Otro', source_code='def parse(value):\n    return value')
+        self.snake = create_snippet(profile, title='ORM', language='python',
+                                    source_code='obj, created = get_or_create(pk=1)')
+        self.camel = create_snippet(profile, title='Kotlin', language='kotlin',
+                                    source_code='val name = getUserName()')
+        self.sql = create_snippet(profile, title='Parse en SQL', language='sql', source_code='SELECT parse(x)')
+
+    def ids(self, text, language=None):
+        return [snippet.pk for snippet in search.search_snippets(text, language)]
+
+    def test_title_ranks_above_description_and_code(self):
+        ids = self.ids('parse')
+        self.assertLess(ids.index(self.in_title.pk), ids.index(self.in_description.pk))
+        self.assertLess(ids.index(self.in_description.pk), ids.index(self.in_code.pk))
+        ranks = [snippet.rank for snippet in search.search_snippets('parse')]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+
+    def test_language_filter(self):
+        self.assertEqual(self.ids('parse', 'sql'), [self.sql.pk])
+        self.assertNotIn(self.sql.pk, self.ids('parse', 'python'))
+
+    def test_snake_case_identifiers(self):
+        self.assertEqual(self.ids('get_or_create'), [self.snake.pk])
+        self.assertIn(self.snake.pk, self.ids('create'))
+
+    def test_camel_case_identifiers(self):
+        self.assertEqual(self.ids('getUserName'), [self.camel.pk])
+        self.assertEqual(self.ids('user name'), [self.camel.pk])
+
+    def test_code_config_keeps_stopwords_and_stems(self):
+        # english quitaria "or" y reduciria "created" a "creat"; codeatlas_code los deja tal cual.
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_tsvector('codeatlas_code', 'get_or_create created')::text")
+            self.assertEqual(cursor.fetchone()[0], "'create':3 'created':4 'get':1 'or':2")
+
+    def test_search_vector_follows_edits(self):
+        self.camel.source_code = 'val total = computeTotal()'
+        self.camel.save()
+        self.assertEqual(self.ids('getUserName'), [])
+        self.assertEqual(self.ids('compute total'), [self.camel.pk])
+
+    def test_search_view(self):
+        response = self.client.get(reverse('snippets:search'), {'q': 'parse', 'lang': 'sql', 'format': 'json'})
+        self.assertEqual([result['id'] for result in response.json()['results']], [self.sql.pk])
+        response = self.client.get(reverse('snippets:search'), {'q': 'parse', 'lang': 'cobol'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AutocompleteTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('autor', password='secreta123')
+        self.profile = UserProfile.objects.create(user=user)
+
+    def test_short_text_returns_nothing(self):
+        create_snippet(self.profile, title='Parser')
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete.autocomplete(' pa '), {'titles': [], 'identifiers': []})
+
+    def test_titles_by_similarity(self):
+        create_snippet(self.profile, title='Un parser de fechas muy largo')
+        create_snippet(self.profile, title='Parser')
+        titles = [item['title'] for item in autocomplete.autocomplete('parser')['titles']]
+        self.assertEqual(titles, ['Parser', 'Un parser de fechas muy largo'])
+
+    def test_identifiers_prefix_first_then_shorter(self):
+        snippet = create_snippet(self.profile, source_code='reload_config = load_config_file()\nload_config()')
+        identifiers = autocomplete.autocomplete('load_config')['identifiers']
+        self.assertEqual([item['identifier'] for item in identifiers],
+                         ['load_config', 'load_config_file', 'reload_config'])
+        self.assertTrue(all(item['snippet_id'] == snippet.pk for item in identifiers))
+
+    def test_identifier_candidates_are_ordered_before_slicing(self):
+        # Con limit=1 solo se leen 4 filas: la del identificador exacto tiene que estar entre ellas aunque haya
+        # mas snippets que lo contienen.
+        for i in range(8):
+            create_snippet(self.profile, source_code=f'reloaders_batch_{i} = {i}')
+        exact = create_snippet(self.profile, source_code='loaders = []')
+        for _ in range(2):
+            cache.clear()
+            identifiers = autocomplete.autocomplete('loaders', limit=1)['identifiers']
+            self.assertEqual(identifiers, [{'identifier': 'loaders', 'snippet_id': exact.pk}])
+
+    def test_results_are_cached(self):
+        create_snippet(self.profile, title='Parser')
+        first = autocomplete.autocomplete('parser')
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete.autocomplete('PARSER '), first)
+
+    def test_endpoint_adds_urls(self):
+        snippet = create_snippet(self.profile, title='Parser', source_code='parser_state = 1')
+        data = self.client.get(reverse('snippets:snippets_autocomplete'), {'q': 'parser'}).json()
+        url = reverse('snippets:snippet_detail', args=[snippet.pk])
+        self.assertEqual([item['url'] for item in data['titles']], [url])
+        self.assertEqual([item['url'] for item in data['identifiers']], [url])
+
+
+class SpatialIndexTests(TestCase):
+    """
+    Comprueba con EXPLAIN que las consultas espaciales usan los indices GiST parciales. Con tan pocas filas
+    el planificador preferiria un seq scan, asi que se desactiva para la transaccion del test.
+    """
+
+    def setUp(self):
+        user = User.objects.create_user('autor', password='secreta123')
+        profile = UserProfile.objects.create(user=user)
+        for i in range(20):
+            create_snippet(profile, language='python' if i % 2 else 'sql',
+                           point=Point(-3.7 + i * 0.01, 40.4 + i * 0.01, srid=4326))
+        create_snippet(profile, title='Sin punto')
+        self.origin = Point(-3.7, 40.4, srid=4326)
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+
+    def test_bbox_uses_point_index(self):
+        self.assertUsesIndex(_geojson_queryset((-4, 40, -3, 41)), 'snippet_point_gist_idx')
+
+    def test_nearest_uses_knn_index(self):
+        self.assertUsesIndex(nearby.nearest_snippets(self.origin, 5), 'snippet_point_gist_idx')
+        self.assertUsesIndex(nearby.nearest_snippets(self.origin, 5, 'python'), 'snippet_lang_point_gist_idx')
+
+    def test_radius_uses_geography_index(self):
+        self.assertUsesIndex(nearby.snippets_within(self.origin, 5000), 'snippet_point_geog_idx')
+
+    def test_near_endpoint(self):
+        response = self.client.get(reverse('snippets:snippets_near'), {'lon': -3.7, 'lat': 40.4, 'limit': 3})
+        features = response.json()['features']
+        self.assertEqual(len(features), 3)
+        distances = [feature['properties']['distance'] for feature in features]
+        self.assertEqual(distances, sorted(distances))
+        self.assertEqual(distances[0], 0)
+
+        response = self.client.get(reverse('snippets:snippets_near'),
+                                   {'lon': -3.7, 'lat': 40.4, 'radius': 2000, 'lang': 'sql'})
+        self.assertTrue(all(f['properties']['distance'] <= 2000 for f in response.json()['features']))
+        self.assertTrue(all(f['properties']['language'] == 'sql' for f in response.json()['features']))
+
+
+class MapSyncTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('autor', password='secreta123')
+        profile = UserProfile.objects.create(user=user)
+        self.unchanged = create_snippet(profile, point=Point(1, 1, srid=4326))
+        self.edited = create_snippet(profile, point=Point(2, 2, srid=4326))
+        self.deleted = create_snippet(profile, point=Point(3, 3, srid=4326))
+        Snippet.objects.update(pub_update=timezone.now() - timedelta(hours=1))
+
+    def test_delta_only_contains_changes(self):
+        url = reverse('snippets:snippets_geojson')
+        response = self.client.get(url)
+        b''.join(response.streaming_content)
+        since = response['X-Map-Timestamp']
+
+        snippet = Snippet.objects.get(pk=self.edited.pk)
+        snippet.title = 'Editado'
+        snippet.save()
+        Snippet.objects.get(pk=self.deleted.pk).delete()
+
+        data = json.loads(b''.join(self.client.get(url, {'since': since}).streaming_content))
+        self.assertEqual([feature['id'] for feature in data['features']], [self.edited.pk])
+        self.assertEqual(data['features'][0]['properties']['title'], 'Editado')
+        self.assertEqual(data['removed'], [self.deleted.pk])
+        self.assertIn('timestamp', data)
+
+    def test_expired_since_requests_reset(self):
+        since = (timezone.now() - timedelta(days=30)).timestamp()
+        response = self.client.get(reverse('snippets:snippets_geojson'), {'since': since})
+        self.assertEqual(response.json(), {'reset': True, 'timestamp': response.json()['timestamp']})
+
+
+class LiveMapTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user('autor', password='secreta123')
+        self.profile = UserProfile.objects.create(user=user)
+
+    def test_signals_publish_created_moved_and_deleted(self):
+        with mock.patch('snippets.live.publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                snippet = create_snippet(self.profile, point=Point(1, 2, srid=4326))
+            snippet = Snippet.objects.get(pk=snippet.pk)
+            with self.captureOnCommitCallbacks(execute=True):
+                snippet.title = 'Sin mover'
+                snippet.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                snippet.point = Point(3, 4, srid=4326)
+                snippet.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                snippet.delete()
+
+        events = [call.args[0] for call in publish.call_args_list]
+        self.assertEqual([event['type'] for event in events], ['created', 'moved', 'deleted'])
+        self.assertEqual(events[1]['previous'], [1, 2])
+        self.assertEqual(events[1]['feature']['geometry']['coordinates'], [3, 4])
+        self.assertEqual(events[2]['previous'], [3, 4])
+
+    def test_socket_only_sends_events_in_viewport(self):
+        inside = {'type': 'moved', 'id': 1, 'previous': None,
+                  'feature': {'type': 'Feature', 'id': 1, 'properties': {},
+                              'geometry': {'type': 'Point', 'coordinates': [5, 5]}}}
+        outside = {'type': 'deleted', 'id': 2, 'previous': [50, 50]}
+
+        async def scenario():
+            incoming, outgoing = asyncio.Queue(), asyncio.Queue()
+            await incoming.put({'type': 'websocket.connect'})
+            task = asyncio.ensure_future(
+                live.map_socket({'type': 'websocket', 'path': live.LIVE_PATH}, incoming.get, outgoing.put))
+            self.assertEqual((await outgoing.get())['type'], 'websocket.accept')
+
+            await incoming.put({'type': 'websocket.receive', 'text': json.dumps({'bbox': [0, 0, 10, 10]})})
+            await asyncio.sleep(0.05)
+            live.get_broker().publish(outside)
+            live.get_broker().publish(inside)
+            message = await asyncio.wait_for(outgoing.get(), 1)
+
+            await incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+            await asyncio.wait_for(task, 1)
+            return json.loads(message['text'])
+
+        with override_settings(SNIPPETS_LIVE_BACKEND='snippets.live.InProcessBroker'):
+            self.assertEqual(asyncio.run(scenario()), inside)
+
+    def test_socket_without_viewport_sends_every_event(self):
+        # El mapa sin USE_BBOX se suscribe con bbox null: tras desplazarse no se pierde nada de la zona nueva.
+        outside = {'type': 'deleted', 'id': 2, 'previous': [50, 50]}
+
+        async def scenario():
+            incoming, outgoing = asyncio.Queue(), asyncio.Queue()
+            await incoming.put({'type': 'websocket.connect'})
+            task = asyncio.ensure_future(
+                live.map_socket({'type': 'websocket', 'path': live.LIVE_PATH}, incoming.get, outgoing.put))
+            await outgoing.get()
+
+            await incoming.put({'type': 'websocket.receive', 'text': json.dumps({'bbox': [0, 0, 10, 10]})})
+            await incoming.put({'type': 'websocket.receive', 'text': json.dumps({'bbox': None})})
+            await asyncio.sleep(0.05)
+            live.get_broker().publish(outside)
+            message = await asyncio.wait_for(outgoing.get(), 1)
+
+            await incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+            await asyncio.wait_for(task, 1)
+            return json.loads(message['text'])
+
+        with override_settings(SNIPPETS_LIVE_BACKEND='snippets.live.InProcessBroker'):
+            self.assertEqual(asyncio.run(scenario()), outside)
+
+
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('autor', password='secreta123')
+        profile = UserProfile.objects.create(user=user)
+        self.snippet = create_snippet(profile, point=Point(1, 1, srid=4326))
+        create_snippet(profile, point=Point(50, 50, srid=4326))
+
+    def request(self, path, **params):
+        request = AsyncRequestFactory().get(path, params)
+        request.user = AnonymousUser()
+
+        async def auser():
+            return request.user
+
+        request.auser = auser
+        return request
+
+    async def test_geojson_matches_sync_view(self):
+        url = reverse('snippets:snippets_geojson')
+        response = await async_views.snippets_geojson(self.request(url, bbox='0,0,10,10'))
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        features = json.loads(body)['features']
+        self.assertEqual([feature['id'] for feature in features], [self.snippet.pk])
+        self.assertIn('ETag', response)
+
+        response = await async_views.snippets_geojson(self.request(url, bbox='0,0,10,10'))
+        self.assertEqual(json.loads(response.content)['features'], features)
+
+    async def test_detail_renders_and_counts_visit(self):
+        url = reverse('snippets:snippet_detail', args=[self.snippet.pk])
+        with override_settings(SNIPPETS_VISITS_FLUSH_THRESHOLD=1):
+            response = await async_views.snippet_detail(self.request(url), self.snippet.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.snippet.title)
+        self.assertEqual((await Snippet.objects.aget(pk=self.snippet.pk)).cont_visited, 1)
+
+
+class SnippetAdminTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        admin = User.objects.create_superuser('admin', password='secreta123')
+        self.client.force_login(admin)
+        self.old = UserProfile.objects.create(user=User.objects.create_user('viejo'))
+        self.new = UserProfile.objects.create(user=User.objects.create_user('nuevo'))
+        self.located = create_snippet(self.old, point=Point(1, 1, srid=4326))
+        self.other = create_snippet(self.old)
+        self.url = reverse('admin:snippets_snippet_changelist')
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(self.url, {'q': 'viejo'}).status_code, 200)
+        for _ in range(10):
+            create_snippet(self.old)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(self.url, {'q': 'viejo'})
+        self.assertEqual(len(many), len(few))
+
+    def test_reassign_author_action(self):
+        response = self.client.post(self.url, {
+            'action': 'reassign_author', 'select_across': '1', 'index': '0',
+            '_selected_action': [self.located.pk],
+        })
+        self.assertContains(response, 'name="username"')
+
+        self.client.post(self.url, {
+            'action': 'reassign_author', 'select_across': '1', 'apply': '1', 'username': 'nuevo',
+            '_selected_action': [self.located.pk],
+        })
+        self.assertEqual(Snippet.objects.filter(author=self.new).count(), 2)
+        self.assertEqual(AuthorStats.objects.get(profile=self.new).snippet_count, 2)
+        self.assertEqual(AuthorStats.objects.get(profile=self.old).snippet_count, 0)
+
+    def test_delete_action_is_set_based(self):
+        with CaptureQueriesContext(connection) as captured:
+            self.client.post(self.url, {
+                'action': 'delete_snippets', 'select_across': '0', 'apply': '1',
+                '_selected_action': [self.located.pk, self.other.pk],
+            })
+        self.assertFalse(Snippet.objects.exists())
+        self.assertEqual(list(SnippetTombstone.objects.values_list('snippet_id', flat=True)), [self.located.pk])
+        self.assertEqual(AuthorStats.objects.get(profile=self.old).snippet_count, 0)
+        deletes = [q['sql'] for q in captured.captured_queries if q['sql'].startswith('DELETE FROM snippets_snippet ')]
+        self.assertEqual(len(deletes), 1)
+
+
+class DBStatsTests(TestCase):
+
+    def test_staff_only(self):
+        User.objects.create_user('autor', password='secreta123')
+        self.client.login(username='autor', password='secreta123')
+        self.assertEqual(self.client.get(reverse('snippets:db_stats')).status_code, 403)
+
+    def test_reports_connection_mode(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='secreta123'))
+        stats = self.client.get(reverse('snippets:db_stats')).json()['default']
+        self.assertEqual(stats['pooled'], stats['pool'] is not None)
+        self.assertGreaterEqual(sum(stats['server_connections'].values()), 1)
+
+
+class StaticAssetTests(TestCase):
+
+    def test_bundle_falls_back_to_each_file(self):
+        with mock.patch('snippets.assets.is_available', return_value=False):
+            tags = assets.bundle_tags('map', 'js')
+        self.assertEqual(tags.count('<script'), len(assets.BUNDLES['map']['js']))
+        self.assertIn(assets.VENDOR_FILES['leaflet/leaflet.js'][0], tags)
+        url, integrity = assets.VENDOR_FILES['jquery/jquery.min.js']
+        self.assertIn(f'<script src="{url}" integrity="{integrity}" crossorigin="anonymous"></script>', tags)
+
+        with mock.patch('snippets.assets.is_available', return_value=True):
+            self.assertEqual(assets.bundle_tags('map', 'js').count('<script'), 1)
+
+    def test_vendored_jquery_matches_pinned_hash(self):
+        path = assets.STATIC_DIR / 'vendor' / 'jquery' / 'jquery.min.js'
+        assets.check_integrity('jquery/jquery.min.js', path.read_bytes())
+        with self.assertRaises(assets.VendorIntegrityError):
+            assets.check_integrity('jquery/jquery.min.js', path.read_bytes() + b'\n')
+
+    def test_vendor_assets_rejects_tampered_download(self):
+        response = mock.MagicMock()
+        response.__enter__.return_value.read.return_value = b'alert("otro fichero");'
+        with tempfile.TemporaryDirectory() as root, \
+                mock.patch('snippets.assets.STATIC_DIR', Path(root)), \
+                mock.patch('urllib.request.urlopen', return_value=response):
+            with self.assertRaises(CommandError):
+                call_command('vendor_assets', stdout=io.StringIO(), stderr=io.StringIO())
+            self.assertFalse((Path(root) / 'vendor' / 'jquery' / 'jquery.min.js').exists())
+
+    def test_serves_precompressed_hashed_file(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root):
+            path = Path(root) / 'bundles' / 'map.0123456789ab.js'
+            path.parent.mkdir()
+            path.write_text('console.log("mapa");\n' * 100)
+            assets.compress_file(path)
+
+            request = RequestFactory().get('/static/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+            response = static_asset(request, 'bundles/map.0123456789ab.js')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+            response.close()
+
+            response = static_asset(RequestFactory().get('/static/x'), 'bundles/map.0123456789ab.js')
+            self.assertFalse(response.has_header('Content-Encoding'))
+            response.close()
+
+
+class CardCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.profile = UserProfile.objects.create(user=User.objects.create_user('autor'))
+        self.snippet = create_snippet(self.profile, title='Original')
+
+    def render(self):
+        return render_to_string('snippets/snippet_cards.html',
+                                {'snippets_list': Snippet.objects.for_list().filter(pk=self.snippet.pk)})
+
+    def test_card_is_cached_until_pub_update_changes(self):
+        self.assertIn('Original', self.render())
+        # update() no toca pub_update: la tarjeta sale de la cache.
+        Snippet.objects.filter(pk=self.snippet.pk).update(title='Sin guardar')
+        self.assertIn('Original', self.render())
+
+        self.snippet.title = 'Editado'
+        self.snippet.save()
+        self.assertIn('Editado', self.render())
+
+
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.user = User.objects.create_user('autor')
+        self.profile = UserProfile.objects.create(user=self.user)
+
+    def cached_view(self, streaming=False):
+        def response_cache_test_view(request):
+            self.calls += 1
+            if streaming:
+                return StreamingHttpResponse(iter([b'uno', b'dos']))
+            return HttpResponse(f'respuesta {self.calls}')
+        return caching.cache_response(lambda request: ['tests:group'])(response_cache_test_view)
+
+    def get(self, view, user=None):
+        request = RequestFactory().get('/pagina/')
+        request.user = user or AnonymousUser()
+        return view(request)
+
+    def test_hit_miss_and_invalidation(self):
+        view = self.cached_view()
+        self.assertEqual(self.get(view).content, b'respuesta 1')
+        self.assertEqual(self.get(view).content, b'respuesta 1')
+        self.assertEqual(caching.stats()['response_cache_test_view'], {'hits': 1, 'misses': 1})
+
+        caching.invalidate('tests:group')
+        self.assertEqual(self.get(view).content, b'respuesta 2')
+
+    def test_anonymous_and_authenticated_keys_are_separate(self):
+        view = self.cached_view()
+        self.assertEqual(self.get(view).content, b'respuesta 1')
+        self.assertEqual(self.get(view, self.user).content, b'respuesta 2')
+        self.assertEqual(self.get(view, User.objects.create_user('otro')).content, b'respuesta 3')
+        self.assertEqual(self.get(view, self.user).content, b'respuesta 2')
+
+    def test_streaming_response_is_stored_while_sent(self):
+        view = self.cached_view(streaming=True)
+        self.assertEqual(b''.join(self.get(view).streaming_content), b'unodos')
+        response = self.get(view)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content, b'unodos')
+        self.assertEqual(self.calls, 1)
+
+    def test_save_and_delete_invalidate_exactly_their_groups(self):
+        snippet = create_snippet(self.profile)
+        expected = {'snippets:list', f'snippets:detail:{snippet.pk}', 'snippets:map', 'profiles:autor'}
+        with mock.patch('snippets.caching.invalidate') as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                snippet.title = 'Editado'
+                snippet.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                Snippet.objects.get(pk=snippet.pk).delete()
+        self.assertEqual([set(call.args) for call in invalidate.call_args_list], [expected, expected])
+
+    def test_detail_page_miss_after_edit_and_delete(self):
+        snippet = create_snippet(self.profile, title='Original')
+        url = reverse('snippets:snippet_detail', args=[snippet.pk])
+        self.assertContains(self.client.get(url), 'Original')
+        with self.captureOnCommitCallbacks(execute=True):
+            snippet.title = 'Editado'
+            snippet.save()
+        self.assertContains(self.client.get(url), 'Editado')
+        with self.captureOnCommitCallbacks(execute=True):
+            snippet.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@override_settings(SNIPPETS_VISITS_FLUSH_THRESHOLD=1000, SNIPPETS_VISITS_FLUSH_INTERVAL=3600)
+class ConditionalRequestTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        visits.flush()
+        self.profile = UserProfile.objects.create(user=User.objects.create_user('autor'))
+        self.snippet = create_snippet(self.profile, point=Point(1, 1, srid=4326))
+        self.detail_url = reverse('snippets:snippet_detail', args=[self.snippet.pk])
+        self.geojson_url = reverse('snippets:snippets_geojson')
+
+    def tearDown(self):
+        visits.flush()
+
+    def assertNotModified(self, url, **headers):
+        self.assertEqual(self.client.get(url, **headers).status_code, 304)
+
+    def test_detail_etag_and_last_modified(self):
+        response = self.client.get(self.detail_url)
+        etag = response['ETag']
+        self.assertNotModified(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertNotModified(self.detail_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+
+    def test_detail_etag_changes_after_edit_flush_and_delete(self):
+        etag = self.client.get(self.detail_url)['ETag']
+
+        visits.flush()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        etag = response['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.snippet.title = 'Editado'
+            self.snippet.save(update_fields=['title', 'pub_update'])
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Editado')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.snippet.delete()
+        self.assertEqual(self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+    def test_flush_invalidates_cached_detail_and_profile(self):
+        profile_url = reverse('accounts:public_profile', args=['autor'])
+        self.assertContains(self.client.get(self.detail_url), 'Visitas: 0')
+        self.assertContains(self.client.get(profile_url), '0 visitas')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            visits.flush()
+        response = self.client.get(self.detail_url)
+        # La visita de la primera peticion, ya volcada: no la pagina cacheada con el contador antiguo.
+        self.assertContains(response, 'Visitas: 1')
+        self.assertContains(self.client.get(profile_url), '1 visitas')
+
+    def test_geojson_conditional_requests(self):
+        response = self.client.get(self.geojson_url)
+        b''.join(response.streaming_content)
+        etag = response['ETag']
+        self.assertNotModified(self.geojson_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertNotModified(self.geojson_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_snippet(self.profile, point=Point(2, 2, srid=4326))
+        self.assertEqual(self.client.get(self.geojson_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_geojson_changes_after_visit_flush(self):
+        response = self.client.get(self.geojson_url)
+        b''.join(response.streaming_content)
+        etag = response['ETag']
+
+        visits.record_visit(self.snippet.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            visits.flush()
+        response = self.client.get(self.geojson_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(data['features'][0]['properties']['cont_visited'], 1)
+
+
+@override_settings(CODEATLAS_REQUEST_TIMING=True, CODEATLAS_REQUEST_TIMING_SAMPLE_RATE=1.0,
+                   CODEATLAS_REQUEST_TIMING_DUPLICATES=3)
+class RequestTimingTests(TestCase):
+
+    def view(self, request):
+        for pk in range(3):
+            Snippet.objects.filter(pk=pk).exists()
+        return HttpResponse('ok')
+
+    def test_server_timing_and_duplicate_queries(self):
+        middleware = RequestTimingMiddleware(self.view)
+        with self.assertLogs('codeatlas.requests', 'WARNING') as logs:
+            response = middleware(RequestFactory().get('/'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('3 queries', response['Server-Timing'])
+        record = logs.records[0].request_timing
+        self.assertEqual(record['db_queries'], 3)
+        self.assertEqual(record['duplicate_queries'][0]['count'], 3)
+
+    def test_sampling(self):
+        with override_settings(CODEATLAS_REQUEST_TIMING_SAMPLE_RATE=0.25):
+            middleware = RequestTimingMiddleware(lambda request: HttpResponse('ok'))
+        with mock.patch('CodeAtlas.middleware.random.random', return_value=0.5):
+            self.assertFalse(middleware(RequestFactory().get('/')).has_header('Server-Timing'))
+        with mock.patch('CodeAtlas.middleware.random.random', return_value=0.1), self.assertLogs('codeatlas.requests'):
+            self.assertTrue(middleware(RequestFactory().get('/')).has_header('Server-Timing'))
+
+    async def test_async_chain_stays_async(self):
+        async def view(request):
+            await Snippet.objects.filter(pk=1).aexists()
+            return HttpResponse('ok')
+
+        middleware = RequestTimingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        with self.assertLogs('codeatlas.requests'):
+            response = await middleware(AsyncRequestFactory().get('/'))
+        self.assertIn('1 queries', response['Server-Timing'])
@@ -0,0 +1,117 @@
+import math
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+
+from snippets.models import Snippet
+
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+TILE_MAX_ZOOM = 22
+
+# Limite de features por tesela: el tamaño de cada tesela queda acotado aunque crezca el dataset.
+# Si hay mas, se quedan los mas visitados (a igualdad, los mas recientes).
+TILE_MAX_FEATURES = 5000
+
+TILE_CACHE_TIMEOUT = 60 * 60 * 24
+TILE_CACHE_PREFIX = 'snippets:tile'
+
+# Latitud maxima representable en Web Mercator.
+MAX_LATITUDE = 85.0511287798
+
+TILE_SQL = """
+    WITH bounds AS (
+        SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS geom,
+               ST_TileEnvelope(%(z)s, %(x)s, %(y)s, margin => %(margin)s) AS query_geom
+    ),
+    features AS (
+        SELECT ST_AsMVTGeom(ST_Transform(s.point, 3857), bounds.geom, %(extent)s, %(buffer)s, true) AS geom,
+               s.id,
+               s.title,
+               s.language,
+               s.cont_visited
+        FROM {table} s, bounds
+        WHERE s.point IS NOT NULL
+          AND s.point && ST_Transform(bounds.query_geom, 4326)
+        ORDER BY s.cont_visited DESC, s.id DESC
+        LIMIT %(limit)s
+    )
+    SELECT ST_AsMVT(features.*, 'snippets', %(extent)s, 'geom', 'id') FROM features
+"""
+
+
+def get_tile_cache():
+    return caches[getattr(settings, 'SNIPPETS_TILE_CACHE', 'default')]
+
+
+def tile_cache_key(z, x, y):
+    return f'{TILE_CACHE_PREFIX}:{z}:{x}:{y}'
+
+
+def is_valid_tile(z, x, y):
+    return 0 <= z <= TILE_MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def render_tile(z, x, y):
+    """
+    Genera la tesela MVT (z, x, y) en PostGIS con ST_AsMVT/ST_AsMVTGeom.
+    """
+    params = {
+        'z': z,
+        'x': x,
+        'y': y,
+        'margin': TILE_BUFFER / TILE_EXTENT,
+        'extent': TILE_EXTENT,
+        'buffer': TILE_BUFFER,
+        'limit': TILE_MAX_FEATURES,
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(TILE_SQL.format(table=Snippet._meta.db_table), params)
+        row = cursor.fetchone()
+    return bytes(row[0]) if row and row[0] is not None else b''
+
+
+def get_tile(z, x, y):
+    """
+    Devuelve la tesela desde la cache, generandola si no existe.
+    """
+    cache = get_tile_cache()
+    key = tile_cache_key(z, x, y)
+    tile = cache.get(key)
+    if tile is None:
+        tile = render_tile(z, x, y)
+        cache.set(key, tile, TILE_CACHE_TIMEOUT)
+    return tile
+
+
+def tiles_for_point(point):
+    """
+    Teselas (z, x, y) de todos los niveles de zoom en las que aparece un punto,
+    incluidas las vecinas cuando el punto cae dentro del buffer de su borde.
+    """
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, point.y))
+    lat_rad = math.radians(lat)
+    margin = TILE_BUFFER / TILE_EXTENT
+
+    tiles = []
+    for z in range(TILE_MAX_ZOOM + 1):
+        n = 2 ** z
+        fx = (point.x + 180.0) / 360.0 * n
+        fy = (1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n
+        xs = {math.floor(fx - margin), math.floor(fx + margin)}
+        ys = {math.floor(fy - margin), math.floor(fy + margin)}
+        tiles.extend((z, x, y) for x in xs for y in ys if 0 <= x < n and 0 <= y < n)
+    return tiles
+
+
+def invalidate_points(points):
+    """
+    Borra de la cache las teselas que contienen alguno de los puntos (los None se ignoran).
+    """
+    keys = set()
+    for point in points:
+        if point is not None:
+            keys.update(tile_cache_key(*tile) for tile in tiles_for_point(point))
+    if keys:
+        get_tile_cache().delete_many(list(keys))
@@ -0,0 +1,260 @@
+import json
+import re
+from datetime import datetime
+
+from django.contrib.gis.geos import Point
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts import stats as author_stats
+from accounts.models import UserProfile
+from snippets import caching, tiles
+from snippets.geojson import ROWS_CHUNK_SIZE, encode_feature, feature_rows
+from snippets.models import Snippet
+
+# Claves de cada registro exportado, en orden; "author" es el nombre de usuario.
+EXPORT_FIELDS = ('title', 'language', 'description', 'source_code', 'pub_date', 'author', 'cont_visited')
+
+# Columnas de las que sale cada clave de EXPORT_FIELDS.
+EXPORT_VALUES = ('title', 'language', 'description', 'source_code', 'pub_date', 'author_username', 'cont_visited')
+
+FORMATS = ('jsonl', 'geojson')
+
+# Snippets por INSERT (y por transaccion) al importar.
+IMPORT_BATCH_SIZE = 1000
+
+# Caracteres que se leen del fichero en cada vuelta al importar GeoJSON.
+READ_CHUNK_SIZE = 1 << 16
+
+# Tamaño maximo de una Feature: evita leer el resto del fichero a memoria si esta corrupto.
+MAX_FEATURE_CHARS = 16 << 20
+
+LANGUAGES = {value for value, label in Snippet.LENGUAJES_CHOICES}
+
+FEATURES_START = re.compile(r'"features"\s*:\s*\[')
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def export_rows(queryset, chunk_size=ROWS_CHUNK_SIZE):
+    """
+    Filas (pk, geometria_geojson, *EXPORT_VALUES) de los snippets, leidas con un cursor por trozos.
+    """
+    queryset = queryset.annotate(author_username=F('author__user__username')).order_by('pk')
+    return feature_rows(queryset, 'point', EXPORT_VALUES).iterator(chunk_size=chunk_size)
+
+
+def iter_jsonl(queryset, chunk_size=ROWS_CHUNK_SIZE):
+    """
+    Genera una linea JSON por snippet: las claves de EXPORT_FIELDS mas "point" (geometria GeoJSON o null).
+    """
+    encoder = DjangoJSONEncoder()
+    for pk, geometry, *values in export_rows(queryset, chunk_size):
+        record = encoder.encode(dict(zip(EXPORT_FIELDS, values)))
+        yield '%s, "point": %s}\n' % (record[:-1], geometry or 'null')
+
+
+def iter_geojson(queryset, chunk_size=ROWS_CHUNK_SIZE):
+    """
+    Genera una FeatureCollection con una Feature por linea; las propiedades son EXPORT_FIELDS.
+    """
+    encoder = DjangoJSONEncoder()
+    yield '{"type": "FeatureCollection", "features": [\n'
+    separator = ''
+    for row in export_rows(queryset, chunk_size):
+        yield separator + encode_feature(row, EXPORT_FIELDS, encoder)
+        separator = ',\n'
+    yield '\n]}\n'
+
+
+def read_jsonl(fp):
+    """
+    Registros de un fichero JSONL, uno por linea no vacia. Devuelve tuplas (linea, registro).
+    """
+    for number, line in enumerate(fp, start=1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as e:
+                raise InvalidRecord(f'línea {number}: JSON inválido ({e.msg})') from e
+
+
+def read_geojson(fp, chunk_size=READ_CHUNK_SIZE):
+    """
+    Features de una FeatureCollection leidas de una en una, sin cargar el fichero entero.
+
+    Solo se mantiene en memoria el trozo leido y la Feature que se esta decodificando. Devuelve tuplas
+    (numero_de_feature, registro) con las propiedades aplanadas y la geometria en "point".
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while True:
+        match = FEATURES_START.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            raise InvalidRecord('el fichero no es una FeatureCollection (falta "features")')
+        # Se conserva el final por si la clave "features" ha quedado partida entre dos trozos.
+        buffer = buffer[-32:] + chunk
+
+    number = 0
+    pos = 0
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            if pos >= len(buffer):
+                raise json.JSONDecodeError('sin datos', buffer, pos)
+            feature, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            chunk = fp.read(chunk_size)
+            if not chunk or len(buffer) - pos > MAX_FEATURE_CHARS:
+                raise InvalidRecord(f'feature {number + 1}: JSON incompleto o inválido')
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+
+        number += 1
+        if not isinstance(feature, dict):
+            raise InvalidRecord(f'feature {number}: no es un objeto')
+        yield number, {**(feature.get('properties') or {}), 'point': feature.get('geometry')}
+
+
+def parse_point(geometry):
+    """
+    Point a partir de una geometria GeoJSON, de [lon, lat] o de None.
+    """
+    if geometry is None:
+        return None
+    if isinstance(geometry, dict):
+        if geometry.get('type') != 'Point':
+            raise InvalidRecord(f'geometría no soportada: {geometry.get("type")}')
+        geometry = geometry.get('coordinates')
+    try:
+        lon, lat = (float(c) for c in geometry[:2])
+    except (TypeError, ValueError) as e:
+        raise InvalidRecord(f'coordenadas inválidas: {geometry!r}') from e
+    if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+        raise InvalidRecord(f'coordenadas fuera de rango: {lon}, {lat}')
+    return Point(lon, lat, srid=4326)
+
+
+def build_snippet(record, authors):
+    """
+    Snippet (sin guardar) a partir de un registro exportado. authors es el mapa {username: profile_id}.
+
+    Devuelve (snippet, pub_date); pub_date va aparte porque bulk_create lo pisaria (auto_now_add).
+    """
+    title = record.get('title')
+    source_code = record.get('source_code')
+    if not title or source_code is None:
+        raise InvalidRecord('faltan title o source_code')
+    language = record.get('language')
+    if language not in LANGUAGES:
+        raise InvalidRecord(f'lenguaje desconocido: {language!r}')
+
+    author_id = None
+    username = record.get('author')
+    if username:
+        author_id = authors.get(username)
+        if author_id is None:
+            raise InvalidRecord(f'autor desconocido: {username!r}')
+
+    pub_date = record.get('pub_date')
+    if pub_date:
+        try:
+            pub_date = datetime.fromisoformat(pub_date)
+        except (TypeError, ValueError) as e:
+            raise InvalidRecord(f'pub_date inválida: {pub_date!r}') from e
+        # Exportaciones sin zona horaria: se interpretan en la zona del proyecto (TIME_ZONE).
+        if pub_date.tzinfo is None:
+            pub_date = timezone.make_aware(pub_date)
+
+    try:
+        cont_visited = int(record.get('cont_visited') or 0)
+    except (TypeError, ValueError) as e:
+        raise InvalidRecord(f'cont_visited inválido: {record.get("cont_visited")!r}') from e
+
+    snippet = Snippet(
+        title=title[:Snippet._meta.get_field('title').max_length],
+        source_code=source_code,
+        description=record.get('description'),
+        language=language,
+        author_id=author_id,
+        cont_visited=cont_visited,
+        point=parse_point(record.get('point')),
+    )
+    snippet.update_derived_fields()
+    return snippet, pub_date or None
+
+
+def _insert_batch(batch):
+    snippets = [snippet for snippet, pub_date in batch]
+    with transaction.atomic():
+        Snippet.objects.bulk_create(snippets)
+        # bulk_create aplica auto_now_add; las fechas originales se restauran con un UPDATE por lote.
+        # pub_update se queda en el momento de la importacion, para que los mapas sincronizados la vean.
+        dated = []
+        for snippet, pub_date in batch:
+            if pub_date is not None:
+                snippet.pub_date = pub_date
+                dated.append(snippet)
+        if dated:
+            Snippet.objects.bulk_update(dated, ['pub_date'])
+    tiles.invalidate_points(snippet.point for snippet in snippets)
+
+
+def import_snippets(records, batch_size=IMPORT_BATCH_SIZE, skip_invalid=False, errors=None):
+    """
+    Inserta los snippets de un iterable de (numero, registro) con bulk_create, una transaccion por lote.
+
+    Los autores se resuelven con un mapa {username: profile_id} cargado una sola vez. Los registros
+    invalidos lanzan InvalidRecord, o se saltan si skip_invalid (y se anotan en errors si es una lista).
+    Al terminar se recalculan los totales de los autores afectados y se invalidan las paginas cacheadas.
+
+    @return:
+        Numero de snippets importados.
+    """
+    authors = dict(UserProfile.objects.values_list('user__username', 'pk'))
+    touched_authors = set()
+    imported = 0
+    batch = []
+    try:
+        for number, record in records:
+            try:
+                if not isinstance(record, dict):
+                    raise InvalidRecord('el registro no es un objeto')
+                snippet, pub_date = build_snippet(record, authors)
+            except InvalidRecord as e:
+                message = f'registro {number}: {e}'
+                if not skip_invalid:
+                    raise InvalidRecord(message) from e
+                if errors is not None:
+                    errors.append(message)
+                continue
+
+            batch.append((snippet, pub_date))
+            touched_authors.add(snippet.author_id)
+            if len(batch) >= batch_size:
+                _insert_batch(batch)
+                imported += len(batch)
+                batch = []
+        if batch:
+            _insert_batch(batch)
+            imported += len(batch)
+    finally:
+        # Tambien si se corta a medias: los lotes ya confirmados tienen que verse.
+        if imported:
+            touched_authors.discard(None)
+            author_stats.rebuild_author_stats(touched_authors)
+            usernames = [username for username, pk in authors.items() if pk in touched_authors]
+            caching.invalidate('snippets:list', 'snippets:map', *[f'profiles:{username}' for username in usernames])
+    return imported
@@ -1,15 +1,26 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import async_views, views
 
 app_name = 'snippets'
 
+# Vistas de solo lectura del mapa y del detalle: las async con SNIPPETS_ASYNC_VIEWS (servidas por ASGI).
+read_views = async_views if getattr(settings, 'SNIPPETS_ASYNC_VIEWS', False) else views
+
 urlpatterns = [
     path("", views.index, name="index"),
     path("new/", views.new_snippet, name="new_snippet"),
-    path("<int:pk>/", views.snippet_detail, name="snippet_detail"),
-    path("map/", views.map_snippet, name="map_snippet"),
-    path('map/api/geojson/', views.snippets_geojson, name='snippets_geojson'),
+    path("search/", views.search, name="search"),
+    path("api/autocomplete/", views.snippets_autocomplete, name="snippets_autocomplete"),
+    path("<int:pk>/", read_views.snippet_detail, name="snippet_detail"),
+    path("map/", read_views.map_snippet, name="map_snippet"),
+    path('map/api/geojson/', read_views.snippets_geojson, name='snippets_geojson'),
+    path('map/api/clusters/', views.snippets_clusters, name='snippets_clusters'),
+    path('map/api/near/', views.snippets_near, name='snippets_near'),
+    path('map/tiles/<int:z>/<int:x>/<int:y>.pbf', views.snippet_tile, name='snippet_tile'),
+    path('api/monitoring/cache/', views.cache_stats, name='cache_stats'),
+    path('api/monitoring/db/', views.db_stats, name='db_stats'),
     path('api/snippets/<int:snippet_id>/update_location/',
          views.update_snippet_location,
          name='snippet_update_location'),
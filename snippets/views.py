@@ -1,13 +1,36 @@
+import math
+import mimetypes
+from pathlib import Path
+
 from django.contrib.auth.decorators import login_required
-from django.core.serializers import serialize
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotModified,
+                         StreamingHttpResponse)
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
+from django.urls import reverse
 from accounts.models import UserProfile
 from snippets.models import Snippet
+from snippets.clustering import CLUSTER_MAX_ZOOM, CLUSTER_MIN_ZOOM, cluster_snippets
+from snippets.geojson import iter_feature_collection
+from snippets.live import LIVE_PATH
+from snippets import nearby
+from snippets.pagination import InvalidCursor, keyset_page
+from snippets.search import search_snippets
+from snippets.autocomplete import AUTOCOMPLETE_CACHE_TIMEOUT, autocomplete
+from snippets import assets, caching, sync, tiles, visits
+from CodeAtlas import db
 from . import forms
 from django.shortcuts import render
 from django.http import JsonResponse
-from django.views.decorators.http import require_GET, require_http_methods
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET, require_http_methods
+from django.db.models import Count, Max, Sum
 import json
 from django.contrib.gis.geos import Point
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
@@ -15,13 +38,40 @@ from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 
 # Create your views here.
 
+SNIPPETS_PER_PAGE = 9
+
+
+@caching.cache_response(lambda request: ['snippets:list'])
 def index(request):
     """
         Vista principal con paginación de snippets.
+
+        Por defecto pagina por cursor (?cursor=...), sin COUNT(*) ni OFFSET. Con ?format=json devuelve
+        las tarjetas ya renderizadas y el siguiente cursor, para el scroll infinito de index.html.
+        Los enlaces antiguos con ?page=N siguen funcionando con el Paginator clasico.
     """
-    snippets_list = Snippet.objects.select_related('author__user').order_by("-pub_date")
+    snippets_list = Snippet.objects.for_list().select_related('author__user')
+
+    if "page" not in request.GET:
+        try:
+            page = keyset_page(snippets_list, request.GET.get("cursor"), SNIPPETS_PER_PAGE)
+        except InvalidCursor:
+            return HttpResponseBadRequest("cursor inválido")
+
+        if request.GET.get("format") == "json":
+            return JsonResponse({
+                "html": render_to_string("snippets/snippet_cards.html", {"snippets_list": page}, request),
+                "next_cursor": page.next_cursor,
+            })
+
+        return render(request, "snippets/index.html", {
+            "snippets_list": page,
+            "next_cursor": page.next_cursor,
+            "is_paginated": False,
+        })
 
-    paginator = Paginator(snippets_list, 9)
+    snippets_list = snippets_list.order_by("-pub_date", "-id")
+    paginator = Paginator(snippets_list, SNIPPETS_PER_PAGE)
     page_number = request.GET.get('page')
 
     try:
@@ -40,6 +90,64 @@ def index(request):
     return render(request, "snippets/index.html", context)
 
 
+def search(request):
+    """
+        Busqueda de texto completo sobre titulo, descripcion y codigo de los snippets.
+
+        Parametros GET:
+            - q: texto a buscar (admite la sintaxis de websearch_to_tsquery: "frase", -excluir, or).
+            - lang: filtra por lenguaje (valor de Snippet.LENGUAJES_CHOICES).
+            - format=json: devuelve los resultados como JSON.
+    """
+    query = request.GET.get("q", "").strip()
+    language = request.GET.get("lang") or None
+    if language and language not in dict(Snippet.LENGUAJES_CHOICES):
+        return HttpResponseBadRequest("Lenguaje no válido")
+
+    results = list(search_snippets(query, language)) if query else []
+
+    if request.GET.get("format") == "json":
+        return JsonResponse({
+            "query": query,
+            "results": [
+                {
+                    "id": snippet.pk,
+                    "title": snippet.title,
+                    "language": snippet.language,
+                    "rank": snippet.rank,
+                    "url": reverse("snippets:snippet_detail", args=[snippet.pk]),
+                }
+                for snippet in results
+            ],
+        })
+
+    return render(request, "snippets/search.html", {
+        "query": query,
+        "language": language,
+        "languages": Snippet.LENGUAJES_CHOICES,
+        "snippets_list": results,
+    })
+
+
+@require_GET
+def snippets_autocomplete(request):
+    """
+        Endpoint API de autocompletado de titulos e identificadores, pensado para llamarse en cada pulsacion.
+
+        Parametros GET:
+            - q: texto tecleado (minimo 3 caracteres).
+    """
+    result = autocomplete(request.GET.get("q", ""))
+    for item in result["titles"]:
+        item["url"] = reverse("snippets:snippet_detail", args=[item["id"]])
+    for item in result["identifiers"]:
+        item["url"] = reverse("snippets:snippet_detail", args=[item["snippet_id"]])
+
+    response = JsonResponse(result)
+    response["Cache-Control"] = f"public, max-age={AUTOCOMPLETE_CACHE_TIMEOUT}"
+    return response
+
+
 @login_required
 def new_snippet(request):
     """
@@ -89,45 +197,314 @@ def new_snippet(request):
 def snippet_detail(request, pk):
     """
       Muestra los detalles de un snippet especifico identificado por su pk.
+
+      La visita se acumula en el buffer de snippets.visits, no se escribe en cada peticion, y se cuenta
+      tambien cuando la pagina sale de la cache de respuestas. Solo si el snippet existe: los pk que dan 404
+      no llenan el buffer ni añaden filas al UPDATE del volcado.
       """
-    snippet = get_object_or_404(Snippet, pk=pk)
+    if _snippet_detail_state(request, pk) is None:
+        raise Http404()
+    visits.record_visit(pk)
+    return _snippet_detail_page(request, pk)
+
+
+def _snippet_detail_state(request, pk):
+    """
+    (pub_update, cont_visited) del snippet, consultado una sola vez por peticion.
+    """
+    if not hasattr(request, "_snippet_detail_state"):
+        request._snippet_detail_state = Snippet.objects.filter(pk=pk).values_list("pub_update", "cont_visited").first()
+    return request._snippet_detail_state
+
+
+def _snippet_detail_etag(request, pk):
+    state = _snippet_detail_state(request, pk)
+    if state is None:
+        return None
+    pub_update, cont_visited = state
+    # cont_visited va en el ETag a proposito: la pagina muestra el contador, asi que cambia con cada volcado de
+    # visitas (snippets.visits) y el navegador recibe la pagina nueva. Last-Modified solo sigue las ediciones:
+    # un cliente que solo mande If-Modified-Since puede ver el contador de visitas algo atrasado.
+    # La cabecera de la pagina cambia con la sesion, asi que el ETag tambien.
+    auth = f"u{request.user.pk}" if request.user.is_authenticated else "anon"
+    return f"snippet-{pk}-{pub_update.timestamp()}-{cont_visited}-{auth}"
+
+
+def _snippet_detail_last_modified(request, pk):
+    state = _snippet_detail_state(request, pk)
+    return state[0] if state else None
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_snippet_detail_etag, last_modified_func=_snippet_detail_last_modified)
+@caching.cache_response(lambda request, pk: [f'snippets:detail:{pk}'])
+def _snippet_detail_page(request, pk):
+    snippet = get_object_or_404(Snippet.objects.select_related('author__user'), pk=pk)
     return render(request, 'snippets/snippet_detail.html', {'snippet': snippet})
 
 
 GEOM_FIELD = "point"
 
 
+def _parse_bbox(value):
+    """
+    Convierte el parametro bbox ("minx,miny,maxx,maxy") en una tupla de floats.
+
+    Lanza ValueError si el formato no es valido o algun valor no es finito (nan, inf).
+    """
+    minx, miny, maxx, maxy = [float(x) for x in value.split(",")]
+    if not all(math.isfinite(x) for x in (minx, miny, maxx, maxy)):
+        raise ValueError(f"bbox con valores no finitos: {value}")
+    return minx, miny, maxx, maxy
+
+
+def _geojson_queryset(bbox):
+    qs = Snippet.objects.filter(point__isnull=False)
+    if bbox:
+        qs = qs.filter(**{f"{GEOM_FIELD}__bboverlaps": bbox})
+    return qs
+
+
+def _geojson_state(request):
+    """
+    (max pub_update, numero de snippets, suma de visitas) dentro del bbox pedido, calculado una sola vez por
+    peticion.
+    Devuelve None si el bbox no es valido (la vista respondera 400) y en las peticiones de cambios (?since=),
+    que no usan validacion condicional.
+    """
+    if not hasattr(request, "_geojson_state"):
+        if "since" in request.GET:
+            request._geojson_state = None
+            return None
+        try:
+            bbox = _parse_bbox(request.GET["bbox"]) if request.GET.get("bbox") else None
+        except ValueError:
+            request._geojson_state = None
+        else:
+            state = _geojson_queryset(bbox).aggregate(
+                last_update=Max("pub_update"), total=Count("id"), visits=Sum("cont_visited")
+            )
+            request._geojson_state = (state["last_update"], state["total"], state["visits"] or 0)
+    return request._geojson_state
+
+
+def _geojson_etag(request):
+    state = _geojson_state(request)
+    if state is None:
+        return None
+    last_update, total, visits = state
+    stamp = last_update.timestamp() if last_update else 0
+    # Las features llevan cont_visited: la suma de visitas cambia el ETag con cada volcado (snippets.visits).
+    # Como en el detalle, Last-Modified solo sigue las ediciones.
+    return f"geojson-{stamp}-{total}-{visits}"
+
+
+def _geojson_last_modified(request):
+    state = _geojson_state(request)
+    return state[0] if state else None
+
+
 @require_GET
 def map_snippet(request):
     """
     Renderiza la pagina del mapa para visualizar snippets.
     """
-    return render(request, "snippets/mapa_snippets.html", {})
+    return render(request, "snippets/mapa_snippets.html", {"live_path": LIVE_PATH})
 
 
 @require_GET
+@cache_control(no_cache=True)
+@condition(etag_func=_geojson_etag, last_modified_func=_geojson_last_modified)
+@caching.cache_response(lambda request: ['snippets:map'], bypass=lambda request: "since" in request.GET)
 def snippets_geojson(request):
     """
     Endpoint API que retorna los snippets en formato GeoJSON para Leaflet.
-    """
-    qs = Snippet.objects.filter(point__isnull=False)
 
+    La FeatureCollection se genera en streaming (ver snippets.geojson), sin cargar el queryset entero en memoria.
+    Responde con ETag/Last-Modified (max pub_update, numero de snippets y visitas del bbox), asi que las peticiones
+    repetidas del mapa sin cambios acaban en 304 sin serializar nada.
+
+    La cabecera X-Map-Timestamp indica el momento de los datos. Con ?since=<X-Map-Timestamp> solo se
+    devuelven los snippets creados o modificados desde entonces, y en "removed" los ids que el cliente tiene
+    que quitar (ver snippets.sync). Si since es demasiado antiguo responde {"reset": true}.
+    """
+    # Antes de consultar: lo que cambie mientras se genera la respuesta entrara en la siguiente sincronizacion.
+    timestamp = sync.timestamp()
     bbox = request.GET.get("bbox")
     if bbox:
         try:
-            minx, miny, maxx, maxy = [float(x) for x in bbox.split(",")]
-        except Exception:
+            bbox = _parse_bbox(bbox)
+        except ValueError:
             return HttpResponseBadRequest("bbox inválido. Formato: minx,miny,maxx,maxy")
-        qs = qs.filter(**{f"{GEOM_FIELD}__bboverlaps": (minx, miny, maxx, maxy)})
 
-    geojson_str = serialize(
-        "geojson",
-        qs,
-        geometry_field=GEOM_FIELD,
-        fields=['title', 'language', 'description', 'pub_date', 'author', 'cont_visited'],
+    members = None
+    if "since" in request.GET:
+        try:
+            since = sync.parse_since(request.GET["since"])
+        except (ValueError, OverflowError, OSError):
+            return HttpResponseBadRequest("since inválido. Debe ser un timestamp en segundos")
+        try:
+            qs, removed = sync.changes_since(since, bbox)
+        except sync.SyncExpired:
+            return JsonResponse({"reset": True, "timestamp": timestamp})
+        members = {"timestamp": timestamp, "removed": removed}
+    else:
+        qs = _geojson_queryset(bbox)
+
+    response = StreamingHttpResponse(
+        iter_feature_collection(qs, GEOM_FIELD, members=members),
+        content_type="application/json",
     )
+    response["X-Map-Timestamp"] = timestamp
+    return response
+
+
+@require_GET
+def snippets_clusters(request):
+    """
+    Endpoint API que retorna los snippets agrupados en clusters para los niveles de zoom bajos del mapa.
+
+    Parametros GET:
+        - zoom: nivel de zoom de Leaflet (obligatorio).
+        - bbox: minx,miny,maxx,maxy (opcional, por defecto el mundo entero).
+    """
+    try:
+        zoom = int(request.GET.get("zoom", ""))
+    except ValueError:
+        return HttpResponseBadRequest("zoom inválido. Debe ser un entero")
+    if not CLUSTER_MIN_ZOOM <= zoom <= CLUSTER_MAX_ZOOM:
+        return HttpResponseBadRequest(f"zoom fuera de rango ({CLUSTER_MIN_ZOOM}-{CLUSTER_MAX_ZOOM})")
+
+    bbox = request.GET.get("bbox")
+    if bbox:
+        try:
+            bbox = _parse_bbox(bbox)
+        except ValueError:
+            return HttpResponseBadRequest("bbox inválido. Formato: minx,miny,maxx,maxy")
+
+    return JsonResponse({
+        "zoom": zoom,
+        "clusters": cluster_snippets(zoom, bbox),
+    })
+
+
+@require_GET
+def snippets_near(request):
+    """
+    Endpoint API con los snippets cercanos a un punto, del mas cercano al mas lejano, en GeoJSON
+    (propiedad "distance" en metros).
+
+    Parametros GET:
+        - lon, lat: origen (obligatorios).
+        - radius: metros; si se indica, devuelve todos los snippets dentro del radio (hasta un maximo).
+        - limit: numero de vecinos mas cercanos cuando no hay radio.
+        - lang: filtra por lenguaje (opcional).
+    """
+    try:
+        origin = nearby.parse_origin(request.GET.get("lon", ""), request.GET.get("lat", ""))
+    except ValueError:
+        return HttpResponseBadRequest("lon/lat inválidos")
+    language = request.GET.get("lang") or None
+
+    if request.GET.get("radius"):
+        try:
+            radius = float(request.GET["radius"])
+        except ValueError:
+            return HttpResponseBadRequest("radius inválido. Debe ser un número de metros")
+        if not 0 < radius <= nearby.RADIUS_MAX_METERS:
+            return HttpResponseBadRequest(f"radius fuera de rango (0-{nearby.RADIUS_MAX_METERS} m)")
+        snippets = nearby.snippets_within(origin, radius, language)
+    else:
+        try:
+            limit = int(request.GET.get("limit", nearby.NEAREST_DEFAULT_LIMIT))
+        except ValueError:
+            return HttpResponseBadRequest("limit inválido. Debe ser un entero")
+        limit = max(1, min(limit, nearby.NEAREST_MAX_LIMIT))
+        snippets = nearby.nearest_snippets(origin, limit, language)
+
+    return JsonResponse(nearby.as_feature_collection(snippets))
 
-    return JsonResponse(json.loads(geojson_str), safe=False)
+
+@require_GET
+def snippet_tile(request, z, x, y):
+    """
+    Endpoint que retorna una tesela Mapbox Vector Tile (capa "snippets") con title, language y cont_visited.
+
+    Las teselas se guardan en cache y se invalidan cuando un snippet de la zona se crea, mueve o elimina,
+    y cuando se vuelcan sus visitas.
+    """
+    if not tiles.is_valid_tile(z, x, y):
+        raise Http404("Tesela fuera de rango")
+
+    response = HttpResponse(tiles.get_tile(z, x, y), content_type="application/vnd.mapbox-vector-tile")
+    response["Cache-Control"] = "public, max-age=60"
+    return response
+
+
+@require_GET
+def cache_stats(request):
+    """
+    Endpoint de monitorizacion con los aciertos y fallos de la cache de respuestas por vista. Solo staff.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'No autorizado'}, status=403)
+    return JsonResponse(caching.stats())
+
+
+@require_GET
+def db_stats(request):
+    """
+    Endpoint de monitorizacion de las conexiones a la base de datos: modo (pool o persistentes), contadores
+    del pool de este proceso y conexiones abiertas en el servidor. Solo staff.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'No autorizado'}, status=403)
+    return JsonResponse(db.connection_stats())
+
+
+# Cache de los estaticos servidos por static_asset: un año (e immutable) si el nombre lleva el hash del
+# contenido; si no, poco tiempo, porque el mismo nombre puede cambiar de contenido en el siguiente despliegue.
+STATIC_HASHED_MAX_AGE = 365 * 24 * 3600
+STATIC_UNHASHED_MAX_AGE = 300
+
+
+@require_GET
+def static_asset(request, path):
+    """
+    Sirve un fichero de STATIC_ROOT (despues de collectstatic) cuando no hay servidor web delante.
+
+    Si el navegador acepta br o gzip y collectstatic dejo esa variante, se envia ya comprimida.
+    """
+    try:
+        full_path = Path(safe_join(settings.STATIC_ROOT, path))
+    except SuspiciousFileOperation:
+        raise Http404()
+    if not full_path.is_file():
+        raise Http404()
+
+    stat = full_path.stat()
+    if not was_modified_since(request.META.get("HTTP_IF_MODIFIED_SINCE"), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    content_type, _ = mimetypes.guess_type(full_path.name)
+    served, encoding = full_path, None
+    accepted = request.META.get("HTTP_ACCEPT_ENCODING", "")
+    for suffix, name in ((".br", "br"), (".gz", "gzip")):
+        variant = full_path.with_name(full_path.name + suffix)
+        if name in accepted and variant.is_file():
+            served, encoding = variant, name
+            break
+
+    response = FileResponse(served.open("rb"), content_type=content_type or "application/octet-stream")
+    if encoding:
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ["Accept-Encoding"])
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    if assets.is_hashed_name(path):
+        response["Cache-Control"] = f"public, max-age={STATIC_HASHED_MAX_AGE}, immutable"
+    else:
+        response["Cache-Control"] = f"public, max-age={STATIC_UNHASHED_MAX_AGE}"
+    return response
 
 
 @login_required
@@ -0,0 +1,203 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.dispatch import Signal
+
+from snippets.models import Snippet
+
+logger = logging.getLogger(__name__)
+
+# Snippets que se actualizan como maximo en cada UPDATE.
+FLUSH_BATCH_SIZE = 500
+
+# Se envia tras cada volcado con deltas={pk: visitas}, para quien mantenga totales derivados.
+visits_flushed = Signal()
+
+# Cada cuanto mira el hilo de volcado si toca volcar o si flush_visits lo ha pedido.
+FLUSHER_POLL_SECONDS = 1
+
+# Clave, en la cache compartida, con la ultima peticion de volcado de flush_visits.
+FLUSH_REQUEST_KEY = 'snippets:visits:flush_requested'
+
+_lock = threading.Lock()
+_pending = {}
+_pending_hits = 0
+_last_flush = time.monotonic()
+
+# Hilo de volcado: solo en los procesos web (CodeAtlas.wsgi/asgi llaman a enable_flusher()).
+_flusher_enabled = False
+_flusher_pid = None
+
+
+def flush_interval():
+    return getattr(settings, 'SNIPPETS_VISITS_FLUSH_INTERVAL', 10)
+
+
+def flush_threshold():
+    return getattr(settings, 'SNIPPETS_VISITS_FLUSH_THRESHOLD', 100)
+
+
+def get_flush_request_cache():
+    return caches[getattr(settings, 'SNIPPETS_VISITS_FLUSH_REQUEST_CACHE', 'default')]
+
+
+def request_flush():
+    """
+    Pide a los procesos web que vuelquen sus visitas. Les llega si comparten la cache
+    (CODEATLAS_CACHE_BACKEND=file); con locmem cada proceso solo ve la suya.
+    """
+    get_flush_request_cache().set(FLUSH_REQUEST_KEY, time.time_ns(), None)
+
+
+def _flush_requested_since(last_seen):
+    requested = get_flush_request_cache().get(FLUSH_REQUEST_KEY)
+    return requested, requested is not None and requested != last_seen
+
+
+def _flusher_loop():
+    """
+    Vuelca el buffer cada flush_interval() aunque no lleguen mas peticiones (un proceso ocioso no se queda
+    las visitas) y en cuanto flush_visits lo pide.
+    """
+    last_seen, _ = _flush_requested_since(None)
+    while True:
+        time.sleep(FLUSHER_POLL_SECONDS)
+        try:
+            last_seen, requested = _flush_requested_since(last_seen)
+            with _lock:
+                due = _pending and time.monotonic() - _last_flush >= flush_interval()
+            if requested or due:
+                _flush_logged()
+        except Exception as e:
+            logger.error(f'Error in snippet visits flusher: {e}')
+        finally:
+            close_old_connections()
+
+
+def enable_flusher():
+    """
+    Activa el volcado periodico en segundo plano. El hilo se arranca con la primera visita de cada proceso
+    (tras un fork, el hilo del padre no existe en el hijo).
+    """
+    global _flusher_enabled
+    _flusher_enabled = True
+
+
+def _ensure_flusher():
+    global _flusher_pid
+    if not _flusher_enabled or _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flusher_loop, name='snippet-visits-flusher', daemon=True).start()
+
+
+def _buffer_visit(pk):
+    """
+    Suma la visita al buffer. Devuelve si toca volcarlo (por tiempo o por numero de visitas).
+    """
+    global _pending_hits
+    _ensure_flusher()
+    with _lock:
+        _pending[pk] = _pending.get(pk, 0) + 1
+        _pending_hits += 1
+        return _pending_hits >= flush_threshold() or time.monotonic() - _last_flush >= flush_interval()
+
+
+def _flush_logged():
+    try:
+        flush()
+    except Exception as e:
+        # Las visitas vuelven al buffer, se reintentara en el siguiente volcado.
+        logger.error(f'Error flushing snippet visits: {e}')
+
+
+def record_visit(pk):
+    """
+    Suma una visita al snippet en el buffer del proceso.
+
+    No escribe en la base de datos salvo que toque volcar el buffer (por tiempo o por numero de visitas).
+    """
+    if _buffer_visit(pk):
+        _flush_logged()
+
+
+async def arecord_visit(pk):
+    """
+    Version asincrona de record_visit(): solo sale del bucle de eventos cuando toca volcar.
+    """
+    if _buffer_visit(pk):
+        await sync_to_async(_flush_logged)()
+
+
+def _take_pending():
+    global _pending, _pending_hits, _last_flush
+    with _lock:
+        deltas = _pending
+        _pending = {}
+        _pending_hits = 0
+        _last_flush = time.monotonic()
+    return deltas
+
+
+def _restore_pending(deltas):
+    global _pending_hits
+    with _lock:
+        for pk, delta in deltas.items():
+            _pending[pk] = _pending.get(pk, 0) + delta
+            _pending_hits += delta
+
+
+def write_deltas(deltas):
+    """
+    Aplica {pk: delta} con un UPDATE ... SET cont_visited = cont_visited + CASE ... por lote.
+    """
+    items = list(deltas.items())
+    for start in range(0, len(items), FLUSH_BATCH_SIZE):
+        batch = items[start:start + FLUSH_BATCH_SIZE]
+        Snippet.objects.filter(pk__in=[pk for pk, delta in batch]).update(
+            cont_visited=F('cont_visited') + Case(
+                *[When(pk=pk, then=Value(delta)) for pk, delta in batch],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+
+
+def flush():
+    """
+    Vuelca a la base de datos las visitas acumuladas en este proceso.
+
+    @return:
+        Numero de visitas volcadas.
+    """
+    deltas = _take_pending()
+    if not deltas:
+        return 0
+    try:
+        # Contadores y totales derivados (visits_flushed) se confirman juntos o no se confirman.
+        with transaction.atomic():
+            write_deltas(deltas)
+            visits_flushed.send(sender=Snippet, deltas=deltas)
+    except Exception:
+        _restore_pending(deltas)
+        raise
+    return sum(deltas.values())
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception as e:
+        logger.error(f'Error flushing snippet visits at exit: {e}')